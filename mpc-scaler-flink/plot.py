@@ -1,6 +1,6 @@
 import json
 
-import matplotlib.pyplot as plt
+from mpc_scaler_flink.plotting import render_series
 
 
 def plot_and_save_time_series_from_json(
@@ -9,23 +9,16 @@ def plot_and_save_time_series_from_json(
     with open(json_filename, "r") as f:
         time_series_data = json.load(f)
 
-    fig, axs = plt.subplots(2, 2, figsize=(14, 10))
-
-    axs = axs.flatten()
-
-    for idx, (series_name, series_info) in enumerate(time_series_data.items()):
-        data = series_info["data"]
-        axs[idx].plot(data, marker="o", linestyle="-", markersize=4)
-        axs[idx].set_title(series_name)
-        axs[idx].set_xlabel("Time")
-        axs[idx].set_ylabel("Value")
-        axs[idx].grid(True)
-
-    plt.tight_layout()
-
-    plt.savefig(output_image_filename)
-    plt.close()  # Close the figure to free up memory
-    print(f"Plot saved to '{output_image_filename}'")
+    render_series(
+        {
+            series_name: series_info["data"]
+            for series_name, series_info in time_series_data.items()
+        },
+        output_image_filename,
+        columns=2,
+        xlabel="Time",
+        marker="o",
+    )
 
 
 def main():
@@ -0,0 +1,89 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from kubernetes import client, config
+
+from .pod import Pod, PodCapacity
+
+
+def default_deployment_names() -> Dict[PodCapacity, str]:
+    return {
+        capacity: f"flink-session-cluster-taskmanager-{capacity.name.lower()}"
+        for capacity in PodCapacity
+    }
+
+
+def create_api_client(connection_pool_maxsize: int = 4) -> client.ApiClient:
+    configuration = client.Configuration()
+    try:
+        config.load_incluster_config(client_configuration=configuration)
+    except config.ConfigException:
+        config.load_kube_config(client_configuration=configuration)
+    # NOTE: One pooled connection per concurrent patch, reused across ticks.
+    configuration.connection_pool_maxsize = connection_pool_maxsize
+    return client.ApiClient(configuration)
+
+
+class KubernetesActuator:
+    # NOTE: Long-lived replacement for calling `scale_deployment` per deployment.
+    # The configuration is loaded once and all patches share the connection pool
+    # of a single `ApiClient`. Only deployments whose replica count differs from
+    # the last successfully applied one are patched, concurrently.
+    def __init__(
+        self,
+        namespace: str = "default",
+        deployment_names: Optional[Dict[PodCapacity, str]] = None,
+        api_client: Optional[client.ApiClient] = None,
+        max_workers: int = 4,
+    ):
+        self.namespace = namespace
+        self.deployment_names = deployment_names or default_deployment_names()
+        self.api_client = api_client or create_api_client(max_workers)
+        self.apps_v1 = client.AppsV1Api(self.api_client)
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="k8s-actuator"
+        )
+        self._applied_replicas: Dict[str, int] = {}
+
+    def pending_changes(self, pods: List[Pod]) -> Dict[str, int]:
+        desired: Dict[str, int] = {}
+        for pod in pods:
+            deployment_name = self.deployment_names[pod.task_slot_capacity]
+            desired[deployment_name] = (
+                desired.get(deployment_name, 0) + pod.replica_count
+            )
+        return {
+            name: replicas
+            for name, replicas in desired.items()
+            if self._applied_replicas.get(name) != replicas
+        }
+
+    def _patch(self, deployment_name: str, replicas: int) -> bool:
+        scale = {"spec": {"replicas": replicas}}
+        try:
+            self.apps_v1.patch_namespaced_deployment_scale(
+                name=deployment_name, namespace=self.namespace, body=scale
+            )
+        except client.ApiException as e:
+            print(f"Error scaling deployment {deployment_name}: {e}")
+            return False
+
+        self._applied_replicas[deployment_name] = replicas
+        print(f"Deployment {deployment_name} scaled to {replicas} replicas.")
+        return True
+
+    async def actuate(self, pods: List[Pod]) -> Dict[str, bool]:
+        changes = self.pending_changes(pods)
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(
+            *[
+                loop.run_in_executor(self._executor, self._patch, name, replicas)
+                for name, replicas in changes.items()
+            ]
+        )
+        return dict(zip(changes.keys(), results))
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.api_client.close()
@@ -0,0 +1,75 @@
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+from typing import Callable, Dict, Optional
+
+import casadi
+
+# NOTE: Bump this whenever the structure of the NLP changes in a way that is not
+# captured by the controller parameters (e.g. new cost terms or constraints).
+# Otherwise stale libraries from the cache would be loaded.
+CODEGEN_VERSION = 1
+
+COMPILER_FLAGS = ["-O3", "-fPIC", "-shared"]
+
+
+def parameter_hash(parameters: Dict[str, float]) -> str:
+    payload = json.dumps(
+        {
+            "parameters": parameters,
+            "casadi": casadi.__version__,
+            "codegen_version": CODEGEN_VERSION,
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def find_compiler() -> Optional[str]:
+    return shutil.which(os.environ.get("CC", "cc"))
+
+
+def compile_solver_library(solver: casadi.Function, library_path: str):
+    compiler = find_compiler()
+    if compiler is None:
+        raise RuntimeError("No C compiler found. Set `CC` or install `cc`.")
+
+    cache_dir = os.path.dirname(library_path)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    # NOTE: The library is built in a temporary directory and moved into place
+    # afterwards. Scaler pods sharing the cache volume never load a partial file.
+    with tempfile.TemporaryDirectory(dir=cache_dir) as build_dir:
+        # NOTE: `generate_dependencies` only writes into the working directory.
+        with contextlib.chdir(build_dir):
+            source_file = solver.generate_dependencies("nlp.c")
+        build_library = os.path.join(build_dir, "nlp.so")
+        subprocess.run(
+            [compiler, *COMPILER_FLAGS, os.path.join(build_dir, source_file)]
+            + ["-o", build_library],
+            check=True,
+        )
+        os.replace(build_library, library_path)
+
+
+def compiled_nlpsol(
+    name: str,
+    plugin: str,
+    build_solver: Callable[[], casadi.Function],
+    nlpsol_opts: Dict,
+    cache_dir: str,
+    key: str,
+) -> casadi.Function:
+    library_path = os.path.join(cache_dir, f"{plugin}_{key}.so")
+    if not os.path.exists(library_path):
+        print(f"Compiling {plugin} solver library to {library_path}")
+        compile_solver_library(build_solver(), library_path)
+
+    # NOTE: The compiled library only contains numeric functions,
+    # there is nothing left to expand to SX.
+    opts = {k: v for k, v in nlpsol_opts.items() if k != "expand"}
+    return casadi.nlpsol(name, plugin, library_path, opts)
@@ -0,0 +1,227 @@
+import asyncio
+import math
+import time
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Deque, List, Optional, Protocol, Tuple
+
+import numpy as np
+
+from .estimation import KalmanEstimator
+from .instrumentation import ScalerMetrics, TickProfiler
+from .measurement import Array3Float
+from .pod import Pod
+from .pod_allocator import PodAllocator
+
+
+class Controller(Protocol):
+    def measurement_step(self, metrics_array: Array3Float) -> float: ...
+
+
+@dataclass
+class TickStatistics:
+    ticks: int = 0
+    skipped_ticks: int = 0
+    overruns: int = 0
+    # NOTE: Only the most recent ticks are kept, memory stays flat.
+    jitters: Deque[float] = field(default_factory=lambda: deque(maxlen=1000))
+    durations: Deque[float] = field(default_factory=lambda: deque(maxlen=1000))
+
+    def record(self, jitter: float, duration: float, interval: float):
+        self.ticks += 1
+        self.jitters.append(jitter)
+        self.durations.append(duration)
+        if duration > interval:
+            self.overruns += 1
+
+    def summary(self) -> str:
+        if not self.ticks:
+            return "no ticks yet"
+        jitters = np.array(self.jitters) * 1e3
+        durations = np.array(self.durations) * 1e3
+        return (
+            f"ticks: {self.ticks}, skipped: {self.skipped_ticks}, "
+            f"overruns: {self.overruns}, "
+            f"jitter ms (mean/max): {jitters.mean():.2f}/{jitters.max():.2f}, "
+            f"tick ms (mean/max): {durations.mean():.2f}/{durations.max():.2f}"
+        )
+
+
+class ControlLoop:
+    # NOTE: Ticks are scheduled on a fixed grid `start + k * tick_interval`.
+    # The metric fetch of a tick runs concurrently with the actuation of the
+    # previous tick, and the MPC solve runs in a worker thread so that slow solves
+    # never block the event loop. Ticks whose scheduled time has already passed
+    # by more than one interval are skipped instead of being executed late.
+    def __init__(
+        self,
+        controller: Controller,
+        allocator: PodAllocator,
+        pods: List[Pod],
+        fetch_metrics: Callable[[], Awaitable[Array3Float]],
+        actuate: Callable[[List[Pod]], Awaitable[None]],
+        tick_interval: float = 5.0,
+        executor: Optional[Executor] = None,
+        log_every: int = 10,
+        instrumentation: Optional[ScalerMetrics] = None,
+        profiler: Optional[TickProfiler] = None,
+        estimator: Optional[KalmanEstimator] = None,
+    ):
+        self.controller = controller
+        self.allocator = allocator
+        self.pods = pods
+        self.fetch_metrics = fetch_metrics
+        self.actuate = actuate
+        self.tick_interval = tick_interval
+        # NOTE: A single worker keeps the (stateful) controller solves in order.
+        # An executor created here is shut down when `run` returns.
+        self._owns_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="mpc-solver"
+        )
+        self.log_every = log_every
+        self.statistics = TickStatistics()
+        self.instrumentation = instrumentation or ScalerMetrics()
+        self.profiler = profiler or TickProfiler()
+        # NOTE: With an estimator the controller gets the filtered state, and
+        # ticks on which the estimate barely moved skip the solve and keep the
+        # current pods.
+        self.estimator = estimator
+        self._last_deviation_term = 0.0
+        self._actuation: Optional[asyncio.Task] = None
+        # NOTE: Set when a patch failed, the next tick actuates even if the
+        # allocator reports no pod changes.
+        self._retry_actuation = False
+
+    async def run(self, max_ticks: Optional[int] = None):
+        start = time.monotonic()
+        tick = 0
+        try:
+            while max_ticks is None or self.statistics.ticks < max_ticks:
+                scheduled = start + tick * self.tick_interval
+                delay = scheduled - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+                now = time.monotonic()
+                if now - scheduled >= self.tick_interval:
+                    # NOTE: The deadline was missed, continue with the next tick
+                    # that still lies in the future.
+                    next_tick = math.ceil((now - start) / self.tick_interval)
+                    self.statistics.skipped_ticks += next_tick - tick
+                    self.instrumentation.skipped_ticks.inc(next_tick - tick)
+                    tick = next_tick
+                    continue
+
+                await self._tick(tick)
+                duration = time.monotonic() - now
+                self.statistics.record(
+                    jitter=now - scheduled,
+                    duration=duration,
+                    interval=self.tick_interval,
+                )
+                self.instrumentation.tick_seconds.observe(duration)
+                self.instrumentation.tick_jitter_seconds.observe(now - scheduled)
+                self.profiler.tick_done()
+                if self.statistics.ticks % self.log_every == 0:
+                    print(self.statistics.summary())
+                tick += 1
+        finally:
+            if self._actuation is not None:
+                await self._actuation
+            if self._owns_executor:
+                self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _tick(self, tick: int):
+        # NOTE: The previous actuation is still in flight while the metrics are
+        # fetched. It has to finish before the next one starts.
+        instrumentation = self.instrumentation
+        with instrumentation.fetch_seconds.time():
+            metrics = await self.fetch_metrics()
+        if self._actuation is not None:
+            await self._actuation
+            self._actuation = None
+
+        # NOTE: `tick` is the index on the schedule, so the history shows the
+        # ticks that were skipped after a missed deadline as gaps.
+        annotate_step = getattr(self.controller, "annotate_step", None)
+        if annotate_step is not None:
+            annotate_step(tick, metrics)
+
+        if self.estimator is not None:
+            metrics = self.estimator.step(
+                np.asarray(metrics)[None, :], [[self._last_deviation_term]]
+            )[0]
+            solved = self.estimator.needs_solve()
+            self.estimator.mark_solved(solved)
+            if not solved[0]:
+                # NOTE: The pods stay, the controller has to know that no
+                # scaling was applied on this tick.
+                self._last_deviation_term = 0.0
+                skip_step = getattr(self.controller, "skip_step", None)
+                if skip_step is not None:
+                    skip_step(metrics)
+                instrumentation.skipped_solves.inc()
+                return
+
+        scaling_factor = await asyncio.get_running_loop().run_in_executor(
+            self.executor, self._solve, metrics
+        )
+        self._last_deviation_term = scaling_factor - 1
+
+        current_task_slot_count: int = sum(
+            [pod.replica_count * pod.task_slot_capacity.value for pod in self.pods]
+        )
+        new_task_slot_count: int = round(current_task_slot_count * scaling_factor)
+        print(
+            f"scaling_factor: {scaling_factor}, task slots: "
+            f"{current_task_slot_count} -> {new_task_slot_count}"
+        )
+
+        instrumentation.scaling_factor.set(scaling_factor)
+        instrumentation.task_slots.set(new_task_slot_count)
+
+        with instrumentation.allocate_seconds.time():
+            self.pods, churn = self._allocate(new_task_slot_count, self.pods)
+        if churn != 0 or self._retry_actuation:
+            self._actuation = asyncio.create_task(self._actuate(self.pods))
+
+    def _allocate(
+        self, number_of_slots: int, pods: List[Pod]
+    ) -> Tuple[List[Pod], Optional[int]]:
+        # NOTE: Allocators with `allocate_diff`, i.e. the
+        # `ReconfigurationAwareAllocator`, also return how many pods change.
+        # Without any change there is nothing to actuate.
+        allocate_diff = getattr(self.allocator, "allocate_diff", None)
+        if allocate_diff is None:
+            return (
+                self.profiler.call(self.allocator.allocate_pods, number_of_slots, pods),
+                None,
+            )
+        diff = self.profiler.call(allocate_diff, number_of_slots, pods)
+        self.instrumentation.pod_churn.inc(diff.churn)
+        return diff.apply(pods), diff.churn
+
+    def _solve(self, metrics: Array3Float) -> float:
+        # NOTE: Runs in the solver thread, so the wall time excludes waiting for
+        # the executor and the profile covers the solver thread.
+        instrumentation = self.instrumentation
+        with instrumentation.solve_seconds.time():
+            scaling_factor = self.profiler.call(
+                self.controller.measurement_step, metrics
+            )
+        step_stats = getattr(self.controller, "last_step_stats", None)
+        if step_stats is not None:
+            instrumentation.solver_iterations.observe(step_stats.iter_count)
+            instrumentation.solver_steps.inc(1, step_stats.return_status)
+        return scaling_factor
+
+    async def _actuate(self, pods: List[Pod]):
+        with self.instrumentation.actuation_seconds.time():
+            applied = await self.actuate(pods)
+        # NOTE: `KubernetesActuator.actuate` reports the result per deployment
+        if isinstance(applied, dict):
+            failures = sum(not success for success in applied.values())
+            self.instrumentation.actuation_failures.inc(failures)
+            self._retry_actuation = failures > 0
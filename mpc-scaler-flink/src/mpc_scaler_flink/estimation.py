@@ -0,0 +1,109 @@
+from typing import Optional
+
+import numpy as np
+from numpy.typing import NDArray
+
+
+class KalmanEstimator:
+    # NOTE: Linear Kalman filter over `streams` independent metric streams
+    # (e.g. one per job or operator) that share the controller model
+    #   x_next = A @ x + B @ u + c,   z = x + noise
+    # All streams are filtered at once on `(streams, n_x)` states and
+    # `(streams, n_x, n_x)` covariances, with the same equations as
+    # `filterpy.kalman.KalmanFilter` but without a Python loop per stream.
+    # `A`, `B` and `c` are either shared by all streams or stacked per stream
+    # with a leading `streams` axis.
+    #
+    # The estimator also tracks the state each stream was last solved for. A
+    # stream needs a new solve once its estimate moved by more than
+    # `solve_tolerance` in any component, or after `max_skipped` skipped ticks.
+    def __init__(
+        self,
+        A: NDArray,
+        B: NDArray,
+        c: NDArray,
+        streams: int = 1,
+        process_noise: float = 1e-4,
+        measurement_noise: float = 1e-2,
+        initial_variance: float = 1.0,
+        solve_tolerance: float = 0.01,
+        max_skipped: int = 10,
+    ):
+        self.A = np.asarray(A, dtype=np.float64)
+        self.B = np.asarray(B, dtype=np.float64)
+        self.c = np.asarray(c, dtype=np.float64)
+        n_x = self.A.shape[-1]
+        self.Q = np.eye(n_x) * process_noise
+        self.R = np.eye(n_x) * measurement_noise
+        self.solve_tolerance = solve_tolerance
+        self.max_skipped = max_skipped
+
+        self.x = np.zeros((streams, n_x))
+        self.P = np.broadcast_to(
+            np.eye(n_x) * initial_variance, (streams, n_x, n_x)
+        ).copy()
+        self._initialized = np.zeros(streams, dtype=bool)
+        self._solved_x = np.zeros((streams, n_x))
+        # Counts as skipped so far, the first tick of every stream is solved
+        self._skipped = np.full(streams, max_skipped, dtype=np.int64)
+        self._needs_solve = np.ones(streams, dtype=bool)
+
+    @classmethod
+    def from_controller(
+        cls, controller, streams: int = 1, **kwargs
+    ) -> "KalmanEstimator":
+        # `controller` is an `MPCController`, its model defines the dynamics
+        return cls(*controller.linear_model(), streams=streams, **kwargs)
+
+    @property
+    def streams(self) -> int:
+        return self.x.shape[0]
+
+    def predict(self, u: NDArray):
+        # `u` holds the last applied control of each stream, shape `(streams, n_u)`
+        u = np.asarray(u, dtype=np.float64).reshape(self.streams, -1)
+        self.x = (self.A @ self.x[..., None] + self.B @ u[..., None])[..., 0] + self.c
+        self.P = self.A @ self.P @ self.A.swapaxes(-1, -2) + self.Q
+
+    def update(self, z: NDArray, streams: Optional[NDArray] = None):
+        # NOTE: Measurement update of all streams, or of the selected ones.
+        # With `H = I` the innovation covariance is `P + R` and the gain
+        # `P @ inv(P + R)`, computed by a batched solve of the symmetric system.
+        index = slice(None) if streams is None else np.asarray(streams)
+        z = np.asarray(z, dtype=np.float64).reshape(self.x[index].shape)
+        P = self.P[index]
+        gain = np.linalg.solve(P + self.R, P).transpose(0, 2, 1)
+        x = self.x[index] + np.einsum("sij,sj->si", gain, z - self.x[index])
+
+        # Joseph form keeps the covariances symmetric positive definite
+        I_K = np.eye(P.shape[-1]) - gain
+        P = I_K @ P @ I_K.transpose(0, 2, 1) + gain @ self.R @ gain.transpose(0, 2, 1)
+
+        # The first measurement of a stream initializes its state and leaves
+        # the initial covariance as is
+        first = ~self._initialized[index]
+        x[first] = z[first]
+        P[first] = self.P[index][first]
+        self.x[index] = x
+        self.P[index] = P
+        self._initialized[index] = True
+
+    def step(self, z: NDArray, u: NDArray) -> NDArray:
+        # One tick, predict with the last control and update with `z`. Returns
+        # the filtered states of all streams.
+        self.predict(u)
+        self.update(z)
+        moved = np.abs(self.x - self._solved_x).max(axis=1) > self.solve_tolerance
+        self._needs_solve = moved | (self._skipped >= self.max_skipped)
+        return self.x.copy()
+
+    def needs_solve(self) -> NDArray:
+        return self._needs_solve.copy()
+
+    def mark_solved(self, streams: NDArray):
+        # `streams` is a boolean mask or index of the streams solved this tick
+        mask = np.zeros(self.streams, dtype=bool)
+        mask[streams] = True
+        self._solved_x[mask] = self.x[mask]
+        self._skipped[mask] = 0
+        self._skipped[~mask] += 1
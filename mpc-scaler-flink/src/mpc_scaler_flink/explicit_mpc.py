@@ -0,0 +1,256 @@
+import argparse
+import json
+from bisect import bisect_right
+from dataclasses import dataclass
+from itertools import product
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+from .mpc_controller import Array3Float, MPCController
+from .qp_controller import CondensedQPController
+
+DEFAULT_METRICS_AXIS: NDArray = np.linspace(0, 1, 11)
+DEFAULT_DEVIATION_TERM_AXIS: NDArray = np.linspace(-1, 1, 21)
+
+
+@dataclass
+class ExplicitAccuracyReport:
+    max_abs_error: float
+    mean_abs_error: float
+    sample_count: int
+
+
+class ExplicitControlLaw:
+    # NOTE: The optimal `deviation_term` depends on the three observed metrics and,
+    # through the `rterm` penalty, on the previously applied `deviation_term`.
+    # The law is therefore tabulated over a regular 4D grid of
+    # (utilisation, backpressure_time, busy_time, previous deviation_term).
+    # With linear dynamics and a quadratic cost the law is piecewise affine, so
+    # multilinear interpolation is exact wherever the input bound is inactive.
+    def __init__(
+        self,
+        axes: Sequence[NDArray],
+        values: NDArray,
+        parameters: Dict[str, float],
+    ):
+        if values.shape != tuple(len(axis) for axis in axes):
+            raise ValueError(
+                f"Expected values of shape {tuple(len(axis) for axis in axes)}, got {values.shape}"
+            )
+        self.axes: List[NDArray] = [np.asarray(axis, dtype=float) for axis in axes]
+        self.values = np.asarray(values, dtype=float)
+        self.parameters = parameters
+
+        self._lower = np.array([axis[0] for axis in self.axes])
+        self._upper = np.array([axis[-1] for axis in self.axes])
+        # NOTE: All 2^d corner offsets of a grid cell, used for the interpolation.
+        self._corners = np.array(list(product((0, 1), repeat=len(self.axes))))
+        self._flat_values = self.values.ravel()
+        self._strides = np.array(self.values.strides) // self.values.itemsize
+        self._corner_offsets = self._corners @ self._strides
+
+        self._axes_lists = [axis.tolist() for axis in self.axes]
+        self._stride_list = self._strides.tolist()
+        self._corner_list = self._corners.tolist()
+        self._corner_offset_list = self._corner_offsets.tolist()
+        self._flat_value_list = self._flat_values.tolist()
+
+    @classmethod
+    def build(
+        cls,
+        parameters: Optional[Dict[str, float]] = None,
+        metrics_axis: NDArray = DEFAULT_METRICS_AXIS,
+        deviation_term_axis: NDArray = DEFAULT_DEVIATION_TERM_AXIS,
+    ) -> "ExplicitControlLaw":
+        parameters = parameters or {}
+        # NOTE: The warm-start mode returns the same optimum as `make_step` and
+        # neighbouring grid points make good initial guesses for each other.
+        controller = MPCController(warm_start=True, **parameters)
+        axes = [metrics_axis] * controller._model.n_x + [deviation_term_axis]
+        values = np.empty(tuple(len(axis) for axis in axes))
+
+        controller.initial_measurement(np.zeros(controller._model.n_x))
+        for index in np.ndindex(values.shape):
+            point = np.array([axis[i] for axis, i in zip(axes, index)])
+            controller._controller.u0 = point[-1:]
+            values[index] = controller.measurement_step(point[:-1]) - 1
+
+        return cls(axes, values, controller.parameters())
+
+    def evaluate(self, points: NDArray) -> NDArray:
+        points = np.atleast_2d(points)
+        # NOTE: The law is only known on the grid, clamping points outside of it
+        # to the boundary would silently return the wrong scaling factor.
+        outside = np.any((points < self._lower) | (points > self._upper), axis=1)
+        if outside.any():
+            raise ValueError(
+                f"{int(outside.sum())} of {len(points)} points lie outside of the grid"
+            )
+
+        base_index = np.zeros(len(points), dtype=int)
+        fraction = np.empty(points.shape)
+        for dim, axis in enumerate(self.axes):
+            i = np.searchsorted(axis, points[:, dim], side="right") - 1
+            i = np.minimum(i, len(axis) - 2)
+            base_index += i * self._strides[dim]
+            fraction[:, dim] = (points[:, dim] - axis[i]) / (axis[i + 1] - axis[i])
+
+        # Shape: (n_points, n_corners)
+        corner_values = self._flat_values[base_index[:, None] + self._corner_offsets]
+        corner_weight = np.where(
+            self._corners, fraction[:, None, :], 1 - fraction[:, None, :]
+        )
+
+        return (corner_weight.prod(axis=2) * corner_values).sum(axis=1)
+
+    def contains_point(self, point: Sequence[float]) -> bool:
+        return all(
+            axis[0] <= value <= axis[-1] for axis, value in zip(self._axes_lists, point)
+        )
+
+    def evaluate_point(self, point: Sequence[float]) -> float:
+        # NOTE: Scalar fast path of `evaluate` for the per-tick lookup. For a single
+        # point the NumPy call overhead dominates, plain Python is several times faster.
+        if not self.contains_point(point):
+            raise ValueError(f"{list(point)} lies outside of the grid")
+        base_index = 0
+        fractions = []
+        for dim, value in enumerate(point):
+            axis = self._axes_lists[dim]
+            i = min(bisect_right(axis, value) - 1, len(axis) - 2)
+            base_index += i * self._stride_list[dim]
+            fractions.append((value - axis[i]) / (axis[i + 1] - axis[i]))
+
+        result = 0.0
+        for corner, offset in zip(self._corner_list, self._corner_offset_list):
+            weight = 1.0
+            for fraction, bit in zip(fractions, corner):
+                weight *= fraction if bit else 1 - fraction
+            result += weight * self._flat_value_list[base_index + offset]
+        return result
+
+    def save(self, path: str):
+        np.savez_compressed(
+            path,
+            values=self.values,
+            parameters=json.dumps(self.parameters),
+            **{f"axis_{dim}": axis for dim, axis in enumerate(self.axes)},
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "ExplicitControlLaw":
+        with np.load(path) as data:
+            axes = [data[f"axis_{dim}"] for dim in range(data["values"].ndim)]
+            return cls(axes, data["values"], json.loads(str(data["parameters"])))
+
+    def accuracy_check(
+        self, sample_count: int = 200, seed: Optional[int] = None
+    ) -> ExplicitAccuracyReport:
+        rng = np.random.default_rng(seed)
+        points = rng.uniform(
+            self._lower, self._upper, size=(sample_count, len(self.axes))
+        )
+
+        # NOTE: Reference values come from the regular online `do_mpc` solve.
+        controller = MPCController(**self.parameters)
+        controller.initial_measurement(np.zeros(len(self.axes) - 1))
+        expected = np.empty(sample_count)
+        for i, point in enumerate(points):
+            controller._controller.u0 = point[-1:]
+            expected[i] = controller.measurement_step(point[:-1]) - 1
+
+        error = np.abs(self.evaluate(points) - expected)
+        return ExplicitAccuracyReport(
+            max_abs_error=float(error.max()),
+            mean_abs_error=float(error.mean()),
+            sample_count=sample_count,
+        )
+
+
+class ExplicitMPCController:
+    # NOTE: Drop-in replacement for `MPCController` that answers each tick with a
+    # table lookup instead of an online optimisation. Metrics outside of the
+    # tabulated grid are answered by the online solver instead.
+    def __init__(self, control_law: ExplicitControlLaw):
+        self.control_law = control_law
+        self._point: List[float] = [0.0] * len(control_law.axes)
+        self._online_controller: Optional[MPCController] = None
+        self.online_steps = 0
+
+    @classmethod
+    def from_file(cls, path: str) -> "ExplicitMPCController":
+        return cls(ExplicitControlLaw.load(path))
+
+    def linear_model(self) -> Tuple[NDArray, NDArray, NDArray]:
+        # NOTE: Model the law was built for, the QP backend sets it up without
+        # do-mpc
+        return CondensedQPController(**self.control_law.parameters).linear_model()
+
+    def initial_measurement(self, metrics_array: Array3Float):
+        self._point[:-1] = [float(value) for value in metrics_array]
+        self._point[-1] = 0.0
+
+    def skip_step(self, metrics_array: Array3Float):
+        # A tick without a solve applies `deviation_term = 0`
+        self._point[-1] = 0.0
+
+    def measurement_step(self, metrics_array: Array3Float) -> float:
+        self._point[:-1] = [float(value) for value in metrics_array]
+        if self.control_law.contains_point(self._point):
+            deviation_term = self.control_law.evaluate_point(self._point)
+        else:
+            deviation_term = self._online_step()
+        self._point[-1] = deviation_term
+        return 1 + deviation_term
+
+    def _online_step(self) -> float:
+        if self._online_controller is None:
+            print(
+                f"Metrics {self._point[:-1]} lie outside of the explicit control law, "
+                "falling back to the online solver"
+            )
+            # NOTE: Built on first use, most runs never leave the grid
+            self._online_controller = MPCController(
+                warm_start=True, **self.control_law.parameters
+            )
+            self._online_controller.initial_measurement(np.array(self._point[:-1]))
+        self.online_steps += 1
+        self._online_controller._controller.u0 = np.array(self._point[-1:])
+        return self._online_controller.measurement_step(np.array(self._point[:-1])) - 1
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="precompute the explicit MPC control law and save it to a file."
+    )
+    parser.add_argument("output_file", help="Path of the `.npz` file to write")
+    parser.add_argument(
+        "--metrics-points", type=int, default=11, help="Grid points per metric"
+    )
+    parser.add_argument(
+        "--deviation-term-points",
+        type=int,
+        default=21,
+        help="Grid points for the previous deviation term",
+    )
+    parser.add_argument(
+        "--check-samples",
+        type=int,
+        default=200,
+        help="Random samples compared against the online solution",
+    )
+    args = parser.parse_args()
+
+    control_law = ExplicitControlLaw.build(
+        metrics_axis=np.linspace(0, 1, args.metrics_points),
+        deviation_term_axis=np.linspace(-1, 1, args.deviation_term_points),
+    )
+    report = control_law.accuracy_check(args.check_samples)
+    print(
+        f"max abs error: {report.max_abs_error}, mean abs error: {report.mean_abs_error}"
+    )
+
+    control_law.save(args.output_file)
+    print(f"Saved explicit control law at {args.output_file}")
@@ -0,0 +1,97 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlsplit
+
+from .instrumentation import Registry, TickProfiler
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class HealthServer:
+    # NOTE: Serves the Kubernetes probes from a daemon thread. `/healthz`
+    # answers as soon as the process is up, `/ready` only once `ready` was set,
+    # i.e. the controller is built and the first measurement is in. The same
+    # server exports the scaler metrics at `/metrics`, and
+    # `/debug/profile?ticks=N` profiles the next N ticks, whose report is then
+    # served at `/debug/profile`.
+    def __init__(
+        self,
+        port: int,
+        host: str = "",
+        registry: Optional[Registry] = None,
+        profiler: Optional[TickProfiler] = None,
+    ):
+        self.registry = registry
+        self.profiler = profiler
+        self.ready = threading.Event()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def _handler(self):
+        health_server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlsplit(self.path)
+                registry = health_server.registry
+                profiler = health_server.profiler
+                match url.path:
+                    case "/healthz":
+                        self._respond(200, b"ok\n")
+                    case "/ready" if health_server.ready.is_set():
+                        self._respond(200, b"ready\n")
+                    case "/ready":
+                        self._respond(503, b"starting\n")
+                    case "/metrics" if registry is not None:
+                        self._respond(
+                            200, registry.render().encode(), PROMETHEUS_CONTENT_TYPE
+                        )
+                    case "/debug/profile" if profiler is not None:
+                        self._profile(profiler, parse_qs(url.query))
+                    case _:
+                        self._respond(404, b"not found\n")
+
+            def _profile(self, profiler: TickProfiler, query):
+                if "ticks" in query:
+                    try:
+                        ticks = int(query["ticks"][0])
+                    except ValueError:
+                        self._respond(400, b"ticks must be an integer\n")
+                        return
+                    profiler.request(ticks)
+                    self._respond(202, f"profiling {ticks} ticks\n".encode())
+                elif profiler.last_report is None:
+                    self._respond(404, b"no profile yet, request one with ?ticks=N\n")
+                else:
+                    self._respond(200, profiler.last_report.encode())
+
+            def _respond(
+                self, status: int, body: bytes, content_type: str = "text/plain"
+            ):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # Probes run every few seconds, keep them out of the log
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="health-server", daemon=True
+        )
+        self._thread.start()
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
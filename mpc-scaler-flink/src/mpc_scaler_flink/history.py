@@ -0,0 +1,170 @@
+import json
+import os
+from typing import BinaryIO, Optional
+
+import numpy as np
+from numpy.typing import NDArray
+
+# Bump when the layout of the spill files changes
+HISTORY_VERSION = 3
+DEFAULT_CAPACITY = 720
+
+
+def history_dtype(horizon: int, n_x: int = 3, n_u: int = 1) -> np.dtype:
+    # NOTE: One fixed-size record per controller step. `tick` numbers the
+    # ticks of the control loop, `step` the recorded steps. `job` is the job of
+    # the multi-job mode the step belongs to, 0 otherwise. `measurement` is
+    # the state the controller solved for, `raw_measurement` the metrics before
+    # any filtering. The predicted trajectories replace `store_full_solution`,
+    # a horizon of 0 leaves them out.
+    fields = [
+        ("step", np.int64),
+        ("tick", np.int64),
+        ("job", np.int32),
+        ("time", np.float64),
+        ("measurement", np.float64, (n_x,)),
+        ("raw_measurement", np.float64, (n_x,)),
+        ("scaling_factor", np.float64),
+        ("solve_time", np.float64),
+        ("iter_count", np.int32),
+        ("success", np.bool_),
+    ]
+    if horizon > 0:
+        fields += [
+            ("predicted_x", np.float64, (horizon + 1, n_x)),
+            ("predicted_u", np.float64, (horizon, n_u)),
+        ]
+    return np.dtype(fields)
+
+
+def spill_metadata_path(path: str) -> str:
+    return f"{path}.json"
+
+
+class ControllerHistory:
+    # NOTE: Ring buffer of the most recent controller steps in one preallocated
+    # structured array, memory stays flat however long the scaler runs. With
+    # `keep_every` only every k-th step is recorded. With `spill_path` the
+    # records that drop out of the ring are appended to a raw binary file,
+    # optionally only every `spill_every`-th of them, and can be read back
+    # with `load_spilled_history`. The spill file is flushed whenever the ring
+    # wraps, a killed pod loses at most one ring of spilled records.
+    def __init__(
+        self,
+        dtype: np.dtype,
+        capacity: int = DEFAULT_CAPACITY,
+        keep_every: int = 1,
+        spill_path: Optional[str] = None,
+        spill_every: int = 1,
+    ):
+        if capacity < 1:
+            raise ValueError(f"Expected a capacity of at least 1, got {capacity}")
+        if keep_every < 1 or spill_every < 1:
+            raise ValueError("keep_every and spill_every must be at least 1")
+        self._records = np.zeros(capacity, dtype)
+        self.keep_every = keep_every
+        self.spill_path = spill_path
+        self.spill_every = spill_every
+        self.steps = 0
+        self.count = 0
+        self.evicted = 0
+        self._next = 0
+        self._spill_file: Optional[BinaryIO] = None
+        if spill_path is not None:
+            self._spill_file = self._open_spill_file(spill_path, dtype)
+
+    @property
+    def capacity(self) -> int:
+        return len(self._records)
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self._records.dtype
+
+    def __len__(self) -> int:
+        return self.count
+
+    @staticmethod
+    def _open_spill_file(path: str, dtype: np.dtype) -> BinaryIO:
+        # NOTE: The layout is kept in a JSON sidecar, the spill file itself only
+        # holds the raw records so that appending never rewrites a header.
+        metadata = {"version": HISTORY_VERSION, "descr": dtype.descr}
+        metadata_path = spill_metadata_path(path)
+        if os.path.exists(path) and os.path.exists(metadata_path):
+            with open(metadata_path, "r") as f:
+                existing = json.load(f)
+            if existing != json.loads(json.dumps(metadata)):
+                raise ValueError(
+                    f"{path} holds records of a different layout, choose another file"
+                )
+        else:
+            with open(metadata_path, "w") as f:
+                json.dump(metadata, f)
+        return open(path, "ab")
+
+    def next_record(self) -> Optional[np.void]:
+        # NOTE: Returns the slot of the next step to fill in place, or `None`
+        # if the step is dropped by the downsampling. The slot is only valid
+        # until the next call.
+        step = self.steps
+        self.steps += 1
+        if step % self.keep_every:
+            return None
+
+        slot = self._next
+        if self.count == self.capacity:
+            self._evict(slot)
+        else:
+            self.count += 1
+        self._next = (slot + 1) % self.capacity
+        if self._next == 0:
+            self.flush()
+
+        record = self._records[slot]
+        record["step"] = step
+        return record
+
+    def _evict(self, slot: int):
+        if self._spill_file is not None and self.evicted % self.spill_every == 0:
+            self._spill_file.write(self._records[slot].tobytes())
+        self.evicted += 1
+
+    def recent(self, n: Optional[int] = None) -> NDArray:
+        # Copy of the last `n` (default all) records, oldest first
+        n = self.count if n is None else min(n, self.count)
+        indices = (self._next - n + np.arange(n)) % self.capacity
+        return self._records[indices]
+
+    def latest(self) -> Optional[np.void]:
+        if not self.count:
+            return None
+        return self._records[(self._next - 1) % self.capacity]
+
+    def flush(self):
+        if self._spill_file is not None:
+            self._spill_file.flush()
+
+    def close(self):
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+
+
+def load_spilled_history(path: str) -> NDArray:
+    # NOTE: Memory mapped, multi-week spill files are not read into memory.
+    with open(spill_metadata_path(path), "r") as f:
+        metadata = json.load(f)
+    if metadata["version"] != HISTORY_VERSION:
+        raise ValueError(
+            f"Expected history version {HISTORY_VERSION}, got {metadata['version']}"
+        )
+    # JSON turns the field tuples and shapes into lists
+    dtype = np.dtype(
+        [
+            (name, kind, *(tuple(shape) for shape in shape_or_none))
+            for name, kind, *shape_or_none in metadata["descr"]
+        ]
+    )
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype)
+    return np.memmap(path, dtype=dtype, mode="r")
@@ -0,0 +1,294 @@
+import argparse
+import itertools
+import json
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterator, Optional, Sequence, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+from .history import load_spilled_history
+
+DEFAULT_CHUNK_SIZE = 1_000_000
+# Columns of the CSV histories, in the state order of the controller model
+CSV_COLUMNS = ("utilisation", "backpressure_time", "busy_time", "scaling_factor")
+DYNAMICS_VERSION = 1
+
+# One chunk of a recorded history: unfiltered measurements `(n, 3)`, the
+# scaling factor applied after each measurement `(n,)`, the tick of each
+# measurement `(n,)` and the job it belongs to `(n,)`
+HistoryChunk = Tuple[NDArray, NDArray, NDArray, NDArray]
+
+
+@dataclass
+class DynamicsFit:
+    alpha: float
+    beta: float
+    gamma: float
+    sample_count: int
+    residual_rms: float
+    target_utilisation: float
+    target_backpressure: float
+    target_busy_time: float
+
+    def controller_parameters(self) -> Dict[str, float]:
+        return {"alpha": self.alpha, "beta": self.beta, "gamma": self.gamma}
+
+    def save(self, path: str):
+        with open(path, "w") as f:
+            json.dump({"version": DYNAMICS_VERSION, **asdict(self)}, f, indent=4)
+
+
+def load_dynamics(path: str) -> Dict[str, float]:
+    # NOTE: Keyword arguments of `MPCController` from a file written by
+    # `DynamicsFit.save`.
+    with open(path, "r") as f:
+        data = json.load(f)
+    if data.get("version") != DYNAMICS_VERSION:
+        raise ValueError(
+            f"Expected dynamics version {DYNAMICS_VERSION}, got {data.get('version')}"
+        )
+    return {name: float(data[name]) for name in ("alpha", "beta", "gamma")}
+
+
+class DynamicsIdentifier:
+    # NOTE: Fit of the dynamics in `MPCController._setup_model`,
+    #   x_next = x + a * (target - x) - BETA * deviation_term
+    # with `a = ALPHA` for utilisation and busy time and `a = GAMMA` for the
+    # backpressure time. Each transition gives three equations that are linear
+    # in (ALPHA, GAMMA, BETA). Only sums of products are accumulated, a chunk
+    # at a time, so memory does not depend on the length of the history.
+    #
+    # The measurements are noisy and enter both sides of the equations, and
+    # in closed loop the scaling factor depends on the same noise. Least
+    # squares is biased towards much faster dynamics then. The fit therefore
+    # uses the regressors of the previous tick as instruments, which are
+    # independent of the noise of the current and the next measurement:
+    #   theta = (Z^T X)^-1 Z^T y
+    # BETA is only determined if the scaling factors vary beyond a fixed
+    # feedback of the state, e.g. through the rounding to task slots.
+    def __init__(
+        self,
+        target_utilisation: float = 0.8,
+        target_busy_time: float = 0.8,
+        target_backpressure: float = 0,
+    ):
+        self.targets = np.array(
+            [target_utilisation, target_backpressure, target_busy_time]
+        )
+        # NOTE: Columns of the regressor of each state equation, i.e. which of
+        # (ALPHA, GAMMA) scales its `target - x` term.
+        self._decay_columns = np.array([[1, 0], [0, 1], [1, 0]], dtype=np.float64)
+        self.cross_moment = np.zeros((3, 3))
+        self.instrument_moment = np.zeros(3)
+        # For the residual of the fit
+        self.gram = np.zeros((3, 3))
+        self.moment = np.zeros(3)
+        self.sum_of_squares = 0.0
+        self.sample_count = 0
+        # Last two rows of every job, see `add_chunk`
+        self._carry: Dict[int, Tuple[NDArray, NDArray, NDArray]] = {}
+
+    def _regressors(self, x: NDArray, deviation_term: NDArray) -> NDArray:
+        # Shape: (n, 3 equations, 3 parameters)
+        regressors = np.empty((len(x), 3, 3))
+        regressors[:, :, :2] = (self.targets - x)[:, :, None] * self._decay_columns
+        regressors[:, :, 2] = -deviation_term[:, None]
+        return regressors
+
+    def add_chunk(
+        self,
+        measurements: NDArray,
+        scaling_factors: NDArray,
+        ticks: NDArray,
+        jobs: Optional[NDArray] = None,
+    ):
+        # NOTE: `ticks` number the measurements of each job, a transition is
+        # only used if the tick before it was recorded as well. The rows of
+        # the multi-job mode interleave several jobs, they are fit as separate
+        # histories of the same dynamics.
+        measurements = np.asarray(measurements, dtype=np.float64).reshape(-1, 3)
+        scaling_factors = np.asarray(scaling_factors, dtype=np.float64).ravel()
+        ticks = np.asarray(ticks, dtype=np.float64).ravel()
+        if jobs is None:
+            self._add_job_chunk(0, measurements, scaling_factors, ticks)
+            return
+        jobs = np.asarray(jobs).ravel()
+        for job in np.unique(jobs):
+            rows = jobs == job
+            self._add_job_chunk(
+                int(job), measurements[rows], scaling_factors[rows], ticks[rows]
+            )
+
+    def _add_job_chunk(
+        self, job: int, measurements: NDArray, scaling_factors: NDArray, ticks: NDArray
+    ):
+        # The last two rows of a chunk are kept for the first transitions of
+        # the next one
+        carry = self._carry.get(job)
+        if carry is not None:
+            measurements = np.concatenate([carry[0], measurements])
+            scaling_factors = np.concatenate([carry[1], scaling_factors])
+            ticks = np.concatenate([carry[2], ticks])
+        self._carry[job] = (measurements[-2:], scaling_factors[-2:], ticks[-2:])
+        if len(ticks) < 3:
+            return
+
+        consecutive = np.diff(ticks) == 1
+        valid = consecutive[:-1] & consecutive[1:]
+        deviation_terms = scaling_factors - 1
+        instruments = self._regressors(
+            measurements[:-2][valid], deviation_terms[:-2][valid]
+        )
+        x = measurements[1:-1][valid]
+        regressors = self._regressors(x, deviation_terms[1:-1][valid])
+        y = measurements[2:][valid] - x
+
+        self.cross_moment += np.einsum("nei,nej->ij", instruments, regressors)
+        self.instrument_moment += np.einsum("nei,ne->i", instruments, y)
+        self.gram += np.einsum("nei,nej->ij", regressors, regressors)
+        self.moment += np.einsum("nei,ne->i", regressors, y)
+        self.sum_of_squares += float(np.einsum("ne,ne->", y, y))
+        self.sample_count += len(x)
+
+    def end_history(self):
+        # The next chunk starts an unrelated history
+        self._carry = {}
+
+    def add_history(self, chunks: Iterator[HistoryChunk]):
+        for chunk in chunks:
+            self.add_chunk(*chunk)
+        self.end_history()
+
+    def fit(self) -> DynamicsFit:
+        if self.sample_count == 0:
+            raise ValueError("No three consecutive measurements to fit the dynamics to")
+        if np.linalg.matrix_rank(self.cross_moment) < 3:
+            raise ValueError(
+                "The history does not determine all of ALPHA, BETA and GAMMA, "
+                "it needs changing metrics and scaling factors"
+            )
+        theta = np.linalg.solve(self.cross_moment, self.instrument_moment)
+        residual = (
+            self.sum_of_squares - 2 * theta @ self.moment + theta @ self.gram @ theta
+        )
+        alpha, gamma, beta = (float(value) for value in theta)
+        return DynamicsFit(
+            alpha=alpha,
+            beta=beta,
+            gamma=gamma,
+            sample_count=self.sample_count,
+            residual_rms=float(np.sqrt(max(residual, 0) / (3 * self.sample_count))),
+            target_utilisation=float(self.targets[0]),
+            target_backpressure=float(self.targets[1]),
+            target_busy_time=float(self.targets[2]),
+        )
+
+
+def spilled_history_chunks(
+    path: str, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator[HistoryChunk]:
+    # NOTE: The spill file is memory mapped, only one chunk is in memory at a
+    # time. Ticks that were not recorded, e.g. by the downsampling or after a
+    # missed deadline, leave gaps in `tick` and break the transitions.
+    records = load_spilled_history(path)
+    for start in range(0, len(records), chunk_size):
+        chunk = records[start : start + chunk_size]
+        yield (
+            chunk["raw_measurement"],
+            chunk["scaling_factor"],
+            chunk["tick"],
+            chunk["job"],
+        )
+
+
+def csv_history_chunks(
+    path: str, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator[HistoryChunk]:
+    # NOTE: Comma separated, a header with the `CSV_COLUMNS` in any order and
+    # optionally a `tick` and a `job` column. Without them the rows are
+    # consecutive ticks of one job.
+    with open(path, "r") as f:
+        header = [name.strip() for name in f.readline().split(",")]
+        missing = set(CSV_COLUMNS) - set(header)
+        if missing:
+            raise ValueError(f"{path} lacks the columns {sorted(missing)}")
+        columns = [header.index(name) for name in CSV_COLUMNS]
+        tick_column = header.index("tick") if "tick" in header else None
+        job_column = header.index("job") if "job" in header else None
+        row = 0
+        while True:
+            lines = list(itertools.islice(f, chunk_size))
+            if not lines:
+                return
+            values = np.loadtxt(lines, delimiter=",", ndmin=2)
+            if tick_column is None:
+                ticks = np.arange(row, row + len(values), dtype=np.float64)
+            else:
+                ticks = values[:, tick_column]
+            if job_column is None:
+                jobs = np.zeros(len(values), dtype=np.int64)
+            else:
+                jobs = values[:, job_column].astype(np.int64)
+            row += len(values)
+            yield values[:, columns[:3]], values[:, columns[3]], ticks, jobs
+
+
+def history_chunks(
+    path: str, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator[HistoryChunk]:
+    if path.endswith(".csv"):
+        return csv_history_chunks(path, chunk_size)
+    return spilled_history_chunks(path, chunk_size)
+
+
+def identify_dynamics(
+    paths: Sequence[str], chunk_size: int = DEFAULT_CHUNK_SIZE, **targets: float
+) -> DynamicsFit:
+    identifier = DynamicsIdentifier(**targets)
+    for path in paths:
+        identifier.add_history(history_chunks(path, chunk_size))
+    return identifier.fit()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="fit ALPHA, BETA and GAMMA of the controller model to recorded histories."
+    )
+    parser.add_argument(
+        "histories",
+        nargs="+",
+        help="History spill files of the scaler, or CSV files with the columns "
+        + ", ".join(CSV_COLUMNS),
+    )
+    parser.add_argument(
+        "--output", required=True, help="Path of the JSON file to write"
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help="Samples read per chunk",
+    )
+    parser.add_argument("--target-utilisation", type=float, default=0.8)
+    parser.add_argument("--target-busy-time", type=float, default=0.8)
+    parser.add_argument("--target-backpressure", type=float, default=0)
+    args = parser.parse_args()
+
+    fit = identify_dynamics(
+        args.histories,
+        chunk_size=args.chunk_size,
+        target_utilisation=args.target_utilisation,
+        target_busy_time=args.target_busy_time,
+        target_backpressure=args.target_backpressure,
+    )
+    print(
+        f"alpha: {fit.alpha}, beta: {fit.beta}, gamma: {fit.gamma} "
+        f"({fit.sample_count} transitions, residual rms {fit.residual_rms})"
+    )
+    fit.save(args.output)
+    print(f"Saved dynamics at {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+import abc
+import bisect
+import contextlib
+import cProfile
+import io
+import math
+import os
+import pstats
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# NOTE: Bucket upper bounds in seconds, from sub-millisecond allocations up to
+# solves and API calls that take longer than a tick.
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+ITERATION_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 200, 500, 1000, 3000)
+
+Labels = Tuple[str, ...]
+
+
+def escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(names: Sequence[str], values: Labels, extra: str = "") -> str:
+    pairs = [
+        f'{name}="{escape_label_value(str(value))}"'
+        for name, value in zip(names, values)
+    ]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class Metric(abc.ABC):
+    # NOTE: Base of the metric types, one sample series per combination of
+    # label values. Updates come from the event loop and the solver thread, a
+    # lock per metric keeps them consistent for the exporter.
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    @abc.abstractmethod
+    def samples(self) -> List[str]: ...
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        return "\n".join(lines + self.samples())
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, label_names: Sequence[str] = ()):
+        super().__init__(name, help, label_names)
+        self._values: Dict[Labels, float] = {} if label_names else {(): 0.0}
+
+    def inc(self, amount: float = 1.0, *labels: str):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [
+            f"{self.name}{format_labels(self.label_names, labels)} {format_value(value)}"
+            for labels, value in values
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, *labels: str):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(Metric):
+    # NOTE: Fixed buckets, an observation is a binary search and one increment.
+    # The cumulative counts Prometheus expects are only built when exported.
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float]):
+        super().__init__(name, help)
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+
+    @property
+    def count(self) -> int:
+        return sum(self._counts)
+
+    @property
+    def sum(self) -> float:
+        return self._sum
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    @contextlib.contextmanager
+    def time(self) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip((*self.buckets, math.inf), counts):
+            cumulative += count
+            le = format_labels((), (), f'le="{format_value(bound)}"')
+            lines.append(f"{self.name}_bucket{le} {cumulative}")
+        lines.append(f"{self.name}_sum {format_value(total)}")
+        lines.append(f"{self.name}_count {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, label_names: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, label_names))
+
+    def gauge(self, name: str, help: str, label_names: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help, label_names))
+
+    def histogram(
+        self, name: str, help: str, buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, help, buckets))
+
+    def render(self) -> str:
+        # Prometheus text exposition format 0.0.4
+        return "\n".join(metric.render() for metric in self.metrics.values()) + "\n"
+
+
+class ScalerMetrics:
+    # NOTE: The metrics of one scaler instance. Split by stage, so slow
+    # reactions can be attributed to Prometheus, the solver, the allocator or
+    # the Kubernetes API server.
+    def __init__(self, registry: Optional[Registry] = None):
+        self.registry = registry or Registry()
+        r = self.registry
+        self.fetch_seconds = r.histogram(
+            "mpc_scaler_metric_fetch_seconds", "Time to fetch the Flink metrics"
+        )
+        self.solve_seconds = r.histogram(
+            "mpc_scaler_solve_seconds", "Wall time of one MPC measurement step"
+        )
+        self.solver_iterations = r.histogram(
+            "mpc_scaler_solver_iterations",
+            "Solver iterations of one MPC measurement step",
+            ITERATION_BUCKETS,
+        )
+        self.solver_steps = r.counter(
+            "mpc_scaler_solver_steps_total",
+            "MPC measurement steps by solver return status",
+            ("status",),
+        )
+        self.skipped_solves = r.counter(
+            "mpc_scaler_skipped_solves_total",
+            "Ticks without a solve because the estimated state barely moved",
+        )
+        self.allocate_seconds = r.histogram(
+            "mpc_scaler_allocate_seconds", "Time to allocate the pods"
+        )
+        self.actuation_seconds = r.histogram(
+            "mpc_scaler_actuation_seconds", "Time to patch the TaskManager deployments"
+        )
+        self.actuation_failures = r.counter(
+            "mpc_scaler_actuation_failures_total", "Failed deployment patches"
+        )
+        self.pod_churn = r.counter(
+            "mpc_scaler_pod_churn_total",
+            "Pods created or deleted by a reconfiguration-aware allocator",
+        )
+        self.tick_seconds = r.histogram(
+            "mpc_scaler_tick_seconds", "Time of one control loop tick"
+        )
+        self.tick_jitter_seconds = r.histogram(
+            "mpc_scaler_tick_jitter_seconds", "Delay of a tick behind its schedule"
+        )
+        self.skipped_ticks = r.counter(
+            "mpc_scaler_skipped_ticks_total", "Ticks skipped after a missed deadline"
+        )
+        self.scaling_factor = r.gauge(
+            "mpc_scaler_scaling_factor", "Last scaling factor of the controller"
+        )
+        self.task_slots = r.gauge(
+            "mpc_scaler_task_slots", "Task slots requested by the last tick"
+        )
+        self.startup_seconds = r.gauge(
+            "mpc_scaler_startup_seconds",
+            "Time to load each startup component",
+            ("component",),
+        )
+
+
+class TickProfiler:
+    # NOTE: cProfile is switched on at runtime for the next `ticks` ticks and
+    # off again afterwards, so it costs nothing while idle. Every profiled call
+    # gets its own profile and all of them are merged into one report.
+    # Since Python 3.12 cProfile is built on `sys.monitoring`: it records all
+    # threads while enabled and a second active profile raises `ValueError`.
+    # Profiled calls are therefore serialized, and calls of other threads that
+    # run meanwhile show up in the report as well.
+    def __init__(self, output_dir: Optional[str] = None, top: int = 30):
+        self.output_dir = output_dir
+        self.top = top
+        self.last_report: Optional[str] = None
+        self._remaining = 0
+        self._profiles: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+        self._call_lock = threading.Lock()
+
+    @property
+    def active(self) -> bool:
+        return self._remaining > 0
+
+    def request(self, ticks: int):
+        with self._lock:
+            self._remaining = ticks
+            self._profiles = []
+
+    def call(self, function: Callable[..., T], *args) -> T:
+        if not self.active:
+            return function(*args)
+        with self._call_lock:
+            profile = cProfile.Profile()
+            try:
+                return profile.runcall(function, *args)
+            finally:
+                with self._lock:
+                    self._profiles.append(profile)
+
+    def tick_done(self):
+        with self._lock:
+            if self._remaining <= 0:
+                return
+            self._remaining -= 1
+            if self._remaining > 0 or not self._profiles:
+                return
+            profiles, self._profiles = self._profiles, []
+
+        stats = pstats.Stats(profiles[0], stream=io.StringIO())
+        for profile in profiles[1:]:
+            stats.add(profile)
+        if self.output_dir is not None:
+            os.makedirs(self.output_dir, exist_ok=True)
+            path = os.path.join(
+                self.output_dir, f"tick-profile-{time.time():.0f}.pstats"
+            )
+            stats.dump_stats(path)
+            print(f"Saved tick profile at {path}")
+        stats.sort_stats("cumulative").print_stats(self.top)
+        self.last_report = stats.stream.getvalue()
@@ -1,64 +1,334 @@
+import argparse
+import asyncio
 from typing import List
 
-import numpy as np
-from kubernetes import client, config
-
-from mpc_scaler_flink.mpc_controller import MPCController
-
+# NOTE: Only modules without numpy, do-mpc or kubernetes are imported up
+# front, the health server answers before the components are loaded
+from .health import HealthServer
+from .instrumentation import ScalerMetrics, TickProfiler
 from .pod import Pod, PodCapacity
-from .pod_allocator import PodAllocator
-
+from .startup import (
+    ComponentLoader,
+    build_actuator,
+    build_allocator,
+    build_controller,
+    build_estimator,
+    build_metrics_source,
+    build_multi_job_controller,
+)
 
-def scale_deployment(deployment_name, namespace, replicas):
-    config.load_kube_config()
 
-    apps_v1 = client.AppsV1Api()
-
-    scale = {"spec": {"replicas": replicas}}
+def main():
+    parser = argparse.ArgumentParser(description="MPC based scaler for Flink.")
+    parser.add_argument(
+        "--tick-interval",
+        type=float,
+        default=5.0,
+        help="Seconds between two scaling decisions",
+    )
+    parser.add_argument(
+        "--max-ticks",
+        type=int,
+        default=None,
+        help="Stop after this many ticks (runs forever by default)",
+    )
+    parser.add_argument(
+        "--namespace",
+        default="default",
+        help="Namespace of the Flink TaskManager deployments",
+    )
+    parser.add_argument(
+        "--prometheus-url",
+        default="http://localhost:9090",
+        help="Base URL of the Prometheus server scraping the Flink metrics",
+    )
+    parser.add_argument(
+        "--job-name",
+        default=None,
+        help="Only use the task metrics of this Flink job",
+    )
+    parser.add_argument(
+        "--health-port",
+        type=int,
+        default=8080,
+        help="Port of the /healthz, /ready, /metrics and /debug/profile endpoints",
+    )
+    parser.add_argument(
+        "--profile-dir",
+        default=None,
+        help="Also save the tick profiles requested at /debug/profile as .pstats files",
+    )
+    parser.add_argument(
+        "--controller",
+        choices=("mpc", "qp", "explicit"),
+        default="mpc",
+        help="do-mpc based controller, the condensed QP backend solving the same "
+        "problem, or the lookup table of --control-law",
+    )
+    parser.add_argument(
+        "--control-law",
+        default=None,
+        help="Explicit control law written by build_explicit_mpc, "
+        "for --controller explicit",
+    )
+    parser.add_argument(
+        "--warm-start",
+        action="store_true",
+        help="Solve each tick with the SQP warm-started from the previous solution "
+        "(always on with --jobs-file)",
+    )
+    parser.add_argument(
+        "--allocator",
+        choices=("greedy", "optimal", "reconfiguration"),
+        default="greedy",
+        help="Greedy largest-pod-first allocation, the minimum-waste replica mix, "
+        "or the mix with the fewest pod changes",
+    )
+    parser.add_argument(
+        "--utilisation",
+        type=float,
+        default=0.8,
+        help="Utilisation factor of the greedy allocator, "
+        "targeted share of used task slots of the other ones",
+    )
+    parser.add_argument(
+        "--surplus-tolerance",
+        type=int,
+        default=0,
+        help="Extra task slots the reconfiguration allocator accepts to avoid pod changes",
+    )
+    parser.add_argument(
+        "--history-spill-file",
+        default=None,
+        help="Append controller steps that leave the in-memory history to this file, "
+        "with --jobs-file one file per parameter group with the group as suffix",
+    )
+    parser.add_argument(
+        "--dynamics-file",
+        default=None,
+        help="JSON file with the ALPHA, BETA and GAMMA fitted by identify_dynamics",
+    )
+    parser.add_argument(
+        "--jobs-file",
+        default=None,
+        help="JSON list of Flink jobs to scale from this one process, "
+        "replaces --namespace, --job-name, --dynamics-file and --controller",
+    )
+    parser.add_argument(
+        "--solver-workers",
+        type=int,
+        default=None,
+        help="Threads solving the jobs of a tick in the multi-job mode (default: CPUs)",
+    )
+    parser.add_argument(
+        "--no-estimator",
+        action="store_true",
+        help="Pass the raw metrics to the controller instead of Kalman filtered ones",
+    )
+    parser.add_argument(
+        "--solve-tolerance",
+        type=float,
+        default=0.01,
+        help="Skip the solve while the estimated state moved less than this",
+    )
+    args = parser.parse_args()
+    if args.controller != "mpc" and (args.warm_start or args.history_spill_file):
+        parser.error("--warm-start and --history-spill-file need --controller mpc")
+    if (args.controller == "explicit") != (args.control_law is not None):
+        parser.error("--controller explicit and --control-law go together")
+    if args.controller == "explicit" and args.dynamics_file is not None:
+        parser.error(
+            "--dynamics-file does not apply, the control law holds the dynamics"
+        )
+    if args.jobs_file is not None:
+        # NOTE: Every job sets these in the jobs file, and the multi-job mode
+        # always uses the warm-started MPC
+        ignored = [
+            flag
+            for flag, name in (
+                ("--namespace", "namespace"),
+                ("--job-name", "job_name"),
+                ("--dynamics-file", "dynamics_file"),
+                ("--controller", "controller"),
+            )
+            if getattr(args, name) != parser.get_default(name)
+        ]
+        if ignored:
+            parser.error(f"--jobs-file does not support {', '.join(ignored)}")
 
+    # NOTE: The probes answer right away, `/ready` only succeeds once all
+    # components are loaded. The controller setup dominates the startup and
+    # overlaps with connecting to Kubernetes and fetching the first metrics.
+    instrumentation = ScalerMetrics()
+    profiler = TickProfiler(args.profile_dir)
+    health_server = HealthServer(
+        args.health_port, registry=instrumentation.registry, profiler=profiler
+    )
+    health_server.start()
+    if args.jobs_file is not None:
+        run_jobs(args, instrumentation, profiler, health_server)
+        return
+    loader = ComponentLoader()
+    controller_future = loader.submit(
+        "controller",
+        build_controller,
+        args.history_spill_file,
+        args.dynamics_file,
+        args.warm_start,
+        args.controller,
+        args.control_law,
+    )
+    actuator_future = loader.submit("actuator", build_actuator, args.namespace)
+    metrics_source_future = loader.submit(
+        "metrics_source", build_metrics_source, args.prometheus_url, args.job_name
+    )
     try:
-        response = apps_v1.patch_namespaced_deployment_scale(
-            name=deployment_name, namespace=namespace, body=scale
+        metrics_source = metrics_source_future.result()
+        initial_measurement = loader.timings.timed(
+            "initial_measurement", metrics_source.fetch_with_retry
         )
-        print(f"Deployment {deployment_name} scaled to {replicas} replicas.")
-        return response
-    except client.ApiException as e:
-        print(f"Error scaling deployment: {e}")
-
-
-def main():
-
-    # deployment_name = "flink-session-cluster-taskmanager"
-    # namespace = "default"
-    # replicas = 3
-    # scale_deployment(deployment_name, namespace, replicas)
+        actuator = actuator_future.result()
+        controller = controller_future.result()
+    finally:
+        loader.close()
 
-    ### TODO: CONNECT TO PROMETHEUS INSTANCE ###
+    # The builders have imported numpy in the loader threads by now
+    from .control_loop import ControlLoop
 
-    controller = MPCController()
-    # TODO: read from Prometheus
-    controller.initial_measurement(np.array([0, 0, 0]))
-    allocator: PodAllocator = PodAllocator(utilisation_factor=0.8)
+    controller.initial_measurement(initial_measurement)
+    estimator = None
+    if not args.no_estimator:
+        estimator = build_estimator(
+            controller, initial_measurement[None, :], args.solve_tolerance
+        )
+    allocator = build_allocator(
+        args.allocator, args.utilisation, args.surplus_tolerance
+    )
 
     ### TODO: LOAD REPLICA CONFIGS ###
     pods: List[Pod] = [Pod(capacity, 1) for capacity in PodCapacity]
     print(pods)
 
-    i = 0
-    while i < 6:
-        print("infinite")
-        # TODO: read metrics from Prometheus
-        scaling_factor = controller.measurement_step(np.array([0, 0, 0]))
+    control_loop = ControlLoop(
+        controller,
+        allocator,
+        pods,
+        fetch_metrics=metrics_source.fetch_metrics,
+        actuate=actuator.actuate,
+        tick_interval=args.tick_interval,
+        instrumentation=instrumentation,
+        profiler=profiler,
+        estimator=estimator,
+    )
+    for component, duration in loader.timings.durations.items():
+        instrumentation.startup_seconds.set(duration, component)
+    health_server.ready.set()
+    print(loader.timings.summary())
+    try:
+        asyncio.run(control_loop.run(max_ticks=args.max_ticks))
+    finally:
+        actuator.close()
+        metrics_source.close()
+        if hasattr(controller, "history"):
+            controller.history.close()
+        health_server.close()
+    print(control_loop.statistics.summary())
+
+
+def run_jobs(
+    args: argparse.Namespace,
+    instrumentation: ScalerMetrics,
+    profiler: TickProfiler,
+    health_server: HealthServer,
+):
+    # NOTE: Multi-job mode, one control loop for all jobs of `--jobs-file`.
+    # The jobs share one batched controller, each job has its own metric
+    # source, pods and actuator.
+    import numpy as np
+
+    from .multi_job import (
+        MultiJobControlLoop,
+        gather_actuation,
+        gather_metrics,
+        load_jobs,
+    )
 
-        current_task_slot_count: int = sum(
-            [pod.replica_count * pod.task_slot_capacity.value for pod in pods]
+    jobs = load_jobs(args.jobs_file)
+    loader = ComponentLoader()
+    controller_future = loader.submit(
+        "controller",
+        build_multi_job_controller,
+        jobs,
+        args.solver_workers,
+        args.history_spill_file,
+    )
+    actuator_futures = [
+        loader.submit(
+            f"actuator_{job.name}",
+            build_actuator,
+            job.namespace,
+            job.deployment_names(),
         )
-        print(f"current_task_slot_count: {current_task_slot_count}")
+        for job in jobs
+    ]
+    metrics_source_futures = [
+        loader.submit(
+            f"metrics_source_{job.name}",
+            build_metrics_source,
+            args.prometheus_url,
+            job.job_name,
+        )
+        for job in jobs
+    ]
+    try:
+        metrics_sources = [future.result() for future in metrics_source_futures]
+        initial_measurement = loader.timings.timed(
+            "initial_measurement",
+            lambda: np.stack([source.fetch_with_retry() for source in metrics_sources]),
+        )
+        actuators = [future.result() for future in actuator_futures]
+        controller = controller_future.result()
+    finally:
+        loader.close()
 
-        new_task_slot_count: int = round(current_task_slot_count * scaling_factor)
-        print(f"new_task_slot_count: {new_task_slot_count}")
+    controller.initial_measurement(initial_measurement)
+    estimator = None
+    if not args.no_estimator:
+        estimator = build_estimator(
+            controller, initial_measurement, args.solve_tolerance
+        )
 
-        updated_pods: List[Pod] = allocator.allocate_pods(new_task_slot_count, pods)
-        print(updated_pods)
-        i += 1
-        ### TODO: update pod deployments in Kubernetes ###
+    pods: List[List[Pod]] = [
+        [Pod(capacity, 1) for capacity in PodCapacity] for _ in jobs
+    ]
+    control_loop = MultiJobControlLoop(
+        controller,
+        build_allocator(args.allocator, args.utilisation, args.surplus_tolerance),
+        pods,
+        fetch_metrics=gather_metrics(
+            [source.fetch_metrics for source in metrics_sources]
+        ),
+        actuate=gather_actuation(
+            [job.name for job in jobs], [actuator.actuate for actuator in actuators]
+        ),
+        tick_interval=args.tick_interval,
+        instrumentation=instrumentation,
+        profiler=profiler,
+        estimator=estimator,
+    )
+    for component, duration in loader.timings.durations.items():
+        instrumentation.startup_seconds.set(duration, component)
+    health_server.ready.set()
+    print(f"Scaling {len(jobs)} jobs with {len(controller.groups)} controllers")
+    print(loader.timings.summary())
+    try:
+        asyncio.run(control_loop.run(max_ticks=args.max_ticks))
+    finally:
+        for actuator in actuators:
+            actuator.close()
+        for source in metrics_sources:
+            source.close()
+        for history in controller.histories:
+            history.close()
+        health_server.close()
+    print(control_loop.statistics.summary())
@@ -0,0 +1,7 @@
+from typing import Literal, TypeAlias
+
+import numpy as np
+
+# NOTE: Utilisation, backpressure and busy time of the Flink job. Kept in its
+# own module so the metric and control loop code does not import do-mpc.
+Array3Float: TypeAlias = np.ndarray[Literal[3], np.dtype[np.float32]]
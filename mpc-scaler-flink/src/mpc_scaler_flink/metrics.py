@@ -0,0 +1,167 @@
+import asyncio
+import json
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import urllib3
+from numpy.typing import NDArray
+
+from .measurement import Array3Float
+
+# NOTE: Prometheus metric and scale factor per controller state, in the order of
+# the measurement (utilisation, backpressure_time, busy_time). The Flink task
+# metrics are reported in ms per second and scaled to a fraction of time.
+DEFAULT_METRICS: List[Tuple[str, float]] = [
+    ("flink_taskmanager_Status_JVM_CPU_Load", 1.0),
+    ("flink_taskmanager_job_task_backPressuredTimeMsPerSecond", 1e-3),
+    ("flink_taskmanager_job_task_busyTimeMsPerSecond", 1e-3),
+]
+# Errors of a single scrape that the scaler survives by reusing the last sample
+FETCH_ERRORS = (urllib3.exceptions.HTTPError, RuntimeError, ValueError)
+
+
+class MetricsRingBuffer:
+    # NOTE: Fixed-size buffer of the most recent samples. All memory is allocated
+    # up front, appending writes into the next row in place.
+    def __init__(self, capacity: int, width: int = 3):
+        if capacity < 2:
+            raise ValueError(f"Expected a capacity of at least 2, got {capacity}")
+        self._samples = np.zeros((capacity, width))
+        self._next = 0
+        self.count = 0
+
+    @property
+    def capacity(self) -> int:
+        return self._samples.shape[0]
+
+    def append(self, sample: NDArray) -> NDArray:
+        row = self._samples[self._next]
+        row[:] = sample
+        self._next = (self._next + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        return row
+
+    def latest(self) -> NDArray:
+        # NOTE: Returns a view, it stays valid until `capacity - 1` more appends.
+        if not self.count:
+            raise IndexError("latest() on an empty buffer")
+        return self._samples[self._next - 1]
+
+    def window(self, size: Optional[int] = None) -> NDArray:
+        # Returns a copy of the last `size` samples, oldest first
+        size = self.count if size is None else min(size, self.count)
+        return np.take(
+            self._samples,
+            np.arange(self._next - size, self._next),
+            axis=0,
+            mode="wrap",
+        )
+
+
+def batched_query(
+    metrics: List[Tuple[str, float]], job_name: Optional[str] = None
+) -> str:
+    # NOTE: `or` between selectors of different metrics returns all series in a
+    # single instant query. The metric name label is kept for the aggregation.
+    job_selector = f'{{job_name="{job_name}"}}' if job_name else ""
+    selectors = []
+    for name, _ in metrics:
+        # JVM metrics are reported per TaskManager and carry no job label.
+        selectors.append(name if "_job_" not in name else f"{name}{job_selector}")
+    return " or ".join(selectors)
+
+
+class PrometheusMetricsSource:
+    # NOTE: Pulls all controller metrics with one batched PromQL query per tick
+    # over a pooled keep-alive connection. The values of all operators and
+    # subtasks are averaged per metric, metrics without a series keep their
+    # previous value.
+    def __init__(
+        self,
+        url: str,
+        job_name: Optional[str] = None,
+        metrics: Optional[List[Tuple[str, float]]] = None,
+        buffer_capacity: int = 720,
+        timeout: float = 2.0,
+    ):
+        self.metrics = metrics or DEFAULT_METRICS
+        self.query = batched_query(self.metrics, job_name)
+        self.buffer = MetricsRingBuffer(buffer_capacity, len(self.metrics))
+        self._metric_index: Dict[str, int] = {
+            name: i for i, (name, _) in enumerate(self.metrics)
+        }
+        self._scale = np.array([scale for _, scale in self.metrics])
+        self._query_url = f"{url.rstrip('/')}/api/v1/query"
+        self._http = urllib3.PoolManager(
+            maxsize=1,
+            timeout=urllib3.Timeout(total=timeout),
+            retries=urllib3.Retry(total=2, backoff_factor=0.1),
+        )
+        self._last = np.zeros(len(self.metrics))
+
+    def _aggregate(self, result: List[Dict]) -> NDArray:
+        metric_index = np.fromiter(
+            (
+                self._metric_index.get(series["metric"].get("__name__"), -1)
+                for series in result
+            ),
+            dtype=int,
+            count=len(result),
+        )
+        values = np.fromiter(
+            (float(series["value"][1]) for series in result),
+            dtype=float,
+            count=len(result),
+        )
+        valid = (metric_index >= 0) & np.isfinite(values)
+        n_metrics = len(self.metrics)
+        counts = np.bincount(metric_index[valid], minlength=n_metrics)
+        sums = np.bincount(
+            metric_index[valid], weights=values[valid], minlength=n_metrics
+        )
+
+        sample = self._last.copy()
+        present = counts > 0
+        sample[present] = sums[present] / counts[present] * self._scale[present]
+        return sample
+
+    def fetch(self) -> Array3Float:
+        response = self._http.request(
+            "GET", self._query_url, fields={"query": self.query}
+        )
+        if response.status != 200:
+            raise RuntimeError(
+                f"Prometheus query failed with status {response.status}: {response.data!r}"
+            )
+        body = json.loads(response.data)
+        if body.get("status") != "success":
+            raise RuntimeError(f"Prometheus query failed: {body.get('error')}")
+
+        self._last = self._aggregate(body["data"]["result"])
+        return self.buffer.append(self._last)
+
+    def fetch_with_retry(self, attempts: int = 5, backoff: float = 0.5) -> Array3Float:
+        # NOTE: For the first measurement at startup. Prometheus may not be
+        # reachable yet, so failed scrapes are retried with exponential backoff
+        # before falling back to the last sample, like `fetch_metrics`.
+        for attempt in range(attempts):
+            try:
+                return self.fetch()
+            except FETCH_ERRORS as e:
+                print(f"Error fetching metrics (attempt {attempt + 1}/{attempts}): {e}")
+                if attempt + 1 < attempts:
+                    time.sleep(backoff * 2**attempt)
+        return self.buffer.append(self._last)
+
+    async def fetch_metrics(self) -> Array3Float:
+        try:
+            return await asyncio.get_running_loop().run_in_executor(None, self.fetch)
+        except FETCH_ERRORS as e:
+            # NOTE: A failed scrape must not stop the control loop, the last
+            # known sample is used again.
+            print(f"Error fetching metrics: {e}")
+            return self.buffer.append(self._last)
+
+    def close(self):
+        self._http.clear()
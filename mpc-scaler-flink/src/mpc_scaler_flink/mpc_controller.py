@@ -1,13 +1,44 @@
-from typing import Literal, TypeAlias
+import time
+from typing import Callable, Dict, Optional, Tuple
 
+import casadi
 import do_mpc
 import numpy as np
 from do_mpc.controller import MPC
 from do_mpc.model import Model
-from numpy._typing import NDArray, _UnknownType
-from numpy.core.multiarray import ndarray
+from numpy.typing import NDArray
 
-Array3Float: TypeAlias = np.ndarray[Literal[3], np.dtype[np.float32]]
+from .codegen import compiled_nlpsol, parameter_hash
+from .history import ControllerHistory, history_dtype
+from .measurement import Array3Float
+from .problem import (
+    DEVIATION_TERM_CHANGE_WEIGHT,
+    DEVIATION_TERM_LOWER_BOUND,
+    DEVIATION_TERM_WEIGHT,
+    SolverStepStats,
+)
+
+# NOTE: Solver used by the warm-start mode. With the discrete linear model and
+# quadratic cost the NLP is a QP, so a single SQP iteration backed by the
+# active-set `qrqp` solver reaches the same optimum as IPOPT. Unlike the interior
+# point method, the active-set method profits directly from the previous primal
+# and dual solution. Console output is disabled since printing dominates small solves.
+WARM_START_NLPSOL_OPTS = {
+    "expand": True,
+    "qpsol": "qrqp",
+    "qpsol_options": {
+        "print_iter": False,
+        "print_header": False,
+        "print_info": False,
+        "error_on_fail": False,
+    },
+    "max_iter": 5,
+    "print_header": False,
+    "print_iteration": False,
+    "print_status": False,
+    "print_time": False,
+    "error_on_fail": False,
+}
 
 
 class MPCController:
@@ -20,13 +51,37 @@ class MPCController:
         target_busy_time: float = 0.8,
         target_backpressure: float = 0,
         event_horizon: int = 10,
+        warm_start: bool = False,
+        alpha: float = 0.1,
+        beta: float = 0.5,
+        gamma: float = 0.1,
+        codegen_cache_dir: Optional[str] = None,
+        history: Optional[ControllerHistory] = None,
     ):
         self.TARGET_UTILISATION = target_utilisation
         self.TARGET_BUSY_TIME = target_busy_time
         self.TARGET_BACKPRESSURE_TIME = target_backpressure
         self.EVENT_HORIZON = event_horizon
+        self.ALPHA = alpha
+        self.BETA = beta
+        self.GAMMA = gamma
+        self.warm_start = warm_start
+        # NOTE: If set, the NLP functions are compiled to C once and the shared
+        # libraries are cached in this directory for subsequent runs.
+        self.codegen_cache_dir = codegen_cache_dir
+        self.last_step_stats: Optional[SolverStepStats] = None
+        # Ticks since the last solve, see `skip_step`
+        self._elapsed_steps = 1
+        # Tick and unfiltered metrics of the next step, see `annotate_step`
+        self._tick = 0
+        self._raw_measurement: Optional[Array3Float] = None
+        # NOTE: Bounded replacement for `store_full_solution`, see `history.py`.
+        if history is None:
+            history = ControllerHistory(history_dtype(event_horizon))
+        self.history = history
         self._model = self._setup_model()
         self._controller = self._setup_mpc(self._model)
+        self._setup_prediction_index(self._controller)
 
     def _setup_model(self):
         model_type = "discrete"
@@ -43,9 +98,9 @@ class MPCController:
         deviation_term = model.set_variable(var_type="_u", var_name="deviation_term")
 
         # Define parameters to control dynamics
-        ALPHA = 0.1
-        BETA = 0.5
-        GAMMA = 0.1
+        ALPHA = self.ALPHA
+        BETA = self.BETA
+        GAMMA = self.GAMMA
 
         # NOTE: Dynamics for utilisation: decrease when scaling up (deviation_term > 1), increase otherwise
         next_utilisation = (
@@ -86,7 +141,11 @@ class MPCController:
             collocation_type="radau",
             collocation_deg=2,
             collocation_ni=2,
-            store_full_solution=True,
+            # NOTE: do-mpc appends to `mpc.data` on every step without a limit,
+            # the steps are recorded in `self.history` instead.
+            store_full_solution=False,
+            store_lagr_multiplier=False,
+            store_solver_stats=[],
         )
 
         # NOTE: The objective is to minimise the deviation from the target values.
@@ -102,24 +161,241 @@ class MPCController:
             (model.x["utilisation"] - self.TARGET_UTILISATION) ** 2
             + (model.x["busy_time"] - self.TARGET_BUSY_TIME) ** 2
             + (model.x["backpressure_time"] - self.TARGET_BACKPRESSURE_TIME) ** 2
-            + 0.2 * model.u["deviation_term"] ** 2
+            + DEVIATION_TERM_WEIGHT * model.u["deviation_term"] ** 2
         )
 
         mpc.set_objective(mterm, lterm)
-        mpc.set_rterm(deviation_term=0.1)
+        mpc.set_rterm(deviation_term=DEVIATION_TERM_CHANGE_WEIGHT)
 
         # NOTE:
         # The cluster can at most be scaled down to 0%. (1 + `deviation_term` >= 0)
         # A `deviation_term` < -1 would lead to a negative scaling factor.
-        mpc.bounds["lower", "_u", "deviation_term"] = -1
+        mpc.bounds["lower", "_u", "deviation_term"] = DEVIATION_TERM_LOWER_BOUND
 
         mpc.setup()
+        if self.codegen_cache_dir is not None:
+            mpc.S = self._compiled_solver(
+                "S", "ipopt", lambda: mpc.S, mpc._settings.nlpsol_opts
+            )
+        if self.warm_start:
+            self._setup_warm_start(mpc)
         return mpc
 
+    def linear_model(self) -> Tuple[NDArray, NDArray, NDArray]:
+        # NOTE: `x_next = A @ x + B @ u + c` of the model in `_setup_model`,
+        # evaluated from its right-hand side so both always agree.
+        model = self._model
+        rhs = casadi.Function(
+            "rhs",
+            [model.x, model.u, model.p, model.tvp, model.z],
+            [
+                casadi.jacobian(model._rhs, model.x),
+                casadi.jacobian(model._rhs, model.u),
+                model._rhs,
+            ],
+        )
+        A, B, c = rhs(
+            np.zeros(model.n_x), np.zeros(model.n_u), [], [], np.zeros(model.n_z)
+        )
+        return A.full(), B.full(), c.full().ravel()
+
+    def parameters(self) -> Dict[str, float]:
+        return {
+            "target_utilisation": self.TARGET_UTILISATION,
+            "target_busy_time": self.TARGET_BUSY_TIME,
+            "target_backpressure": self.TARGET_BACKPRESSURE_TIME,
+            "event_horizon": self.EVENT_HORIZON,
+            "alpha": self.ALPHA,
+            "beta": self.BETA,
+            "gamma": self.GAMMA,
+        }
+
+    def _compiled_solver(
+        self,
+        name: str,
+        plugin: str,
+        build_solver: Callable[[], casadi.Function],
+        nlpsol_opts: Dict,
+    ) -> casadi.Function:
+        return compiled_nlpsol(
+            name,
+            plugin,
+            build_solver,
+            nlpsol_opts,
+            cache_dir=self.codegen_cache_dir,
+            key=parameter_hash(self.parameters()),
+        )
+
     def initial_measurement(self, metrics_array: Array3Float):
         self._controller.x0 = metrics_array
         self._controller.set_initial_guess()
 
+    def _setup_prediction_index(self, mpc: MPC):
+        # Flat indices of the predicted states at the start of every interval,
+        # the first one is the measurement, and of the predicted inputs of the
+        # first scenario
+        n_x = self._model.n_x
+        n_u = self._model.n_u
+        self._predicted_x_index = np.array(
+            mpc.opt_x.f["_x", :, 0, -1], dtype=int
+        ).reshape(-1, n_x)
+        self._predicted_u_index = np.array(mpc.opt_x.f["_u", :, 0], dtype=int).reshape(
+            -1, n_u
+        )
+        self._x_scaling = mpc._x_scaling.cat.full().ravel()
+        self._u_scaling = mpc._u_scaling.cat.full().ravel()
+
+    def annotate_step(self, tick: int, raw_measurement: Array3Float):
+        # NOTE: Called by the control loop before the step of a tick. The
+        # history records the tick of the loop's schedule, which also counts
+        # missed deadlines, and the metrics before the estimator filtered them.
+        # Without it the steps are numbered consecutively.
+        self._tick = tick
+        self._raw_measurement = raw_measurement
+
+    def _record_step(
+        self, metrics_array: Array3Float, scaling_factor: float, solved: bool = True
+    ):
+        tick, raw_measurement = self._tick, self._raw_measurement
+        self._tick += 1
+        self._raw_measurement = None
+        record = self.history.next_record()
+        if record is None:
+            return
+        record["tick"] = tick
+        record["time"] = time.time()
+        record["measurement"] = np.ravel(metrics_array)
+        record["raw_measurement"] = np.ravel(
+            metrics_array if raw_measurement is None else raw_measurement
+        )
+        record["scaling_factor"] = scaling_factor
+        if not solved:
+            # NOTE: A skipped solve succeeds without any iteration
+            record["solve_time"] = 0.0
+            record["iter_count"] = 0
+            record["success"] = True
+            if "predicted_x" in self.history.dtype.names:
+                record["predicted_x"] = np.nan
+                record["predicted_u"] = np.nan
+            return
+        stats = self.last_step_stats
+        record["solve_time"] = stats.solve_time
+        record["iter_count"] = stats.iter_count
+        record["success"] = stats.success
+        if "predicted_x" in self.history.dtype.names:
+            opt_x_num = self._controller.opt_x_num.cat.full().ravel()
+            record["predicted_x"] = opt_x_num[self._predicted_x_index] * self._x_scaling
+            record["predicted_u"] = opt_x_num[self._predicted_u_index] * self._u_scaling
+
+    def _setup_warm_start(self, mpc: MPC):
+        # NOTE: Flat indices into the NLP vectors, resolved once so that the
+        # per-tick warm start works on plain arrays instead of CasADi structures.
+        n_x = self._model.n_x
+        n_u = self._model.n_u
+        x_index = np.array(mpc.opt_x.f["_x", :], dtype=int).ravel()
+        u_index = np.array(mpc.opt_x.f["_u", :], dtype=int).ravel()
+
+        # NOTE: Shift every trajectory one step forward and repeat the last entry.
+        self._shift_dst = np.concatenate([x_index, u_index])
+        self._shift_src = np.concatenate(
+            [x_index[n_x:], x_index[-n_x:], u_index[n_u:], u_index[-n_u:]]
+        )
+        self._u0_index = u_index[:n_u]
+        self._x0_p_index = np.array(mpc.opt_p.f["_x0"], dtype=int)
+        self._u_prev_p_index = np.array(mpc.opt_p.f["_u_prev"], dtype=int)
+
+        self._lbx = mpc._lb_opt_x.cat
+        self._ubx = mpc._ub_opt_x.cat
+        self._warm_start_solver = self._build_warm_start_solver(mpc)
+
+    def _build_warm_start_solver(self, mpc: MPC) -> casadi.Function:
+        # NOTE: A new solver instance with its own memory and stats, e.g. for
+        # another thread. With a codegen cache the library is only compiled once.
+        def build_solver() -> casadi.Function:
+            return casadi.nlpsol(
+                "S_warm_start", "sqpmethod", mpc.nlp, WARM_START_NLPSOL_OPTS
+            )
+
+        if self.codegen_cache_dir is not None:
+            return self._compiled_solver(
+                "S_warm_start", "sqpmethod", build_solver, WARM_START_NLPSOL_OPTS
+            )
+        return build_solver()
+
+    def _warm_start_step(self, metrics_array: Array3Float) -> float:
+        mpc = self._controller
+
+        opt_x_guess = mpc.opt_x_num.cat.full().ravel()
+        opt_p = mpc.opt_p_num.cat.full().ravel()
+        if mpc.flags["initial_run"]:
+            # NOTE: One shift per tick since the previous solution was computed
+            for _ in range(min(self._elapsed_steps, self.EVENT_HORIZON)):
+                opt_x_guess[self._shift_dst] = opt_x_guess[self._shift_src]
+            lam_x0 = mpc.lam_x_num
+            lam_g0 = mpc.lam_g_num
+        else:
+            lam_x0 = 0
+            lam_g0 = 0
+
+        u_prev = mpc._u0.cat.full().ravel()
+        opt_p[self._x0_p_index] = np.ravel(metrics_array)
+        opt_p[self._u_prev_p_index] = u_prev
+
+        result = self._warm_start_solver(
+            x0=opt_x_guess,
+            lbx=self._lbx,
+            ubx=self._ubx,
+            lbg=mpc.nlp_cons_lb,
+            ubg=mpc.nlp_cons_ub,
+            p=opt_p,
+            lam_x0=lam_x0,
+            lam_g0=lam_g0,
+        )
+
+        # NOTE: Only the solver state needed for the next warm start is written
+        # back. The per-step bookkeeping in `mpc.data` is skipped on purpose.
+        opt_x_num = result["x"].full().ravel()
+        u0 = opt_x_num[self._u0_index] * self._u_scaling
+        mpc.opt_x_num.master = result["x"]
+        mpc.opt_p_num.master = casadi.DM(opt_p)
+        mpc.lam_x_num = result["lam_x"]
+        mpc.lam_g_num = result["lam_g"]
+        mpc.solver_stats = self._warm_start_solver.stats()
+        mpc.flags["initial_run"] = True
+        mpc._x0.master = casadi.DM(np.ravel(metrics_array))
+        mpc._u0.master = casadi.DM(u0)
+        mpc._t0 = mpc._t0 + mpc._settings.t_step
+
+        return float(u0[0])
+
+    def skip_step(self, metrics_array: Array3Float):
+        # NOTE: A tick without a solve for the state `metrics_array` keeps the
+        # pods, i.e. it applies `deviation_term = 0`. The rterm of the next
+        # solve penalises the change from that input, not from the last solved
+        # one. The tick is recorded with a scaling factor of 1.
+        mpc = self._controller
+        mpc.u0 = np.zeros(self._model.n_u)
+        mpc._t0 = mpc._t0 + mpc._settings.t_step
+        self._elapsed_steps += 1
+        self._record_step(metrics_array, 1.0, solved=False)
+
     def measurement_step(self, metrics_array: Array3Float) -> float:
-        deviation_term: ndarray = self._controller.make_step(metrics_array)[0]
-        return float(1 + deviation_term)
+        start = time.perf_counter()
+        if self.warm_start:
+            deviation_term = self._warm_start_step(metrics_array)
+        else:
+            deviation_term: NDArray = self._controller.make_step(metrics_array)[0]
+            self._controller.data.init_storage()
+        self._elapsed_steps = 1
+        solve_time = time.perf_counter() - start
+
+        solver_stats = self._controller.solver_stats
+        self.last_step_stats = SolverStepStats(
+            solve_time=solve_time,
+            iter_count=int(solver_stats.get("iter_count", 0)),
+            return_status=str(solver_stats.get("return_status", "")),
+            success=bool(solver_stats.get("success", False)),
+        )
+        scaling_factor = float(1 + deviation_term)
+        self._record_step(metrics_array, scaling_factor)
+        return scaling_factor
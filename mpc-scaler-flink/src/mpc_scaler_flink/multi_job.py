@@ -0,0 +1,544 @@
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+import casadi
+import numpy as np
+from numpy.typing import NDArray
+
+from .control_loop import ControlLoop
+from .estimation import KalmanEstimator
+from .history import DEFAULT_CAPACITY, ControllerHistory, history_dtype
+from .identification import load_dynamics
+from .instrumentation import ScalerMetrics, TickProfiler
+from .mpc_controller import MPCController
+from .pod import Pod, PodCapacity
+from .pod_allocator import PodAllocator
+from .problem import SolverStepStats
+
+
+@dataclass
+class JobConfig:
+    # NOTE: One Flink job of the multi-job mode. `job_name` selects its task
+    # metrics in Prometheus, `deployments` maps the capacity names (SMALL,
+    # MEDIUM, LARGE) to its TaskManager deployments.
+    name: str
+    job_name: Optional[str] = None
+    namespace: str = "default"
+    deployments: Optional[Dict[str, str]] = None
+    parameters: Dict[str, float] = field(default_factory=dict)
+    dynamics_file: Optional[str] = None
+
+    def controller_parameters(self) -> Dict[str, float]:
+        # Fitted dynamics first, explicit parameters take precedence
+        parameters = {}
+        if self.dynamics_file is not None:
+            parameters.update(load_dynamics(self.dynamics_file))
+        parameters.update(self.parameters)
+        return parameters
+
+    def deployment_names(self) -> Optional[Dict[PodCapacity, str]]:
+        if self.deployments is None:
+            return None
+        return {PodCapacity[name]: value for name, value in self.deployments.items()}
+
+
+def load_jobs(path: str) -> List[JobConfig]:
+    # A JSON list with one object per job, see `JobConfig`
+    with open(path, "r") as f:
+        jobs = [JobConfig(**job) for job in json.load(f)]
+    names = [job.name for job in jobs]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Job names in {path} are not unique")
+    return jobs
+
+
+class BatchedMPCController:
+    # NOTE: The warm-started MPC of `MPCController` for many jobs with the same
+    # parameters. A single template controller holds the do-mpc model and the
+    # NLP. The jobs only own their solver state, i.e. the previous solution,
+    # multipliers and parameters, as rows of stacked arrays. The jobs of a tick
+    # are split into `workers` contiguous chunks, each solved job by job by its
+    # own solver instance in a thread. CasADi releases the GIL while it
+    # solves, and separate instances keep the stats of every job, which a
+    # solver mapped over the jobs does not report.
+    #
+    # `history` records one row per job and tick with the job's row in `job`.
+    def __init__(
+        self,
+        jobs: int,
+        workers: Optional[int] = None,
+        codegen_cache_dir: Optional[str] = None,
+        history: Optional[ControllerHistory] = None,
+        **parameters: float,
+    ):
+        # NOTE: The steps are recorded in `history`, the template gets the
+        # smallest possible one.
+        self.template = MPCController(
+            warm_start=True,
+            codegen_cache_dir=codegen_cache_dir,
+            history=ControllerHistory(history_dtype(0), capacity=1),
+            **parameters,
+        )
+        if history is None:
+            history = ControllerHistory(
+                history_dtype(0), capacity=DEFAULT_CAPACITY * jobs
+            )
+        self.history = history
+        self.workers = workers or os.cpu_count() or 1
+        self.last_solve_time: Optional[float] = None
+        # Stats of the jobs solved by the last `measurement_step`, in its order
+        self.last_step_stats: List[SolverStepStats] = []
+        mpc = self.template._controller
+        self._solvers: List[casadi.Function] = [self.template._warm_start_solver]
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lbx = mpc._lb_opt_x.cat.full().ravel()
+        self._ubx = mpc._ub_opt_x.cat.full().ravel()
+        self._lbg = mpc.nlp_cons_lb.full().ravel()
+        self._ubg = mpc.nlp_cons_ub.full().ravel()
+
+        self.opt_x = np.zeros((jobs, mpc.opt_x.shape[0]))
+        self.opt_p = np.zeros((jobs, mpc.opt_p.shape[0]))
+        self.lam_x = np.zeros((jobs, mpc.opt_x.shape[0]))
+        self.lam_g = np.zeros((jobs, len(self._lbg)))
+        self.u0 = np.zeros((jobs, self.template._model.n_u))
+        # NOTE: Same meaning as `mpc.flags["initial_run"]`, only jobs that were
+        # solved before are warm started from their shifted solution.
+        self.started = np.zeros(jobs, dtype=bool)
+        # Ticks since the last solve of each job, see `skip_step`
+        self.elapsed_steps = np.ones(jobs, dtype=int)
+
+    @property
+    def jobs(self) -> int:
+        return len(self.started)
+
+    def parameters(self) -> Dict[str, float]:
+        return self.template.parameters()
+
+    def _chunk_solvers(self, jobs: int) -> List[casadi.Function]:
+        # One solver per chunk, built on first use
+        chunks = min(self.workers, jobs)
+        mpc = self.template._controller
+        while len(self._solvers) < chunks:
+            self._solvers.append(self.template._build_warm_start_solver(mpc))
+        if chunks > 1 and self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="batched-solver"
+            )
+        return self._solvers[:chunks]
+
+    def initial_measurement(
+        self, metrics_array: NDArray, jobs: Optional[NDArray] = None
+    ):
+        # `metrics_array` holds one row per job in `jobs` (default all jobs)
+        index = np.arange(self.jobs) if jobs is None else np.asarray(jobs)
+        mpc = self.template._controller
+        for job, metrics in zip(index, np.asarray(metrics_array).reshape(-1, 3)):
+            self.template.initial_measurement(metrics)
+            self.opt_x[job] = mpc.opt_x_num.cat.full().ravel()
+            self.opt_p[job] = mpc.opt_p_num.cat.full().ravel()
+        self.lam_x[index] = 0
+        self.lam_g[index] = 0
+        self.u0[index] = 0
+        self.started[index] = False
+        self.elapsed_steps[index] = 1
+
+    def _solve_chunk(
+        self,
+        solver: casadi.Function,
+        opt_x_guess: NDArray,
+        opt_p: NDArray,
+        lam_x0: NDArray,
+        lam_g0: NDArray,
+    ) -> Tuple[List[Dict[str, NDArray]], List[SolverStepStats]]:
+        results = []
+        stats = []
+        for job in range(len(opt_x_guess)):
+            start = time.perf_counter()
+            result = solver(
+                x0=opt_x_guess[job],
+                lbx=self._lbx,
+                ubx=self._ubx,
+                lbg=self._lbg,
+                ubg=self._ubg,
+                p=opt_p[job],
+                lam_x0=lam_x0[job],
+                lam_g0=lam_g0[job],
+            )
+            solve_time = time.perf_counter() - start
+            solver_stats = solver.stats()
+            results.append(result)
+            stats.append(
+                SolverStepStats(
+                    solve_time=solve_time,
+                    iter_count=int(solver_stats.get("iter_count", 0)),
+                    return_status=str(solver_stats.get("return_status", "")),
+                    success=bool(solver_stats.get("success", False)),
+                )
+            )
+        return results, stats
+
+    def measurement_step(
+        self,
+        metrics_array: NDArray,
+        jobs: Optional[NDArray] = None,
+        tick: int = 0,
+        raw_measurement: Optional[NDArray] = None,
+    ) -> NDArray:
+        # NOTE: Vectorised version of `MPCController._warm_start_step`. Returns
+        # the scaling factors of the jobs in `jobs` (default all jobs). A job
+        # whose solve failed keeps its pods with a scaling factor of 1, and its
+        # next solve starts cold.
+        template = self.template
+        index = np.arange(self.jobs) if jobs is None else np.asarray(jobs)
+        metrics_array = np.asarray(metrics_array).reshape(-1, 3)
+        start = time.perf_counter()
+
+        opt_x_guess = self.opt_x[index]
+        started = self.started[index]
+        # NOTE: One shift per tick since the previous solution was computed
+        elapsed_steps = np.minimum(self.elapsed_steps[index], template.EVENT_HORIZON)
+        for shift in range(1, template.EVENT_HORIZON + 1):
+            rows = started & (elapsed_steps >= shift)
+            if not rows.any():
+                break
+            shifted = opt_x_guess[rows]
+            shifted[:, template._shift_dst] = shifted[:, template._shift_src]
+            opt_x_guess[rows] = shifted
+        opt_p = self.opt_p[index]
+        opt_p[:, template._x0_p_index] = metrics_array
+        opt_p[:, template._u_prev_p_index] = self.u0[index]
+        lam_x0 = np.where(started[:, None], self.lam_x[index], 0.0)
+        lam_g0 = np.where(started[:, None], self.lam_g[index], 0.0)
+
+        solvers = self._chunk_solvers(len(index))
+        chunks = np.array_split(np.arange(len(index)), len(solvers))
+        arguments = [
+            (solver, opt_x_guess[rows], opt_p[rows], lam_x0[rows], lam_g0[rows])
+            for solver, rows in zip(solvers, chunks)
+        ]
+        if len(arguments) == 1:
+            solved = [self._solve_chunk(*arguments[0])]
+        else:
+            solved = list(
+                self._executor.map(lambda args: self._solve_chunk(*args), arguments)
+            )
+        results = [result for chunk_results, _ in solved for result in chunk_results]
+        self.last_step_stats = [
+            stats for _, chunk_stats in solved for stats in chunk_stats
+        ]
+
+        success = np.array([stats.success for stats in self.last_step_stats])
+        u0 = np.zeros((len(index), template._model.n_u))
+        for row, result in enumerate(results):
+            if not success[row]:
+                continue
+            opt_x_num = result["x"].full().ravel()
+            u0[row] = opt_x_num[template._u0_index] * template._u_scaling
+            self.opt_x[index[row]] = opt_x_num
+            self.lam_x[index[row]] = result["lam_x"].full().ravel()
+            self.lam_g[index[row]] = result["lam_g"].full().ravel()
+        self.opt_p[index] = opt_p
+        self.u0[index] = u0
+        self.started[index] = success
+        self.elapsed_steps[index] = 1
+        self.last_solve_time = time.perf_counter() - start
+
+        scaling_factors = 1 + u0[:, 0]
+        self._record_steps(
+            index, tick, metrics_array, raw_measurement, scaling_factors, solved=True
+        )
+        return scaling_factors
+
+    def skip_step(
+        self,
+        metrics_array: NDArray,
+        jobs: NDArray,
+        tick: int = 0,
+        raw_measurement: Optional[NDArray] = None,
+    ):
+        # NOTE: Same as `MPCController.skip_step` for the jobs in `jobs`
+        index = np.asarray(jobs)
+        self.u0[index] = 0
+        self.elapsed_steps[index] += 1
+        self._record_steps(
+            index,
+            tick,
+            np.asarray(metrics_array).reshape(-1, 3),
+            raw_measurement,
+            np.ones(len(index)),
+            solved=False,
+        )
+
+    def _record_steps(
+        self,
+        index: NDArray,
+        tick: int,
+        metrics_array: NDArray,
+        raw_measurement: Optional[NDArray],
+        scaling_factors: NDArray,
+        solved: bool,
+    ):
+        if raw_measurement is None:
+            raw_measurement = metrics_array
+        raw_measurement = np.asarray(raw_measurement).reshape(-1, 3)
+        now = time.time()
+        for row, job in enumerate(index):
+            record = self.history.next_record()
+            if record is None:
+                continue
+            record["tick"] = tick
+            record["job"] = job
+            record["time"] = now
+            record["measurement"] = metrics_array[row]
+            record["raw_measurement"] = raw_measurement[row]
+            record["scaling_factor"] = scaling_factors[row]
+            if solved:
+                stats = self.last_step_stats[row]
+                record["solve_time"] = stats.solve_time
+                record["iter_count"] = stats.iter_count
+                record["success"] = stats.success
+            else:
+                # NOTE: A skipped solve succeeds without any iteration
+                record["solve_time"] = 0.0
+                record["iter_count"] = 0
+                record["success"] = True
+
+
+class MultiJobController:
+    # NOTE: Jobs are grouped by their controller parameters, every group is
+    # one `BatchedMPCController`. Jobs with the same parameters thus share the
+    # model, and the memory grows with the number of distinct parameter sets
+    # plus a few kB of solver state per job. Every group records the steps of
+    # its jobs in its own history, with `history_spill_file` the one of group
+    # `g` spills to `<history_spill_file>.<g>`.
+    def __init__(
+        self,
+        job_parameters: Sequence[Dict[str, float]],
+        workers: Optional[int] = None,
+        codegen_cache_dir: Optional[str] = None,
+        history_spill_file: Optional[str] = None,
+    ):
+        keys = [json.dumps(parameters, sort_keys=True) for parameters in job_parameters]
+        unique_keys = list(dict.fromkeys(keys))
+        self.job_group = np.array([unique_keys.index(key) for key in keys], dtype=int)
+        self.groups: List[BatchedMPCController] = []
+        self._group_jobs: List[NDArray] = []
+        for group, key in enumerate(unique_keys):
+            jobs = np.flatnonzero(self.job_group == group)
+            self._group_jobs.append(jobs)
+            history = None
+            if history_spill_file is not None:
+                history = ControllerHistory(
+                    history_dtype(0),
+                    capacity=DEFAULT_CAPACITY * len(jobs),
+                    spill_path=f"{history_spill_file}.{group}",
+                )
+            self.groups.append(
+                BatchedMPCController(
+                    len(jobs),
+                    workers=workers,
+                    codegen_cache_dir=codegen_cache_dir,
+                    history=history,
+                    **json.loads(key),
+                )
+            )
+        # Row of each job in the arrays of its group
+        self.job_row = np.empty(len(keys), dtype=int)
+        for jobs in self._group_jobs:
+            self.job_row[jobs] = np.arange(len(jobs))
+        # Stats of every job's last step, `None` if it was not solved
+        self.last_step_stats: List[Optional[SolverStepStats]] = [None] * len(keys)
+        # Tick and unfiltered metrics of the next step, see `annotate_step`
+        self._tick = 0
+        self._raw_measurement: Optional[NDArray] = None
+
+    @property
+    def jobs(self) -> int:
+        return len(self.job_group)
+
+    @property
+    def histories(self) -> List[ControllerHistory]:
+        return [controller.history for controller in self.groups]
+
+    def _split(self, selected: NDArray) -> List[Tuple[BatchedMPCController, NDArray]]:
+        # Selected jobs of every group that has any
+        return [
+            (controller, jobs[selected[jobs]])
+            for controller, jobs in zip(self.groups, self._group_jobs)
+            if selected[jobs].any()
+        ]
+
+    def linear_model(self) -> Tuple[NDArray, NDArray, NDArray]:
+        # Models stacked per job, e.g. for `KalmanEstimator.from_controller`
+        models = [controller.template.linear_model() for controller in self.groups]
+        return tuple(
+            np.stack([models[group][i] for group in self.job_group]) for i in range(3)
+        )
+
+    def initial_measurement(self, metrics_array: NDArray):
+        metrics_array = np.asarray(metrics_array).reshape(self.jobs, 3)
+        for controller, jobs in self._split(np.ones(self.jobs, dtype=bool)):
+            controller.initial_measurement(metrics_array[jobs], self.job_row[jobs])
+
+    def annotate_step(self, tick: int, raw_measurement: NDArray):
+        # NOTE: Same as `MPCController.annotate_step`, one row per job
+        self._tick = tick
+        self._raw_measurement = np.asarray(raw_measurement).reshape(self.jobs, 3)
+
+    def measurement_step(
+        self, metrics_array: NDArray, solve: Optional[NDArray] = None
+    ) -> NDArray:
+        # NOTE: Solves the jobs selected by the boolean mask `solve` (default
+        # all), the other jobs keep their pods with a scaling factor of 1.
+        metrics_array = np.asarray(metrics_array).reshape(self.jobs, 3)
+        selected = np.ones(self.jobs, dtype=bool) if solve is None else solve
+        tick, raw_measurement = self._tick, self._raw_measurement
+        if raw_measurement is None:
+            raw_measurement = metrics_array
+        self._tick += 1
+        self._raw_measurement = None
+
+        scaling_factors = np.ones(self.jobs)
+        self.last_step_stats = [None] * self.jobs
+        for controller, jobs in self._split(selected):
+            scaling_factors[jobs] = controller.measurement_step(
+                metrics_array[jobs], self.job_row[jobs], tick, raw_measurement[jobs]
+            )
+            for job, stats in zip(jobs, controller.last_step_stats):
+                self.last_step_stats[job] = stats
+        for controller, jobs in self._split(~selected):
+            controller.skip_step(
+                metrics_array[jobs], self.job_row[jobs], tick, raw_measurement[jobs]
+            )
+        return scaling_factors
+
+    def skip_step(self, metrics_array: NDArray):
+        # A tick without any solve
+        self.measurement_step(metrics_array, np.zeros(self.jobs, dtype=bool))
+
+
+def task_slot_count(pods: List[Pod]) -> int:
+    return sum(pod.replica_count * pod.task_slot_capacity.value for pod in pods)
+
+
+class MultiJobControlLoop(ControlLoop):
+    # NOTE: The scheduling of `ControlLoop` with all jobs in one tick. The
+    # metrics of all jobs are fetched concurrently, the jobs that need a solve
+    # are solved in one batch in the solver thread, and all pod changes are
+    # actuated together. `pods` holds the pods of each job, `fetch_metrics`
+    # returns one row per job.
+    def __init__(
+        self,
+        controller: MultiJobController,
+        allocator: PodAllocator,
+        pods: List[List[Pod]],
+        fetch_metrics: Callable[[], Awaitable[NDArray]],
+        actuate: Callable[[List[List[Pod]]], Awaitable[Optional[Dict[str, bool]]]],
+        tick_interval: float = 5.0,
+        log_every: int = 10,
+        instrumentation: Optional[ScalerMetrics] = None,
+        profiler: Optional[TickProfiler] = None,
+        estimator: Optional[KalmanEstimator] = None,
+    ):
+        super().__init__(
+            controller,
+            allocator,
+            pods,
+            fetch_metrics=fetch_metrics,
+            actuate=actuate,
+            tick_interval=tick_interval,
+            log_every=log_every,
+            instrumentation=instrumentation,
+            profiler=profiler,
+            estimator=estimator,
+        )
+        self._last_deviation_terms = np.zeros(controller.jobs)
+
+    async def _tick(self, tick: int):
+        instrumentation = self.instrumentation
+        with instrumentation.fetch_seconds.time():
+            metrics = np.asarray(await self.fetch_metrics())
+        if self._actuation is not None:
+            await self._actuation
+            self._actuation = None
+
+        self.controller.annotate_step(tick, metrics)
+        solve = np.ones(self.controller.jobs, dtype=bool)
+        if self.estimator is not None:
+            metrics = self.estimator.step(metrics, self._last_deviation_terms[:, None])
+            solve = self.estimator.needs_solve()
+            self.estimator.mark_solved(solve)
+            instrumentation.skipped_solves.inc(int((~solve).sum()))
+        self._last_deviation_terms[:] = 0.0
+        if not solve.any():
+            self.controller.skip_step(metrics)
+            return
+
+        scaling_factors = await asyncio.get_running_loop().run_in_executor(
+            self.executor, self._solve_jobs, metrics, solve
+        )
+        self._last_deviation_terms[solve] = scaling_factors[solve] - 1
+
+        changed = False
+        with instrumentation.allocate_seconds.time():
+            for job in np.flatnonzero(solve):
+                pods = self.pods[job]
+                current_task_slot_count = task_slot_count(pods)
+                new_task_slot_count = round(
+                    current_task_slot_count * scaling_factors[job]
+                )
+                if new_task_slot_count != current_task_slot_count:
+                    print(
+                        f"job {job}: scaling_factor: {scaling_factors[job]}, task slots: "
+                        f"{current_task_slot_count} -> {new_task_slot_count}"
+                    )
+                self.pods[job], churn = self._allocate(new_task_slot_count, pods)
+                # NOTE: `churn` is None without `allocate_diff`, i.e. unknown
+                changed |= churn != 0
+        instrumentation.task_slots.set(sum(map(task_slot_count, self.pods)))
+        if changed or self._retry_actuation:
+            self._actuation = asyncio.create_task(self._actuate(self.pods))
+
+    def _solve_jobs(self, metrics: NDArray, solve: NDArray) -> NDArray:
+        instrumentation = self.instrumentation
+        with instrumentation.solve_seconds.time():
+            scaling_factors = self.profiler.call(
+                self.controller.measurement_step, metrics, solve
+            )
+        for step_stats in self.controller.last_step_stats:
+            if step_stats is not None:
+                instrumentation.solver_iterations.observe(step_stats.iter_count)
+                instrumentation.solver_steps.inc(1, step_stats.return_status)
+        return scaling_factors
+
+
+def gather_metrics(
+    fetchers: Sequence[Callable[[], Awaitable[NDArray]]],
+) -> Callable[[], Awaitable[NDArray]]:
+    # One `fetch_metrics` over the metric sources of all jobs
+    async def fetch_metrics() -> NDArray:
+        return np.stack(await asyncio.gather(*[fetch() for fetch in fetchers]))
+
+    return fetch_metrics
+
+
+def gather_actuation(
+    names: Sequence[str], actuators: Sequence[Callable[[List[Pod]], Awaitable]]
+) -> Callable[[List[List[Pod]]], Awaitable[Dict[str, bool]]]:
+    # One `actuate` over the actuators of all jobs, results keyed `job/deployment`
+    async def actuate(pods: List[List[Pod]]) -> Dict[str, bool]:
+        results = await asyncio.gather(
+            *[actuate(job_pods) for actuate, job_pods in zip(actuators, pods)]
+        )
+        return {
+            f"{name}/{deployment}": success
+            for name, result in zip(names, results)
+            for deployment, success in (result or {}).items()
+        }
+
+    return actuate
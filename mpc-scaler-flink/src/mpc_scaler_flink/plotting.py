@@ -0,0 +1,54 @@
+import multiprocessing
+from typing import Dict, List, Optional, Sequence
+
+
+def render_series(
+    series: Dict[str, Sequence[float]],
+    output_file: str,
+    columns: int = 1,
+    sharex: bool = False,
+    xlabel: str = "Time Step",
+    dpi: int = 100,
+    marker: Optional[str] = None,
+    colors: Optional[List[str]] = None,
+):
+    # NOTE: Imported here so that only the plotting subprocess pays for it
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    rows = -(-len(series) // columns)
+    fig, axs = plt.subplots(
+        rows, columns, sharex=sharex, figsize=(7 * columns, 2.5 * rows), squeeze=False
+    )
+    for i, (ax, (name, values)) in enumerate(zip(axs.flatten(), series.items())):
+        color = colors[i] if colors else None
+        ax.plot(values, label=name, color=color, marker=marker, markersize=4)
+        ax.set_ylabel(name)
+        if not sharex or i >= len(series) - columns:
+            ax.set_xlabel(xlabel)
+        ax.legend(loc="upper right")
+        ax.grid(True)
+
+    fig.tight_layout()
+    fig.savefig(output_file, dpi=dpi)
+    plt.close(fig)
+    print(f"Plot saved to '{output_file}'")
+
+
+def plot_in_background(
+    series: Dict[str, Sequence[float]], output_file: str, **kwargs
+) -> multiprocessing.Process:
+    # NOTE: Renders in a separate process so simulations are not blocked by
+    # matplotlib. The series are converted to plain lists, only the data that
+    # is plotted is sent to the process. Join the returned process to wait for
+    # the file.
+    data: Dict[str, List[float]] = {
+        name: [float(value) for value in values] for name, values in series.items()
+    }
+    process = multiprocessing.get_context("spawn").Process(
+        target=render_series, args=(data, output_file), kwargs=kwargs
+    )
+    process.start()
+    return process
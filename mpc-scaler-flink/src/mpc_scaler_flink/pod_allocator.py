@@ -1,6 +1,10 @@
-from typing import List
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Tuple
 
-from .pod import Pod
+import numpy as np
+
+from .pod import Pod, PodCapacity
 
 
 class PodAllocator:
@@ -31,3 +35,195 @@ class PodAllocator:
             allocated_pods[-1].replica_count += 1
 
         return allocated_pods
+
+
+class AllocationTable:
+    # NOTE: Unbounded knapsack over the pod capacities. For every capacity sum `c`
+    # the table stores the replica mix with the fewest pods reaching exactly `c`
+    # slots. The minimum-waste mix for `r` required slots is the one of the
+    # smallest reachable sum >= r. `target_utilisation` is the targeted fraction
+    # of used task slots, so `n` used slots require `n / target_utilisation`.
+    # The table grows by doubling, so lookups are O(1) amortised.
+    def __init__(
+        self,
+        capacities: Tuple[int, ...],
+        target_utilisation: float = 1.0,
+        initial_max_slots: int = 256,
+    ):
+        self.capacities = capacities
+        self.target_utilisation = target_utilisation
+        self.max_slots = 0
+        self._extend(initial_max_slots)
+
+    def _extend(self, max_slots: int):
+        required_slots = self.required_slots(np.arange(max_slots + 1))
+        # NOTE: One extra largest pod so that every requirement can be covered.
+        limit = int(required_slots[-1]) + max(self.capacities) + 1
+        unreachable = np.iinfo(np.int64).max // 2
+        pod_counts = np.full(limit, unreachable, dtype=np.int64)
+        pod_counts[0] = 0
+        replicas = np.zeros((limit, len(self.capacities)), dtype=np.int64)
+
+        for i, capacity in enumerate(self.capacities):
+            # NOTE: Within one residue class modulo `capacity` the recurrence
+            # f[j] = min(f[j], f[j - 1] + 1) becomes a running minimum of f[j] - j.
+            # Improved entries extend the mix of the last entry that was not
+            # improved by `j - source` pods of this capacity.
+            for residue in range(min(capacity, limit)):
+                counts = pod_counts[residue::capacity]
+                steps = np.arange(len(counts))
+                updated = np.minimum.accumulate(counts - steps) + steps
+                improved = updated < counts
+                source = np.maximum.accumulate(np.where(improved, 0, steps))
+
+                class_replicas = replicas[residue::capacity]
+                class_replicas[:] = class_replicas[source]
+                class_replicas[:, i] += steps - source
+                pod_counts[residue::capacity] = updated
+
+        reachable = np.flatnonzero(pod_counts < unreachable)
+        cover = reachable[np.searchsorted(reachable, required_slots)]
+        self.max_slots = max_slots
+        self._replicas = replicas[cover]
+
+    def required_slots(self, number_of_slots):
+        # NOTE: Rounding first keeps e.g. 8 / 0.8 from being provisioned as 11.
+        return np.ceil(
+            np.round(np.asarray(number_of_slots) / self.target_utilisation, 9)
+        ).astype(np.int64)
+
+    def replica_counts(self, number_of_slots: int) -> Dict[int, int]:
+        if number_of_slots > self.max_slots:
+            self._extend(max(number_of_slots, 2 * self.max_slots))
+
+        mix = self._replicas[max(number_of_slots, 0)].tolist()
+        return dict(zip(self.capacities, mix))
+
+
+@lru_cache(maxsize=16)
+def allocation_table(
+    capacities: Tuple[int, ...], target_utilisation: float
+) -> AllocationTable:
+    return AllocationTable(capacities, target_utilisation)
+
+
+class OptimalPodAllocator(PodAllocator):
+    # NOTE: Allocates the replica mix with the least unused task slots.
+    # `target_utilisation` is the targeted fraction of used task slots, see
+    # `AllocationTable`, not the rounding threshold of `PodAllocator`'s
+    # `utilisation_factor`, which is kept for callers of the base class only.
+    def __init__(
+        self, target_utilisation: float = 1.0, utilisation_factor: float = 1.0
+    ):
+        super().__init__(utilisation_factor)
+        self.target_utilisation = target_utilisation
+
+    def allocate_pods(self, number_of_slots: int, pods: List[Pod]) -> List[Pod]:
+        sorted_pods: List[Pod] = sorted(
+            pods, key=lambda p: p.task_slot_capacity.value, reverse=True
+        )
+        capacities = tuple(
+            sorted({pod.task_slot_capacity.value for pod in sorted_pods}, reverse=True)
+        )
+        counts = allocation_table(capacities, self.target_utilisation).replica_counts(
+            number_of_slots
+        )
+
+        for pod in sorted_pods:
+            pod.replica_count = counts[pod.task_slot_capacity.value]
+            # NOTE: Pods of the same capacity share one deployment.
+            counts[pod.task_slot_capacity.value] = 0
+
+        return sorted_pods
+
+
+@dataclass
+class PodAllocationDiff:
+    to_add: Dict[PodCapacity, int]
+    to_remove: Dict[PodCapacity, int]
+
+    @property
+    def churn(self) -> int:
+        return sum(self.to_add.values()) + sum(self.to_remove.values())
+
+    def apply(self, pods: List[Pod]) -> List[Pod]:
+        # NOTE: Expects one `Pod` per capacity, i.e. one deployment per capacity.
+        for pod in pods:
+            capacity = pod.task_slot_capacity
+            pod.replica_count += self.to_add.get(capacity, 0)
+            pod.replica_count -= self.to_remove.get(capacity, 0)
+        return pods
+
+
+class ReconfigurationAwareAllocator(OptimalPodAllocator):
+    # NOTE: Every created or deleted pod restarts Flink TaskManagers and triggers a
+    # rescale of the job. Instead of recomputing the mix from scratch, this
+    # allocator keeps the current pods and searches the mix with the fewest
+    # creations and deletions whose capacity lies between the required slots and
+    # the minimum-waste capacity plus `surplus_tolerance` slots.
+    # Ties are resolved in favour of less waste and then fewer pods.
+    def __init__(self, target_utilisation: float = 1.0, surplus_tolerance: int = 0):
+        super().__init__(target_utilisation)
+        self.surplus_tolerance = surplus_tolerance
+
+    def allocate_diff(self, number_of_slots: int, pods: List[Pod]) -> PodAllocationDiff:
+        capacities: List[PodCapacity] = sorted(
+            {pod.task_slot_capacity for pod in pods},
+            key=lambda c: c.value,
+            reverse=True,
+        )
+        values = np.array([capacity.value for capacity in capacities])
+        current = np.zeros(len(capacities), dtype=np.int64)
+        for pod in pods:
+            current[capacities.index(pod.task_slot_capacity)] += pod.replica_count
+
+        table = allocation_table(tuple(values.tolist()), self.target_utilisation)
+        optimal = np.array(
+            [table.replica_counts(number_of_slots)[v] for v in values.tolist()]
+        )
+        required_slots = int(table.required_slots(max(number_of_slots, 0)))
+        max_slots = int(optimal @ values) + self.surplus_tolerance
+
+        # NOTE: The minimum-waste mix bounds the churn of the best mix, so the
+        # replica counts of all but the smallest capacity only need to be searched
+        # within that distance of the current counts. The smallest capacity then
+        # follows from the remaining slots.
+        bound = int(np.abs(optimal - current).sum())
+        ranges = [np.arange(max(c - bound, 0), c + bound + 1) for c in current[:-1]]
+        grids = np.meshgrid(*ranges, indexing="ij")
+        candidates = (
+            np.stack([grid.ravel() for grid in grids], axis=1)
+            if ranges
+            else np.zeros((1, 0), dtype=np.int64)
+        )
+        candidates = candidates[
+            np.abs(candidates - current[:-1]).sum(axis=1) <= bound
+        ].astype(np.int64)
+        total_slots = np.arange(required_slots, max_slots + 1)
+
+        # Shape: (n_candidates, n_total_slots)
+        remaining = total_slots[None, :] - (candidates @ values[:-1])[:, None]
+        valid = (remaining >= 0) & (remaining % values[-1] == 0)
+        smallest_counts = remaining // values[-1]
+        churn = np.abs(candidates - current[:-1]).sum(axis=1)[:, None] + np.abs(
+            smallest_counts - current[-1]
+        )
+        pod_count = candidates.sum(axis=1)[:, None] + smallest_counts
+        waste = np.broadcast_to(total_slots - required_slots, valid.shape)
+
+        candidate_index, total_index = np.nonzero(valid)
+        best = np.lexsort((pod_count[valid], waste[valid], churn[valid]))[0]
+        candidate, total = candidate_index[best], total_index[best]
+        new_counts = np.append(candidates[candidate], smallest_counts[candidate, total])
+
+        delta = new_counts - current
+        return PodAllocationDiff(
+            to_add={c: int(max(d, 0)) for c, d in zip(capacities, delta)},
+            to_remove={c: int(max(-d, 0)) for c, d in zip(capacities, delta)},
+        )
+
+    def allocate_pods(self, number_of_slots: int, pods: List[Pod]) -> List[Pod]:
+        sorted_pods: List[Pod] = sorted(
+            pods, key=lambda p: p.task_slot_capacity.value, reverse=True
+        )
+        return self.allocate_diff(number_of_slots, sorted_pods).apply(sorted_pods)
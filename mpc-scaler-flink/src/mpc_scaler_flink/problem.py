@@ -0,0 +1,18 @@
+from dataclasses import dataclass
+
+# NOTE: Parts of the control problem shared by all controller backends. Kept
+# apart from `mpc_controller.py` so the QP backend does not import do-mpc.
+
+# NOTE: Weights of the `deviation_term` in the stage cost and of its change
+# between steps (`rterm`), as well as its lower bound.
+DEVIATION_TERM_WEIGHT = 0.2
+DEVIATION_TERM_CHANGE_WEIGHT = 0.1
+DEVIATION_TERM_LOWER_BOUND = -1
+
+
+@dataclass
+class SolverStepStats:
+    solve_time: float
+    iter_count: int
+    return_status: str
+    success: bool
@@ -0,0 +1,207 @@
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+from .measurement import Array3Float
+from .problem import (
+    DEVIATION_TERM_CHANGE_WEIGHT,
+    DEVIATION_TERM_LOWER_BOUND,
+    DEVIATION_TERM_WEIGHT,
+    SolverStepStats,
+)
+
+
+class BoxQPSolver:
+    # NOTE: Primal-dual active-set method for
+    #   min 0.5 * u^T H u + g^T u   s.t.   lower <= u <= upper
+    # with a constant positive definite `H`. Each iteration solves the reduced
+    # system on the free variables and updates the active sets from the signs of
+    # the gradient. Started from the previous active set it usually needs a
+    # single iteration to confirm the solution.
+    def __init__(self, H: NDArray, lower: NDArray, upper: NDArray, max_iter: int = 20):
+        self.H = H
+        self.lower = lower
+        self.upper = upper
+        self.max_iter = max_iter
+        # NOTE: Most ticks have no active bound, the full inverse covers that case.
+        self._H_inv = np.linalg.inv(H)
+
+    def solve(
+        self, g: NDArray, active_lower: NDArray, active_upper: NDArray
+    ) -> tuple[NDArray, NDArray, NDArray, int, bool]:
+        u = np.empty_like(g)
+        for iteration in range(1, self.max_iter + 1):
+            free = ~(active_lower | active_upper)
+            u[active_lower] = self.lower[active_lower]
+            u[active_upper] = self.upper[active_upper]
+            if free.all():
+                u = -self._H_inv @ g
+            elif free.any():
+                fixed = ~free
+                rhs = -g[free] - self.H[np.ix_(free, fixed)] @ u[fixed]
+                u[free] = np.linalg.solve(self.H[np.ix_(free, free)], rhs)
+
+            gradient = self.H @ u + g
+            new_active_lower = (free & (u < self.lower)) | (
+                active_lower & (gradient >= 0)
+            )
+            new_active_upper = (free & (u > self.upper)) | (
+                active_upper & (gradient <= 0)
+            )
+            if np.array_equal(new_active_lower, active_lower) and np.array_equal(
+                new_active_upper, active_upper
+            ):
+                return u, active_lower, active_upper, iteration, True
+            active_lower, active_upper = new_active_lower, new_active_upper
+
+        return (
+            np.clip(u, self.lower, self.upper),
+            active_lower,
+            active_upper,
+            iteration,
+            False,
+        )
+
+
+class CondensedQPController:
+    # NOTE: Alternative backend to `MPCController` for the same discrete linear
+    # model and cost. The state trajectory is eliminated with the dynamics
+    #   x_{k+1} = A x_k + B u_k + c
+    # so only the `EVENT_HORIZON` inputs remain as decision variables. All QP
+    # matrices depend on the parameters only and are built once.
+    def __init__(
+        self,
+        target_utilisation: float = 0.8,
+        target_busy_time: float = 0.8,
+        target_backpressure: float = 0,
+        event_horizon: int = 10,
+        alpha: float = 0.1,
+        beta: float = 0.5,
+        gamma: float = 0.1,
+    ):
+        self.TARGET_UTILISATION = target_utilisation
+        self.TARGET_BUSY_TIME = target_busy_time
+        self.TARGET_BACKPRESSURE_TIME = target_backpressure
+        self.EVENT_HORIZON = event_horizon
+        self.ALPHA = alpha
+        self.BETA = beta
+        self.GAMMA = gamma
+        self.last_step_stats: Optional[SolverStepStats] = None
+        self._setup_qp()
+
+    def parameters(self) -> Dict[str, float]:
+        return {
+            "target_utilisation": self.TARGET_UTILISATION,
+            "target_busy_time": self.TARGET_BUSY_TIME,
+            "target_backpressure": self.TARGET_BACKPRESSURE_TIME,
+            "event_horizon": self.EVENT_HORIZON,
+            "alpha": self.ALPHA,
+            "beta": self.BETA,
+            "gamma": self.GAMMA,
+        }
+
+    def linear_model(self) -> Tuple[NDArray, NDArray, NDArray]:
+        # Same `x_next = A @ x + B @ u + c` as `MPCController.linear_model`
+        return self._A, self._B, self._c
+
+    def _setup_qp(self):
+        N = self.EVENT_HORIZON
+        # NOTE: State order matches the measurement:
+        # (utilisation, backpressure_time, busy_time)
+        target = np.array(
+            [
+                self.TARGET_UTILISATION,
+                self.TARGET_BACKPRESSURE_TIME,
+                self.TARGET_BUSY_TIME,
+            ]
+        )
+        decay = np.array([self.ALPHA, self.GAMMA, self.ALPHA])
+        A = np.diag(1 - decay)
+        B = np.full((3, 1), -self.BETA)
+        c = decay * target
+        n_x = A.shape[0]
+        self._A, self._B, self._c = A, B, c
+
+        # NOTE: Stacked predictions X = [x_1, ..., x_N] = Phi x_0 + Gamma U + w
+        Phi = np.zeros((N * n_x, n_x))
+        Gamma = np.zeros((N * n_x, N))
+        w = np.zeros(N * n_x)
+        A_powers = [np.linalg.matrix_power(A, k) for k in range(N + 1)]
+        w_k = np.zeros(n_x)
+        for k in range(N):
+            rows = slice(k * n_x, (k + 1) * n_x)
+            w_k = A @ w_k + c
+            Phi[rows] = A_powers[k + 1]
+            w[rows] = w_k
+            for j in range(k + 1):
+                Gamma[rows, j] = (A_powers[k - j] @ B).ravel()
+
+        # NOTE: Input change penalty sum_k (u_k - u_{k-1})^2 with u_{-1} = u_prev
+        D = np.eye(N) - np.eye(N, k=-1)
+
+        self._Phi = Phi
+        self._Gamma = Gamma
+        self._offset = w - np.tile(target, N)
+        self._H = 2 * (
+            Gamma.T @ Gamma
+            + DEVIATION_TERM_WEIGHT * np.eye(N)
+            + DEVIATION_TERM_CHANGE_WEIGHT * D.T @ D
+        )
+        self._G_x0 = 2 * Gamma.T @ Phi
+        self._g_offset = 2 * Gamma.T @ self._offset
+
+        self._solver = BoxQPSolver(
+            self._H,
+            lower=np.full(N, float(DEVIATION_TERM_LOWER_BOUND)),
+            upper=np.full(N, np.inf),
+        )
+        self._u_prev = 0.0
+        self._active_lower = np.zeros(N, dtype=bool)
+        self._active_upper = np.zeros(N, dtype=bool)
+        self._elapsed_steps = 1
+
+    @property
+    def variable_count(self) -> int:
+        return self.EVENT_HORIZON
+
+    def initial_measurement(self, metrics_array: Array3Float):
+        self._u_prev = 0.0
+        self._active_lower[:] = False
+        self._active_upper[:] = False
+
+    def skip_step(self, metrics_array: Array3Float):
+        # A tick without a solve applies `deviation_term = 0`, see `MPCController`
+        self._u_prev = 0.0
+        self._elapsed_steps += 1
+
+    def measurement_step(self, metrics_array: Array3Float) -> float:
+        start = time.perf_counter()
+        g = self._G_x0 @ np.asarray(metrics_array, dtype=float) + self._g_offset
+        g[0] -= 2 * DEVIATION_TERM_CHANGE_WEIGHT * self._u_prev
+
+        # NOTE: Warm start from the previous active set shifted by the ticks
+        # since it was computed.
+        steps = min(self._elapsed_steps, self.EVENT_HORIZON)
+        active_lower = np.append(
+            self._active_lower[steps:], np.repeat(self._active_lower[-1], steps)
+        )
+        active_upper = np.append(
+            self._active_upper[steps:], np.repeat(self._active_upper[-1], steps)
+        )
+        self._elapsed_steps = 1
+        u, self._active_lower, self._active_upper, iter_count, success = (
+            self._solver.solve(g, active_lower, active_upper)
+        )
+
+        self._u_prev = float(u[0])
+        self.last_step_stats = SolverStepStats(
+            solve_time=time.perf_counter() - start,
+            iter_count=iter_count,
+            return_status=(
+                "Solve_Succeeded" if success else "Maximum_Iterations_Exceeded"
+            ),
+            success=success,
+        )
+        return 1 + self._u_prev
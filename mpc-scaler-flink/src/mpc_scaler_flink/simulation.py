@@ -0,0 +1,261 @@
+import argparse
+import time
+from dataclasses import dataclass
+from typing import List
+
+import numpy as np
+from numpy.typing import NDArray
+
+from .control_loop import Controller
+from .pod import Pod, PodCapacity
+from .pod_allocator import PodAllocator
+
+# Layout version of the `.rate.npz` files written by the senMLScenarioBuilder
+RATE_CURVE_VERSION = 1
+
+
+def load_rate_curve(path: str) -> NDArray:
+    # NOTE: Events per second at one second resolution from a rate curve saved
+    # by the senMLScenarioBuilder, i.e. the input rate of a generated scenario.
+    with np.load(path) as data:
+        if int(data["version"]) != RATE_CURVE_VERSION:
+            raise ValueError(
+                f"Expected rate curve version {RATE_CURVE_VERSION}, got {int(data['version'])}"
+            )
+        rates = data["rates"].astype(np.float64)
+        window_ms = float(data["window_ms"])
+    if window_ms < 1000:
+        # NOTE: Averages the windows of each second, like `RateCurve.resample`.
+        # A trailing partial second is the mean of its windows.
+        factor = int(round(1000 / window_ms))
+        if not np.isclose(factor * window_ms, 1000):
+            raise ValueError(f"Window {window_ms} ms does not divide one second")
+        usable = len(rates) // factor * factor
+        seconds = rates[:usable].reshape(-1, factor).mean(axis=1)
+        if usable < len(rates):
+            seconds = np.append(seconds, rates[usable:].mean())
+        return seconds
+    seconds = np.arange(int(np.ceil(len(rates) * window_ms / 1000)))
+    return rates[np.minimum(seconds * 1000 // window_ms, len(rates) - 1).astype(int)]
+
+
+def queue_lengths(queue: float, arrivals: NDArray, capacities: NDArray) -> NDArray:
+    # NOTE: Lindley recursion `q[t + 1] = max(q[t] + arrivals[t] - capacities[t], 0)`
+    # without a loop. With the partial sums `S` of the net arrivals it is
+    # `q[t + 1] = S[t] - min(-queue, min(S[:t + 1]))`.
+    net = np.cumsum(np.asarray(arrivals, dtype=np.float64) - capacities)
+    return net - np.minimum(np.minimum.accumulate(net), -queue)
+
+
+@dataclass
+class ClusterTrace:
+    # Per simulated second
+    rates: NDArray
+    slots: NDArray
+    lag: NDArray
+    processed: NDArray
+    metrics: NDArray
+
+
+@dataclass
+class SimulationReport:
+    seconds: int
+    ticks: int
+    rescales: int
+    max_lag: float
+    mean_lag: float
+    final_lag: float
+    lag_violation_seconds: int
+    slot_seconds: float
+    overprovisioned_slot_seconds: float
+    underprovisioned_slot_seconds: float
+    wall_time: float
+
+    def summary(self) -> str:
+        return (
+            f"{self.seconds}s simulated in {self.wall_time:.2f}s, "
+            f"ticks: {self.ticks}, rescales: {self.rescales}, "
+            f"lag (mean/max/final): {self.mean_lag:.0f}/{self.max_lag:.0f}/{self.final_lag:.0f}, "
+            f"seconds above the lag SLO: {self.lag_violation_seconds}, "
+            f"slot seconds: {self.slot_seconds:.0f} "
+            f"(over/under provisioned: {self.overprovisioned_slot_seconds:.0f}/"
+            f"{self.underprovisioned_slot_seconds:.0f})"
+        )
+
+
+class ClusterSimulator:
+    # NOTE: Fluid model of a Flink job at one second resolution. Each task slot
+    # processes `slot_throughput` events per second, events that cannot be
+    # processed queue up as consumer lag. The source is backpressured once the
+    # lag exceeds what the slots process in `buffer_seconds`. After every
+    # rescale the job restarts and processes nothing for `restart_seconds`.
+    #
+    # The metrics seen by the controller are the averages over the last tick in
+    # the order of the measurement (utilisation, backpressure_time, busy_time):
+    #   busy_time        processed / capacity
+    #   utilisation      idle_utilisation + (1 - idle_utilisation) * busy_time
+    #   backpressure     blocked share of the arrivals
+    # No metrics are reported while the job restarts, like the metric source
+    # the simulated one then keeps the previous values.
+    # Between two ticks the capacity only changes at a restart, so a tick is
+    # simulated with array operations instead of a loop over its seconds.
+    def __init__(
+        self,
+        slot_throughput: float = 100.0,
+        buffer_seconds: float = 1.0,
+        restart_seconds: int = 10,
+        idle_utilisation: float = 0.05,
+    ):
+        self.slot_throughput = slot_throughput
+        self.buffer_seconds = buffer_seconds
+        self.restart_seconds = restart_seconds
+        self.idle_utilisation = idle_utilisation
+
+    def advance(
+        self, lag: float, rates: NDArray, slots: NDArray, restarting: NDArray
+    ) -> ClusterTrace:
+        # Simulates consecutive seconds starting with `lag` queued events
+        rates = np.asarray(rates, dtype=np.float64)
+        slots = np.asarray(slots, dtype=np.float64)
+        capacities = np.where(restarting, 0.0, slots * self.slot_throughput)
+        lags = queue_lengths(lag, rates, capacities)
+        processed = np.concatenate([[lag], lags[:-1]]) + rates - lags
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            busy_time = np.where(
+                capacities > 0, processed / capacities, (lags > 0).astype(float)
+            )
+            blocked = lags - self.buffer_seconds * slots * self.slot_throughput
+            backpressure_time = np.where(
+                rates > 0, np.clip(blocked / rates, 0, 1), (blocked > 0).astype(float)
+            )
+        utilisation = self.idle_utilisation + (1 - self.idle_utilisation) * busy_time
+        metrics = np.stack([utilisation, backpressure_time, busy_time], axis=-1)
+        # NOTE: No tasks run during a restart, so no metrics are reported
+        metrics[restarting] = np.nan
+        return ClusterTrace(rates, slots, lags, processed, metrics)
+
+    def run(
+        self,
+        rates: NDArray,
+        controller: Controller,
+        allocator: PodAllocator,
+        pods: List[Pod],
+        tick_interval: int = 5,
+        min_slots: int = 1,
+        max_slots: int = 1024,
+        lag_slo_seconds: float = 10.0,
+    ) -> SimulationReport:
+        # NOTE: Closed loop, mirrors `ControlLoop._tick`. The controller gets
+        # the metrics of the last tick, its scaling factor is turned into pods
+        # by `allocator`, and the allocated task slots become the capacity of
+        # the next tick. `min_slots` keeps the job from being scaled to zero,
+        # from where no scaling factor could scale it up again, and `max_slots`
+        # is the size of the cluster.
+        start = time.perf_counter()
+        rates = np.asarray(rates, dtype=np.float64)
+        seconds = len(rates)
+        slots = np.empty(seconds)
+        lag = np.empty(seconds)
+        slot_count = max(task_slots(pods), min_slots)
+        restart_until = 0
+        last_lag = 0.0
+        metrics = np.zeros(3)
+        ticks = 0
+        rescales = 0
+
+        for tick_start in range(0, seconds, tick_interval):
+            window = slice(tick_start, min(tick_start + tick_interval, seconds))
+            offsets = np.arange(window.start, window.stop)
+            trace = self.advance(
+                last_lag,
+                rates[window],
+                np.full(len(offsets), slot_count),
+                offsets < restart_until,
+            )
+            slots[window] = trace.slots
+            lag[window] = trace.lag
+            last_lag = float(trace.lag[-1])
+            ticks += 1
+
+            reported = trace.metrics[~np.isnan(trace.metrics[:, 0])]
+            if len(reported):
+                metrics = reported.mean(axis=0)
+            scaling_factor = controller.measurement_step(metrics)
+            new_slot_count = min(
+                max(round(slot_count * scaling_factor), min_slots), max_slots
+            )
+            pods = allocator.allocate_pods(new_slot_count, pods)
+            allocated = max(task_slots(pods), min_slots)
+            if allocated != slot_count:
+                rescales += 1
+                restart_until = window.stop + self.restart_seconds
+                slot_count = allocated
+
+        # NOTE: Slots needed to process the arrivals of each second
+        needed = rates / self.slot_throughput
+        lag_seconds = lag / (np.maximum(slots, 1) * self.slot_throughput)
+        return SimulationReport(
+            seconds=seconds,
+            ticks=ticks,
+            rescales=rescales,
+            max_lag=float(lag.max(initial=0.0)),
+            mean_lag=float(lag.mean()) if seconds else 0.0,
+            final_lag=last_lag,
+            lag_violation_seconds=int((lag_seconds > lag_slo_seconds).sum()),
+            slot_seconds=float(slots.sum()),
+            overprovisioned_slot_seconds=float(np.maximum(slots - needed, 0).sum()),
+            underprovisioned_slot_seconds=float(np.maximum(needed - slots, 0).sum()),
+            wall_time=time.perf_counter() - start,
+        )
+
+
+def task_slots(pods: List[Pod]) -> int:
+    return sum(pod.replica_count * pod.task_slot_capacity.value for pod in pods)
+
+
+def main():
+    from .mpc_controller import MPCController
+
+    parser = argparse.ArgumentParser(
+        description="simulate the scaler in closed loop against a Flink cluster model."
+    )
+    parser.add_argument(
+        "rate_file",
+        help="Rate curve of a scenario (`.rate.npz`) written by the senMLScenarioBuilder",
+    )
+    parser.add_argument(
+        "--rate-scale", type=float, default=1.0, help="Factor applied to the rates"
+    )
+    parser.add_argument("--tick-interval", type=int, default=5)
+    parser.add_argument("--slot-throughput", type=float, default=100.0)
+    parser.add_argument("--restart-seconds", type=int, default=10)
+    parser.add_argument("--lag-slo", type=float, default=10.0, help="Seconds of lag")
+    parser.add_argument("--utilisation-factor", type=float, default=0.8)
+    parser.add_argument(
+        "--no-warm-start",
+        action="store_true",
+        help="Use the plain do_mpc solve instead of the warm-started SQP",
+    )
+    args = parser.parse_args()
+
+    rates = load_rate_curve(args.rate_file) * args.rate_scale
+    controller = MPCController(warm_start=not args.no_warm_start)
+    controller.initial_measurement(np.zeros(3))
+    pods: List[Pod] = [Pod(capacity, 1) for capacity in PodCapacity]
+    simulator = ClusterSimulator(
+        slot_throughput=args.slot_throughput, restart_seconds=args.restart_seconds
+    )
+    report = simulator.run(
+        rates,
+        controller,
+        PodAllocator(args.utilisation_factor),
+        pods,
+        tick_interval=args.tick_interval,
+        lag_slo_seconds=args.lag_slo,
+    )
+    print(report.summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class StartupTimings:
+    # NOTE: Wall time per startup component. The components are loaded
+    # concurrently, so the total is shorter than their sum.
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.durations: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def timed(self, name: str, build: Callable[..., T], *args) -> T:
+        start = time.perf_counter()
+        try:
+            return build(*args)
+        finally:
+            with self._lock:
+                self.durations[name] = time.perf_counter() - start
+
+    def total(self) -> float:
+        return time.perf_counter() - self.started
+
+    def summary(self) -> str:
+        components = ", ".join(
+            f"{name}: {duration * 1e3:.0f}" for name, duration in self.durations.items()
+        )
+        return f"startup ms (total {self.total() * 1e3:.0f}): {components}"
+
+
+class ComponentLoader:
+    # NOTE: Imports and builds the scaler components in worker threads. The
+    # heavy modules (numpy, do-mpc, casadi, kubernetes) are imported by the
+    # build functions, so their import and setup overlaps with the network
+    # round trips of the other components instead of delaying the process
+    # start.
+    def __init__(self, timings: Optional[StartupTimings] = None, max_workers: int = 3):
+        self.timings = timings or StartupTimings()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="startup"
+        )
+
+    def submit(self, name: str, build: Callable[..., T], *args) -> "Future[T]":
+        return self._executor.submit(self.timings.timed, name, build, *args)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def build_controller(
+    history_spill_file: Optional[str] = None,
+    dynamics_file: Optional[str] = None,
+    warm_start: bool = False,
+    backend: str = "mpc",
+    control_law_file: Optional[str] = None,
+):
+    from .history import ControllerHistory, history_dtype
+    from .identification import load_dynamics
+
+    if backend == "explicit":
+        from .explicit_mpc import ExplicitMPCController
+
+        # NOTE: Lookup table written by `build_explicit_mpc`, it holds the
+        # parameters it was built for and records no history
+        if control_law_file is None:
+            raise ValueError("The explicit backend needs a control law file")
+        if history_spill_file is not None or warm_start or dynamics_file is not None:
+            raise ValueError(
+                "The explicit backend supports neither a history, the warm start "
+                "nor a dynamics file"
+            )
+        return ExplicitMPCController.from_file(control_law_file)
+    # NOTE: Fitted ALPHA, BETA and GAMMA, see `identification.py`
+    dynamics = load_dynamics(dynamics_file) if dynamics_file is not None else {}
+    if backend == "qp":
+        from .qp_controller import CondensedQPController
+
+        # NOTE: Same problem as a condensed QP, it records no history
+        if history_spill_file is not None or warm_start:
+            raise ValueError(
+                "The QP backend supports neither a history nor the warm start"
+            )
+        return CondensedQPController(**dynamics)
+    if backend != "mpc":
+        raise ValueError(f"Unknown controller backend {backend!r}")
+
+    from .mpc_controller import MPCController
+
+    controller = MPCController(warm_start=warm_start, **dynamics)
+    if history_spill_file is not None:
+        controller.history = ControllerHistory(
+            history_dtype(controller.EVENT_HORIZON), spill_path=history_spill_file
+        )
+    return controller
+
+
+def build_estimator(controller, initial_measurement, solve_tolerance: float):
+    # NOTE: One stream per row of `initial_measurement`, i.e. per job
+    from .estimation import KalmanEstimator
+
+    estimator = KalmanEstimator.from_controller(
+        controller,
+        streams=len(initial_measurement),
+        solve_tolerance=solve_tolerance,
+    )
+    estimator.update(initial_measurement)
+    return estimator
+
+
+def build_allocator(
+    kind: str = "greedy", utilisation: float = 0.8, surplus_tolerance: int = 0
+):
+    from .pod_allocator import (
+        OptimalPodAllocator,
+        PodAllocator,
+        ReconfigurationAwareAllocator,
+    )
+
+    # NOTE: `utilisation` is the `utilisation_factor` of the greedy allocator
+    # and the `target_utilisation` of the minimum-waste one
+    if kind == "greedy":
+        return PodAllocator(utilisation_factor=utilisation)
+    if kind == "optimal":
+        return OptimalPodAllocator(target_utilisation=utilisation)
+    if kind == "reconfiguration":
+        return ReconfigurationAwareAllocator(
+            target_utilisation=utilisation, surplus_tolerance=surplus_tolerance
+        )
+    raise ValueError(f"Unknown allocator {kind!r}")
+
+
+def build_actuator(namespace: str, deployment_names: Optional[Dict] = None):
+    from .actuator import KubernetesActuator
+
+    return KubernetesActuator(namespace=namespace, deployment_names=deployment_names)
+
+
+def build_metrics_source(prometheus_url: str, job_name: Optional[str]):
+    from .metrics import PrometheusMetricsSource
+
+    return PrometheusMetricsSource(prometheus_url, job_name)
+
+
+def build_multi_job_controller(
+    jobs, workers: Optional[int] = None, history_spill_file: Optional[str] = None
+):
+    # `jobs` are the `JobConfig`s of the multi-job mode
+    from .multi_job import MultiJobController
+
+    return MultiJobController(
+        [job.controller_parameters() for job in jobs],
+        workers=workers,
+        history_spill_file=history_spill_file,
+    )
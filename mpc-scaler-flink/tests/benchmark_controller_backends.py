@@ -0,0 +1,105 @@
+import contextlib
+import io
+import json
+import multiprocessing
+import resource
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from mpc_scaler_flink.mpc_controller import MPCController
+from mpc_scaler_flink.qp_controller import CondensedQPController
+
+BACKENDS = ["do_mpc", "do_mpc_warm_start", "condensed_qp"]
+
+
+def load_measurements(json_filename: str) -> np.ndarray:
+    with open(json_filename, "r") as f:
+        time_series_data = json.load(f)
+
+    return np.array(
+        [
+            time_series_data["sinusoidal_series"]["data"],
+            time_series_data["linear_series"]["data"],
+            time_series_data["ascending_sinusoidal_series"]["data"],
+        ]
+    ).T
+
+
+def max_rss_kib() -> int:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_backend(backend: str, measurements: np.ndarray) -> Dict[str, float]:
+    # NOTE: All heavy modules are already imported at this point, the RSS
+    # difference only covers building and running the controller.
+    rss_before = max_rss_kib()
+
+    start = time.perf_counter()
+    match backend:
+        case "do_mpc":
+            controller = MPCController()
+        case "do_mpc_warm_start":
+            controller = MPCController(warm_start=True)
+        case "condensed_qp":
+            controller = CondensedQPController()
+        case _:
+            raise ValueError(f"Unknown backend {backend}")
+    setup_time = time.perf_counter() - start
+
+    if isinstance(controller, MPCController):
+        variable_count = controller._controller.opt_x.shape[0]
+        constraint_count = controller._controller.nlp_cons.shape[0]
+    else:
+        variable_count = controller.variable_count
+        constraint_count = 0
+
+    controller.initial_measurement(np.array([0, 0, 0]))
+    step_times: List[float] = []
+    scaling_factors: List[float] = []
+    # NOTE: IPOPT prints its banner and iterations to stdout.
+    with contextlib.redirect_stdout(io.StringIO()):
+        for measurement in measurements:
+            start = time.perf_counter()
+            scaling_factors.append(controller.measurement_step(measurement))
+            step_times.append(time.perf_counter() - start)
+
+    return {
+        "variables": variable_count,
+        "constraints": constraint_count,
+        "setup_ms": setup_time * 1e3,
+        "rss_delta_kib": max_rss_kib() - rss_before,
+        "step_median_ms": float(np.median(step_times)) * 1e3,
+        "step_p99_ms": float(np.percentile(step_times, 99)) * 1e3,
+        "scaling_factors": scaling_factors,
+    }
+
+
+def main():
+    measurements = load_measurements("test_time_series.json")
+
+    # NOTE: Each backend runs in a fresh process so the RSS numbers do not overlap.
+    context = multiprocessing.get_context("spawn")
+    results: Dict[str, Dict[str, float]] = {}
+    for backend in BACKENDS:
+        with context.Pool(1) as pool:
+            results[backend] = pool.apply(run_backend, (backend, measurements))
+
+    reference = np.array(results["do_mpc"]["scaling_factors"])
+    print(
+        f"{'backend':<20}{'vars':>6}{'cons':>6}{'setup ms':>10}{'rss KiB':>10}"
+        f"{'median ms':>11}{'p99 ms':>9}{'max diff':>10}"
+    )
+    for backend, result in results.items():
+        max_diff = np.max(np.abs(np.array(result["scaling_factors"]) - reference))
+        print(
+            f"{backend:<20}{result['variables']:>6}{result['constraints']:>6}"
+            f"{result['setup_ms']:>10.1f}{result['rss_delta_kib']:>10}"
+            f"{result['step_median_ms']:>11.3f}{result['step_p99_ms']:>9.3f}"
+            f"{max_diff:>10.1e}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import argparse
+import contextlib
+import importlib
+import io
+import multiprocessing
+import time
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+# NOTE: Modules in import order and the setup of each startup component. The
+# dependencies come first, so the package modules only show their own cost.
+# numpy is already imported by this script and not measured.
+COMPONENTS: Dict[str, Tuple[List[str], str]] = {
+    "entry_point": (["mpc_scaler_flink"], "none"),
+    "controller": (
+        ["casadi", "do_mpc", "mpc_scaler_flink.mpc_controller"],
+        "controller",
+    ),
+    "controller_warm_start": (
+        ["casadi", "do_mpc", "mpc_scaler_flink.mpc_controller"],
+        "controller_warm_start",
+    ),
+    "controller_qp": (["mpc_scaler_flink.qp_controller"], "controller_qp"),
+    "actuator": (["kubernetes", "mpc_scaler_flink.actuator"], "actuator"),
+    "metrics_source": (["urllib3", "mpc_scaler_flink.metrics"], "metrics_source"),
+}
+
+
+def setup_component(setup: str) -> Callable[[], object]:
+    match setup:
+        case "none":
+            return lambda: None
+        case "controller":
+            from mpc_scaler_flink.mpc_controller import MPCController
+
+            return MPCController
+        case "controller_warm_start":
+            from mpc_scaler_flink.mpc_controller import MPCController
+
+            return lambda: MPCController(warm_start=True)
+        case "controller_qp":
+            from mpc_scaler_flink.qp_controller import CondensedQPController
+
+            return CondensedQPController
+        case "actuator":
+            from kubernetes import client
+
+            from mpc_scaler_flink.actuator import KubernetesActuator
+
+            # NOTE: No cluster is needed, the client only connects on a patch.
+            return lambda: KubernetesActuator(api_client=client.ApiClient())
+        case "metrics_source":
+            from mpc_scaler_flink.metrics import PrometheusMetricsSource
+
+            return lambda: PrometheusMetricsSource("http://localhost:9090")
+        case _:
+            raise ValueError(f"Unknown setup {setup}")
+
+
+def measure_component(name: str) -> Dict[str, float]:
+    # NOTE: Runs in a fresh process, so every import is a cold import.
+    modules, setup = COMPONENTS[name]
+    result: Dict[str, float] = {}
+    for module in modules:
+        start = time.perf_counter()
+        importlib.import_module(module)
+        result[f"import {module}"] = time.perf_counter() - start
+
+    build = setup_component(setup)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        build()
+    result["setup"] = time.perf_counter() - start
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure the import and setup cost of the scaler components."
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="Fresh processes per component"
+    )
+    parser.add_argument(
+        "--components", nargs="+", choices=list(COMPONENTS), default=list(COMPONENTS)
+    )
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    print(f"{'component':<24}{'step':<42}{'median ms':>10}{'max ms':>10}")
+    for name in args.components:
+        runs: List[Dict[str, float]] = []
+        for _ in range(args.repeat):
+            with context.Pool(1) as pool:
+                runs.append(pool.apply(measure_component, (name,)))
+
+        for step in runs[0]:
+            times = np.array([run[step] for run in runs]) * 1e3
+            print(f"{name:<24}{step:<42}{np.median(times):>10.1f}{times.max():>10.1f}")
+        totals = np.array([sum(run.values()) for run in runs]) * 1e3
+        print(f"{name:<24}{'total':<42}{np.median(totals):>10.1f}{totals.max():>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
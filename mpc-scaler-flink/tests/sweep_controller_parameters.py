@@ -0,0 +1,203 @@
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from mpc_scaler_flink.mpc_controller import MPCController
+
+# Written by `generate_time_series_test_data.py`, next to the `tests` directory
+TIME_SERIES_FILE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "test_time_series.json",
+)
+
+# NOTE: Metric series per scenario, in the order of the measurement
+# (utilisation, backpressure_time, busy_time). The default matches `main` of
+# `test_mpc_controller.py`.
+DEFAULT_SCENARIO: Tuple[str, str, str] = (
+    "sinusoidal_series",
+    "linear_series",
+    "ascending_sinusoidal_series",
+)
+PARAMETER_NAMES: List[str] = [
+    "target_utilisation",
+    "target_busy_time",
+    "target_backpressure",
+    "event_horizon",
+    "alpha",
+    "beta",
+    "gamma",
+]
+
+# Per-process state of the sweep workers
+_measurements: Optional[np.ndarray] = None
+_warm_start: bool = False
+
+
+def load_scenarios(
+    json_filename: str, scenarios: Sequence[Tuple[str, str, str]], n_steps: int
+) -> np.ndarray:
+    with open(json_filename, "r") as f:
+        time_series_data = json.load(f)
+
+    # Shape: (n_scenarios, n_steps, 3)
+    return np.array(
+        [
+            np.array(
+                [time_series_data[name]["data"][:n_steps] for name in scenario],
+                dtype=float,
+            ).T
+            for scenario in scenarios
+        ]
+    )
+
+
+def parameter_grid(values: Dict[str, Sequence[float]]) -> List[Dict[str, float]]:
+    names = list(values.keys())
+    return [
+        dict(zip(names, combination))
+        for combination in itertools.product(*(values[name] for name in names))
+    ]
+
+
+def _init_worker(measurements: np.ndarray, warm_start: bool):
+    global _measurements, _warm_start
+    _measurements = measurements
+    _warm_start = warm_start
+
+
+def simulate(task: Tuple[int, Dict[str, float]]) -> Tuple[int, np.ndarray, np.ndarray]:
+    run, parameters = task
+    parameters = dict(parameters)
+    parameters["event_horizon"] = int(parameters["event_horizon"])
+    n_scenarios, n_steps, n_x = _measurements.shape
+    scaling_factors = np.empty((n_scenarios, n_steps))
+    step_times = np.empty((n_scenarios, n_steps))
+
+    # NOTE: The controller is set up once per parameter set and reset between
+    # the scenarios, which is considerably cheaper than building it again.
+    controller = MPCController(warm_start=_warm_start, **parameters)
+    for scenario, measurements in enumerate(_measurements):
+        controller._controller.u0 = np.zeros(1)
+        controller.initial_measurement(np.zeros(n_x))
+        for k, measurement in enumerate(measurements):
+            start = time.perf_counter()
+            scaling_factors[scenario, k] = controller.measurement_step(measurement)
+            step_times[scenario, k] = time.perf_counter() - start
+
+    return run, scaling_factors, step_times
+
+
+def run_sweep(
+    grid: List[Dict[str, float]],
+    measurements: np.ndarray,
+    output_dir: str,
+    workers: Optional[int] = None,
+    warm_start: bool = True,
+) -> Dict[str, np.ndarray]:
+    # NOTE: One column per file, the per-step columns are memory mapped and
+    # filled as soon as a run finishes, so the sweep never holds all results.
+    os.makedirs(output_dir, exist_ok=True)
+    n_runs = len(grid)
+    n_scenarios, n_steps, _ = measurements.shape
+    columns: Dict[str, np.ndarray] = {
+        name: np.array([parameters[name] for parameters in grid], dtype=float)
+        for name in grid[0]
+    }
+    for name, column in columns.items():
+        np.save(os.path.join(output_dir, f"{name}.npy"), column)
+    for name in ("scaling_factor", "step_time"):
+        columns[name] = open_memmap(
+            os.path.join(output_dir, f"{name}.npy"),
+            mode="w+",
+            dtype=np.float64,
+            shape=(n_runs, n_scenarios, n_steps),
+        )
+
+    # NOTE: Each worker runs single threaded, the parallelism comes from the
+    # processes. Otherwise the BLAS threads of all workers compete for the cores.
+    thread_limits = {
+        name: "1"
+        for name in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS")
+    }
+    previous_env = {name: os.environ.get(name) for name in thread_limits}
+    os.environ.update(thread_limits)
+    try:
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(
+            workers, initializer=_init_worker, initargs=(measurements, warm_start)
+        ) as pool:
+            tasks = list(enumerate(grid))
+            for run, scaling_factors, step_times in pool.imap_unordered(
+                simulate, tasks
+            ):
+                columns["scaling_factor"][run] = scaling_factors
+                columns["step_time"][run] = step_times
+    finally:
+        for name, value in previous_env.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+    for name in ("scaling_factor", "step_time"):
+        columns[name].flush()
+    return columns
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Simulate the MPC controller for a grid of parameters in parallel."
+    )
+    parser.add_argument("output_dir", help="Directory for the `.npy` result columns")
+    parser.add_argument("--target-utilisation", type=float, nargs="+", default=[0.8])
+    parser.add_argument("--target-busy-time", type=float, nargs="+", default=[0.8])
+    parser.add_argument("--target-backpressure", type=float, nargs="+", default=[0])
+    parser.add_argument("--event-horizon", type=int, nargs="+", default=[10])
+    parser.add_argument("--alpha", type=float, nargs="+", default=[0.1])
+    parser.add_argument("--beta", type=float, nargs="+", default=[0.5])
+    parser.add_argument("--gamma", type=float, nargs="+", default=[0.1])
+    parser.add_argument(
+        "--scenario",
+        nargs=3,
+        action="append",
+        metavar=("UTILISATION", "BACKPRESSURE", "BUSY_TIME"),
+        help="Series names of `test_time_series.json`, can be given multiple times",
+    )
+    parser.add_argument("--steps", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument(
+        "--no-warm-start",
+        action="store_true",
+        help="Use the plain do_mpc solve instead of the warm-started SQP",
+    )
+    args = parser.parse_args()
+
+    grid = parameter_grid({name: getattr(args, name) for name in PARAMETER_NAMES})
+    scenarios = args.scenario or [DEFAULT_SCENARIO]
+    measurements = load_scenarios(TIME_SERIES_FILE, scenarios, args.steps)
+
+    start = time.perf_counter()
+    run_sweep(
+        grid,
+        measurements,
+        args.output_dir,
+        workers=args.workers,
+        warm_start=not args.no_warm_start,
+    )
+    with open(os.path.join(args.output_dir, "scenarios.json"), "w") as f:
+        json.dump(scenarios, f)
+    print(
+        f"Simulated {len(grid)} parameter sets x {len(scenarios)} scenarios "
+        f"in {time.perf_counter() - start:.1f}s, results in {args.output_dir}"
+    )
+
+
+if __name__ == "__main__":
+    main()
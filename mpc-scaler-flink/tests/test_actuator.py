@@ -0,0 +1,116 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from kubernetes import client
+
+from mpc_scaler_flink.actuator import KubernetesActuator
+from mpc_scaler_flink.pod import Pod, PodCapacity
+
+
+class FakeScaleHandler(BaseHTTPRequestHandler):
+    # NOTE: HTTP/1.1 keeps the connection open so pooled reuse can be observed.
+    protocol_version = "HTTP/1.1"
+    patch_delay = 0.0
+
+    def do_PATCH(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        name = self.path.rstrip("/").split("/")[-2]
+        self.server.patches.append((name, body["spec"]["replicas"]))
+        self.server.connections.add(self.client_address)
+        time.sleep(self.patch_delay)
+
+        status = 404 if name in self.server.missing else 200
+        response = json.dumps(
+            {
+                "apiVersion": "autoscaling/v1",
+                "kind": "Scale",
+                "metadata": {"name": name},
+                "spec": {"replicas": body["spec"]["replicas"]},
+            }
+        ).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def fake_api_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeScaleHandler)
+    server.patches = []
+    server.connections = set()
+    server.missing = set()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    FakeScaleHandler.patch_delay = 0.0
+
+
+def create_actuator(server) -> KubernetesActuator:
+    configuration = client.Configuration(
+        host=f"http://127.0.0.1:{server.server_address[1]}"
+    )
+    configuration.connection_pool_maxsize = 4
+    return KubernetesActuator(api_client=client.ApiClient(configuration))
+
+
+def test_only_changed_deployments_are_patched(fake_api_server):
+    actuator = create_actuator(fake_api_server)
+    pods = [Pod(capacity, 1) for capacity in PodCapacity]
+
+    asyncio.run(actuator.actuate(pods))
+    assert len(fake_api_server.patches) == len(PodCapacity)
+
+    fake_api_server.patches.clear()
+    asyncio.run(actuator.actuate(pods))
+    assert fake_api_server.patches == []
+
+    pods[1] = Pod(PodCapacity.MEDIUM, 3)
+    results = asyncio.run(actuator.actuate(pods))
+    assert results == {"flink-session-cluster-taskmanager-medium": True}
+    assert fake_api_server.patches == [("flink-session-cluster-taskmanager-medium", 3)]
+    actuator.close()
+
+
+def test_failed_patch_is_retried_on_next_actuation(fake_api_server):
+    fake_api_server.missing.add("flink-session-cluster-taskmanager-large")
+    actuator = create_actuator(fake_api_server)
+    pods = [Pod(capacity, 1) for capacity in PodCapacity]
+
+    results = asyncio.run(actuator.actuate(pods))
+    assert results["flink-session-cluster-taskmanager-large"] is False
+
+    fake_api_server.missing.clear()
+    fake_api_server.patches.clear()
+    results = asyncio.run(actuator.actuate(pods))
+    assert results == {"flink-session-cluster-taskmanager-large": True}
+    actuator.close()
+
+
+def test_patches_run_concurrently_over_pooled_connections(fake_api_server):
+    FakeScaleHandler.patch_delay = 0.2
+    actuator = create_actuator(fake_api_server)
+
+    start = time.perf_counter()
+    asyncio.run(actuator.actuate([Pod(capacity, 1) for capacity in PodCapacity]))
+    duration = time.perf_counter() - start
+    assert duration < 2 * FakeScaleHandler.patch_delay
+
+    for replicas in range(2, 6):
+        asyncio.run(
+            actuator.actuate([Pod(capacity, replicas) for capacity in PodCapacity])
+        )
+    # NOTE: 15 patches in total, but at most one connection per worker.
+    assert len(fake_api_server.patches) == 5 * len(PodCapacity)
+    assert len(fake_api_server.connections) <= 4
+    actuator.close()
@@ -0,0 +1,141 @@
+import asyncio
+import time
+from typing import List
+
+import numpy as np
+import pytest
+
+from mpc_scaler_flink.control_loop import ControlLoop
+from mpc_scaler_flink.pod import Pod, PodCapacity
+from mpc_scaler_flink.pod_allocator import PodAllocator, ReconfigurationAwareAllocator
+
+
+class FakeController:
+    def __init__(self, solve_time: float = 0.0):
+        self.solve_time = solve_time
+        self.measurements = []
+        self.solves = []
+
+    def measurement_step(self, metrics_array) -> float:
+        start = time.monotonic()
+        time.sleep(self.solve_time)
+        self.measurements.append(metrics_array)
+        self.solves.append((start, time.monotonic()))
+        return 1.0
+
+
+def create_control_loop(controller, fetch_metrics, actuate, tick_interval):
+    pods: List[Pod] = [Pod(capacity, 1) for capacity in PodCapacity]
+    return ControlLoop(
+        controller,
+        PodAllocator(1.0),
+        pods,
+        fetch_metrics=fetch_metrics,
+        actuate=actuate,
+        tick_interval=tick_interval,
+    )
+
+
+def test_fetch_overlaps_with_previous_actuation():
+    events = []
+
+    async def fetch_metrics():
+        events.append(("fetch_start", time.monotonic()))
+        await asyncio.sleep(0.05)
+        events.append(("fetch_end", time.monotonic()))
+        return np.array([0, 0, 0])
+
+    async def actuate(pods):
+        events.append(("actuate_start", time.monotonic()))
+        await asyncio.sleep(0.5)
+        events.append(("actuate_end", time.monotonic()))
+
+    # NOTE: The second tick is due long before the first actuation ends
+    control_loop = create_control_loop(
+        FakeController(), fetch_metrics, actuate, tick_interval=0.2
+    )
+    asyncio.run(control_loop.run(max_ticks=2))
+
+    names = [name for name, _ in events]
+    # NOTE: The second fetch starts before the first actuation has finished.
+    assert names.index("actuate_start") < names.index("fetch_start", 1)
+    assert names.index("fetch_start", 1) < names.index("actuate_end")
+    assert names.count("actuate_end") == 2
+
+
+def test_slow_solver_skips_missed_ticks_and_keeps_event_loop_free():
+    heartbeats = []
+
+    async def fetch_metrics():
+        return np.array([0, 0, 0])
+
+    async def actuate(pods):
+        pass
+
+    async def heartbeat():
+        while True:
+            heartbeats.append(time.monotonic())
+            await asyncio.sleep(0.005)
+
+    async def run(control_loop):
+        task = asyncio.create_task(heartbeat())
+        await control_loop.run(max_ticks=3)
+        task.cancel()
+
+    # NOTE: Every solve takes at least four tick intervals, so the counts below
+    # do not depend on how fast the machine is.
+    controller = FakeController(solve_time=0.2)
+    control_loop = create_control_loop(
+        controller, fetch_metrics, actuate, tick_interval=0.05
+    )
+    asyncio.run(run(control_loop))
+
+    statistics = control_loop.statistics
+    assert statistics.ticks == 3
+    assert statistics.overruns == 3
+    assert statistics.skipped_ticks >= 6
+    # NOTE: The solver runs in a worker thread, the event loop keeps running.
+    heartbeats = np.array(heartbeats)
+    for start, end in controller.solves:
+        assert np.any((heartbeats > start) & (heartbeats < end))
+
+
+def test_owned_executor_is_shut_down():
+    async def fetch_metrics():
+        return np.array([0, 0, 0])
+
+    async def actuate(pods):
+        pass
+
+    control_loop = create_control_loop(
+        FakeController(), fetch_metrics, actuate, tick_interval=0.01
+    )
+    asyncio.run(control_loop.run(max_ticks=1))
+
+    with pytest.raises(RuntimeError):
+        control_loop.executor.submit(print)
+
+
+def test_reconfiguration_aware_allocator_skips_actuation_without_pod_changes():
+    actuations = []
+
+    async def fetch_metrics():
+        return np.array([0, 0, 0])
+
+    async def actuate(pods):
+        actuations.append([pod.replica_count for pod in pods])
+
+    pods: List[Pod] = [Pod(capacity, 1) for capacity in PodCapacity]
+    control_loop = ControlLoop(
+        FakeController(),
+        ReconfigurationAwareAllocator(1.0),
+        pods,
+        fetch_metrics=fetch_metrics,
+        actuate=actuate,
+        tick_interval=0.01,
+    )
+    asyncio.run(control_loop.run(max_ticks=3))
+
+    assert actuations == []
+    assert control_loop.instrumentation.pod_churn.value() == 0
+    assert [pod.replica_count for pod in control_loop.pods] == [1, 1, 1]
@@ -0,0 +1,114 @@
+import asyncio
+from typing import List
+
+import numpy as np
+from filterpy.kalman import KalmanFilter
+
+from mpc_scaler_flink.control_loop import ControlLoop
+from mpc_scaler_flink.estimation import KalmanEstimator
+from mpc_scaler_flink.mpc_controller import MPCController
+from mpc_scaler_flink.pod import Pod, PodCapacity
+from mpc_scaler_flink.pod_allocator import PodAllocator
+
+A = np.diag([0.9, 0.95, 0.9])
+B = np.full((3, 1), -0.5)
+c = np.array([0.08, 0.0, 0.08])
+
+
+def filterpy_reference(z: np.ndarray, u: np.ndarray) -> np.ndarray:
+    # One filterpy filter per stream, the affine term enters as a control input
+    kf = KalmanFilter(dim_x=3, dim_z=3, dim_u=2)
+    kf.F = A
+    kf.B = np.hstack([B, c[:, None]])
+    kf.H = np.eye(3)
+    kf.Q = np.eye(3) * 1e-4
+    kf.R = np.eye(3) * 1e-2
+    kf.P = np.eye(3)
+    kf.x = z[0].copy()
+    states = [kf.x.copy()]
+    for k in range(1, len(z)):
+        kf.predict(u=np.array([u[k - 1], 1.0]))
+        kf.update(z[k])
+        states.append(kf.x.copy())
+    return np.array(states)
+
+
+def test_batched_filter_matches_filterpy_per_stream():
+    rng = np.random.default_rng(0)
+    streams, steps = 4, 30
+    z = rng.random((steps, streams, 3))
+    u = rng.normal(0, 0.1, (steps, streams))
+
+    estimator = KalmanEstimator(A, B, c, streams=streams)
+    estimator.update(z[0])
+    states = [estimator.x.copy()]
+    for k in range(1, steps):
+        states.append(estimator.step(z[k], u[k - 1][:, None]))
+    states = np.array(states)
+
+    for stream in range(streams):
+        np.testing.assert_allclose(
+            states[:, stream],
+            filterpy_reference(z[:, stream], u[:, stream]),
+            atol=1e-10,
+        )
+
+
+def test_linear_model_matches_controller_parameters():
+    controller = MPCController(alpha=0.2, beta=0.4, gamma=0.05)
+    A, B, c = controller.linear_model()
+    np.testing.assert_allclose(A, np.diag([0.8, 0.95, 0.8]))
+    np.testing.assert_allclose(B, np.full((3, 1), -0.4))
+    np.testing.assert_allclose(c, [0.2 * 0.8, 0.0, 0.2 * 0.8])
+
+
+def test_solve_is_skipped_while_the_estimate_is_steady():
+    class CountingController:
+        solves = 0
+        skips = 0
+        annotations: List = []
+
+        def annotate_step(self, tick, raw_measurement):
+            self.annotations.append((tick, raw_measurement))
+
+        def skip_step(self, metrics_array):
+            self.skips += 1
+
+        def measurement_step(self, metrics_array) -> float:
+            self.solves += 1
+            return 1.0
+
+    rng = np.random.default_rng(1)
+    fetched: List = []
+
+    async def fetch_metrics():
+        fetched.append(np.array([0.8, 0.0, 0.8]) + rng.normal(0, 0.001, 3))
+        return fetched[-1]
+
+    async def actuate(pods):
+        pass
+
+    # NOTE: The identity model keeps a steady state steady
+    estimator = KalmanEstimator(np.eye(3), np.zeros((3, 1)), np.zeros(3), max_skipped=5)
+    controller = CountingController()
+    pods: List[Pod] = [Pod(capacity, 1) for capacity in PodCapacity]
+    control_loop = ControlLoop(
+        controller,
+        PodAllocator(1.0),
+        pods,
+        fetch_metrics=fetch_metrics,
+        actuate=actuate,
+        tick_interval=0.001,
+        estimator=estimator,
+    )
+    asyncio.run(control_loop.run(max_ticks=12))
+
+    # First tick, then a forced solve after every 5 skipped ticks
+    assert controller.solves == 2
+    assert controller.skips == 10
+    assert control_loop.instrumentation.skipped_solves.value() == 10
+    # The controller sees the unfiltered metrics and the ticks of the schedule
+    ticks = [tick for tick, _ in controller.annotations]
+    assert len(ticks) == 12 and ticks == sorted(set(ticks))
+    for (_, raw_measurement), metrics in zip(controller.annotations, fetched):
+        assert raw_measurement is metrics
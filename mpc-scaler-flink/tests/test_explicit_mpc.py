@@ -0,0 +1,135 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from mpc_scaler_flink.control_loop import ControlLoop
+from mpc_scaler_flink.explicit_mpc import ExplicitControlLaw, ExplicitMPCController
+from mpc_scaler_flink.mpc_controller import MPCController
+from mpc_scaler_flink.pod import Pod, PodCapacity
+from mpc_scaler_flink.pod_allocator import PodAllocator
+from mpc_scaler_flink.startup import build_controller
+
+
+@pytest.fixture(scope="module")
+def control_law() -> ExplicitControlLaw:
+    return ExplicitControlLaw.build(
+        metrics_axis=np.linspace(0, 1, 3),
+        deviation_term_axis=np.linspace(-1, 1, 5),
+    )
+
+
+def test_accuracy_against_online_solution(control_law):
+    report = control_law.accuracy_check(sample_count=20, seed=0)
+
+    assert report.sample_count == 20
+    assert report.max_abs_error < 1e-3
+
+
+def test_evaluate_point_matches_evaluate(control_law):
+    points = np.random.default_rng(1).uniform([0, 0, 0, -1], [1, 1, 1, 1], size=(10, 4))
+
+    expected = control_law.evaluate(points)
+    result = [control_law.evaluate_point(point.tolist()) for point in points]
+
+    np.testing.assert_allclose(result, expected, atol=1e-12)
+
+
+def test_save_and_load_roundtrip(control_law, tmp_path):
+    path = tmp_path / "control_law.npz"
+    control_law.save(str(path))
+
+    loaded = ExplicitControlLaw.load(str(path))
+
+    np.testing.assert_array_equal(loaded.values, control_law.values)
+    assert loaded.parameters == control_law.parameters
+
+
+def test_controller_matches_online_controller(control_law):
+    measurements = [
+        np.array([0.2, 0.0, 0.1]),
+        np.array([0.5, 0.1, 0.4]),
+        np.array([0.9, 0.3, 0.8]),
+    ]
+    online_controller = MPCController()
+    explicit_controller = ExplicitMPCController(control_law)
+    online_controller.initial_measurement(np.array([0, 0, 0]))
+    explicit_controller.initial_measurement(np.array([0, 0, 0]))
+
+    for measurement in measurements:
+        assert explicit_controller.measurement_step(measurement) == pytest.approx(
+            online_controller.measurement_step(measurement), abs=1e-3
+        )
+
+
+def test_evaluate_rejects_points_outside_of_the_grid(control_law):
+    with pytest.raises(ValueError):
+        control_law.evaluate(np.array([[1.5, 0, 0, 0]]))
+    with pytest.raises(ValueError):
+        control_law.evaluate_point([0.5, 0, 0, -2])
+
+
+def test_controller_falls_back_to_online_solver_outside_of_the_grid(control_law):
+    measurements = [np.array([0.5, 0.1, 0.4]), np.array([1.4, 0.3, 1.2])]
+    online_controller = MPCController()
+    explicit_controller = ExplicitMPCController(control_law)
+    online_controller.initial_measurement(np.array([0, 0, 0]))
+    explicit_controller.initial_measurement(np.array([0, 0, 0]))
+
+    for measurement in measurements:
+        assert explicit_controller.measurement_step(measurement) == pytest.approx(
+            online_controller.measurement_step(measurement), abs=1e-3
+        )
+    assert explicit_controller.online_steps == 1
+
+
+def test_explicit_mode_runs_in_the_control_loop(control_law, tmp_path):
+    path = str(tmp_path / "control_law.npz")
+    control_law.save(path)
+    controller = build_controller(backend="explicit", control_law_file=path)
+    assert isinstance(controller, ExplicitMPCController)
+    for expected, actual in zip(
+        MPCController(**control_law.parameters).linear_model(),
+        controller.linear_model(),
+    ):
+        np.testing.assert_allclose(actual, expected, atol=1e-12)
+
+    measurements = [
+        np.array([0.2, 0.0, 0.1]),
+        np.array([0.9, 0.3, 0.8]),
+        np.array([0.6, 0.1, 0.5]),
+    ]
+    fetched = iter(measurements)
+    scaling_factors = []
+    measurement_step = controller.measurement_step
+
+    def record_step(metrics_array):
+        scaling_factors.append(measurement_step(metrics_array))
+        return scaling_factors[-1]
+
+    async def fetch_metrics():
+        return next(fetched)
+
+    async def actuate(pods):
+        pass
+
+    controller.measurement_step = record_step
+    controller.initial_measurement(np.zeros(3))
+    control_loop = ControlLoop(
+        controller,
+        PodAllocator(1.0),
+        [Pod(capacity, 1) for capacity in PodCapacity],
+        fetch_metrics=fetch_metrics,
+        actuate=actuate,
+        tick_interval=0.01,
+    )
+    asyncio.run(control_loop.run(max_ticks=len(measurements)))
+
+    reference = ExplicitMPCController(control_law)
+    reference.initial_measurement(np.zeros(3))
+    assert scaling_factors == [
+        reference.measurement_step(measurement) for measurement in measurements
+    ]
+    assert control_loop.statistics.ticks == len(measurements)
+    with pytest.raises(ValueError):
+        build_controller(backend="explicit")
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from mpc_scaler_flink.history import (
+    ControllerHistory,
+    history_dtype,
+    load_spilled_history,
+)
+from mpc_scaler_flink.mpc_controller import MPCController
+
+
+def fill(history: ControllerHistory, steps: int):
+    for step in range(steps):
+        record = history.next_record()
+        if record is not None:
+            record["scaling_factor"] = step
+            record["predicted_x"] = step
+
+
+def test_ring_keeps_latest_downsampled_steps_and_spills_evicted(tmp_path):
+    spill_path = str(tmp_path / "history.bin")
+    history = ControllerHistory(
+        history_dtype(4), capacity=5, keep_every=2, spill_path=spill_path, spill_every=3
+    )
+    fill(history, 40)
+    history.close()
+
+    recent = history.recent()
+    np.testing.assert_array_equal(recent["step"], [30, 32, 34, 36, 38])
+    np.testing.assert_array_equal(recent["scaling_factor"], [30, 32, 34, 36, 38])
+    assert history.latest()["step"] == 38
+
+    # Steps 0, 2, ..., 28 were evicted, every third of them is spilled
+    spilled = load_spilled_history(spill_path)
+    np.testing.assert_array_equal(spilled["step"], [0, 6, 12, 18, 24])
+    np.testing.assert_array_equal(spilled["predicted_x"][:, -1, 0], [0, 6, 12, 18, 24])
+
+
+def test_spill_file_is_flushed_when_the_ring_wraps(tmp_path):
+    spill_path = tmp_path / "history.bin"
+    history = ControllerHistory(
+        history_dtype(0), capacity=4, spill_path=str(spill_path)
+    )
+    for _ in range(7):
+        history.next_record()
+    # Steps 0 to 2 were evicted, the ring has not wrapped since
+    assert spill_path.stat().st_size == 0
+
+    history.next_record()
+    assert spill_path.stat().st_size == 4 * history.dtype.itemsize
+    np.testing.assert_array_equal(
+        load_spilled_history(str(spill_path))["step"], [0, 1, 2, 3]
+    )
+    history.close()
+
+
+def test_spill_file_with_other_layout_is_rejected(tmp_path):
+    spill_path = str(tmp_path / "history.bin")
+    ControllerHistory(history_dtype(4), spill_path=spill_path).close()
+    with pytest.raises(ValueError):
+        ControllerHistory(history_dtype(8), spill_path=spill_path)
+
+
+def test_controller_records_steps_without_growing_do_mpc_data():
+    controller = MPCController(history=ControllerHistory(history_dtype(10), capacity=3))
+    controller.initial_measurement(np.zeros(3))
+    measurements = np.random.default_rng(0).random((5, 3))
+    scaling_factors = [controller.measurement_step(m) for m in measurements]
+
+    recent = controller.history.recent()
+    np.testing.assert_array_equal(recent["step"], [2, 3, 4])
+    np.testing.assert_allclose(recent["scaling_factor"], scaling_factors[2:])
+    np.testing.assert_allclose(recent["measurement"], measurements[2:])
+    np.testing.assert_allclose(recent["predicted_x"][:, 0], measurements[2:])
+    np.testing.assert_allclose(recent["predicted_u"][:, 0, 0] + 1, scaling_factors[2:])
+    assert controller._controller.data._x.shape[0] == 0
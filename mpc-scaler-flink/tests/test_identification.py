@@ -0,0 +1,206 @@
+import numpy as np
+import pytest
+
+from mpc_scaler_flink.estimation import KalmanEstimator
+from mpc_scaler_flink.history import ControllerHistory, history_dtype
+from mpc_scaler_flink.identification import (
+    CSV_COLUMNS,
+    DynamicsIdentifier,
+    identify_dynamics,
+    load_dynamics,
+)
+from mpc_scaler_flink.mpc_controller import MPCController
+from mpc_scaler_flink.qp_controller import CondensedQPController
+from mpc_scaler_flink.startup import build_controller
+
+TARGETS = np.array([0.8, 0.0, 0.8])
+
+
+def simulate(alpha: float, beta: float, gamma: float, steps: int, seed: int = 0):
+    # Rollout of the controller model with random scaling factors and noise
+    rng = np.random.default_rng(seed)
+    decay = np.array([alpha, gamma, alpha])
+    scaling_factors = 1 + rng.uniform(-0.2, 0.2, steps)
+    measurements = np.empty((steps, 3))
+    measurements[0] = rng.random(3)
+    for k in range(steps - 1):
+        measurements[k + 1] = (
+            measurements[k]
+            + decay * (TARGETS - measurements[k])
+            - beta * (scaling_factors[k] - 1)
+            + rng.normal(0, 1e-3, 3)
+        )
+    return measurements, scaling_factors
+
+
+def write_csv(path, measurements, scaling_factors):
+    np.savetxt(
+        path,
+        np.column_stack([measurements, scaling_factors]),
+        delimiter=",",
+        header=",".join(CSV_COLUMNS),
+        comments="",
+    )
+
+
+def test_fit_recovers_dynamics_independent_of_chunk_size(tmp_path):
+    measurements, scaling_factors = simulate(0.3, 0.4, 0.05, 2000)
+    path = str(tmp_path / "history.csv")
+    write_csv(path, measurements, scaling_factors)
+
+    fit = identify_dynamics([path], chunk_size=2000)
+    chunked = identify_dynamics([path], chunk_size=7)
+
+    assert fit.alpha == pytest.approx(0.3, abs=0.01)
+    assert fit.beta == pytest.approx(0.4, abs=0.01)
+    assert fit.gamma == pytest.approx(0.05, abs=0.01)
+    assert fit.sample_count == chunked.sample_count == 1998
+    np.testing.assert_allclose(
+        [chunked.alpha, chunked.beta, chunked.gamma],
+        [fit.alpha, fit.beta, fit.gamma],
+        rtol=1e-10,
+    )
+
+
+def test_gaps_in_the_ticks_are_not_paired():
+    # Two unrelated runs, pairing the end of the first with the start of the
+    # second would spoil the fit
+    first, first_factors = simulate(0.2, 0.5, 0.1, 200, seed=1)
+    second, second_factors = simulate(0.2, 0.5, 0.1, 200, seed=2)
+    measurements = np.concatenate([first, second])
+    scaling_factors = np.concatenate([first_factors, second_factors])
+    ticks = np.arange(400)
+    ticks[200:] += 1
+
+    identifier = DynamicsIdentifier()
+    identifier.add_chunk(measurements[:30], scaling_factors[:30], ticks[:30])
+    identifier.add_chunk(measurements[30:], scaling_factors[30:], ticks[30:])
+    fit = identifier.fit()
+
+    assert fit.sample_count == 396
+    assert fit.alpha == pytest.approx(0.2, abs=0.02)
+    assert fit.beta == pytest.approx(0.5, abs=0.02)
+
+
+def test_interleaved_jobs_are_fit_separately():
+    first, first_factors = simulate(0.2, 0.5, 0.1, 300, seed=1)
+    second, second_factors = simulate(0.2, 0.5, 0.1, 300, seed=2)
+    # Rows of the multi-job mode, both jobs in every tick
+    measurements = np.stack([first, second], axis=1).reshape(-1, 3)
+    scaling_factors = np.stack([first_factors, second_factors], axis=1).ravel()
+    ticks = np.repeat(np.arange(300), 2)
+    jobs = np.tile([0, 1], 300)
+
+    identifier = DynamicsIdentifier()
+    identifier.add_chunk(
+        measurements[:101], scaling_factors[:101], ticks[:101], jobs[:101]
+    )
+    identifier.add_chunk(
+        measurements[101:], scaling_factors[101:], ticks[101:], jobs[101:]
+    )
+    fit = identifier.fit()
+
+    separate = DynamicsIdentifier()
+    separate.add_history(iter([(first, first_factors, np.arange(300), None)]))
+    separate.add_history(iter([(second, second_factors, np.arange(300), None)]))
+    expected = separate.fit()
+
+    assert fit.sample_count == expected.sample_count == 2 * 298
+    np.testing.assert_allclose(
+        [fit.alpha, fit.beta, fit.gamma],
+        [expected.alpha, expected.beta, expected.gamma],
+        rtol=1e-10,
+    )
+
+
+def test_spilled_history_to_controller(tmp_path):
+    measurements, scaling_factors = simulate(0.25, 0.3, 0.15, 500)
+    spill_path = str(tmp_path / "history.bin")
+    history = ControllerHistory(history_dtype(0), capacity=1, spill_path=spill_path)
+    for tick, (measurement, scaling_factor) in enumerate(
+        zip(measurements, scaling_factors)
+    ):
+        record = history.next_record()
+        record["tick"] = tick
+        record["raw_measurement"] = measurement
+        record["scaling_factor"] = scaling_factor
+    history.close()
+
+    fit = identify_dynamics([spill_path], chunk_size=64)
+    assert fit.sample_count == 497
+    dynamics_path = str(tmp_path / "dynamics.json")
+    fit.save(dynamics_path)
+
+    assert load_dynamics(dynamics_path) == fit.controller_parameters()
+    controller = build_controller(dynamics_file=dynamics_path)
+    assert controller.ALPHA == fit.alpha
+    assert controller.BETA == fit.beta
+    assert controller.GAMMA == fit.gamma
+
+
+def test_fit_of_a_noisy_closed_loop_is_unbiased(tmp_path):
+    # NOTE: The controller acts on the filtered measurements, the plant
+    # on top has process noise and is measured with noise. The applied scaling
+    # factors are dithered like the rounding to task slots does, ticks without
+    # a solve keep the pods. Least squares on the same data gives an ALPHA of
+    # about 0.5 and a GAMMA of about 0.38.
+    alpha, beta, gamma = 0.3, 0.25, 0.2
+    rng = np.random.default_rng(0)
+    controller = CondensedQPController()
+    controller.initial_measurement(np.zeros(3))
+    estimator = KalmanEstimator.from_controller(controller)
+    spill_path = str(tmp_path / "history.bin")
+    history = ControllerHistory(history_dtype(0), capacity=64, spill_path=spill_path)
+
+    decay = np.array([alpha, gamma, alpha])
+    x = rng.random(3)
+    deviation_term = 0.0
+    for tick in range(5000):
+        raw_measurement = x + rng.normal(0, 0.02, 3)
+        filtered = estimator.step(raw_measurement[None, :], [[deviation_term]])[0]
+        solve = estimator.needs_solve()
+        estimator.mark_solved(solve)
+        if solve[0]:
+            deviation_term = (
+                controller.measurement_step(filtered) - 1 + rng.uniform(-0.1, 0.1)
+            )
+        else:
+            controller.skip_step(filtered)
+            deviation_term = 0.0
+        # Missed deadlines
+        if tick % 97 != 0:
+            record = history.next_record()
+            record["tick"] = tick
+            record["measurement"] = filtered
+            record["raw_measurement"] = raw_measurement
+            record["scaling_factor"] = 1 + deviation_term
+        x = x + decay * (TARGETS - x) - beta * deviation_term + rng.normal(0, 0.02, 3)
+    history.close()
+
+    fit = identify_dynamics([spill_path], chunk_size=1000)
+
+    assert fit.sample_count < 4998
+    assert fit.alpha == pytest.approx(alpha, abs=0.05)
+    assert fit.beta == pytest.approx(beta, abs=0.05)
+    assert fit.gamma == pytest.approx(gamma, abs=0.05)
+
+
+def test_controller_records_ticks_and_raw_measurements():
+    controller = MPCController()
+    controller.initial_measurement(np.zeros(3))
+    filtered = np.array([0.5, 0.1, 0.4])
+    raw = np.array([0.6, 0.0, 0.3])
+
+    controller.annotate_step(3, raw)
+    scaling_factor = controller.measurement_step(filtered)
+    controller.annotate_step(5, raw)
+    controller.skip_step(filtered)
+    controller.measurement_step(filtered)
+
+    records = controller.history.recent()
+    np.testing.assert_array_equal(records["tick"], [3, 5, 6])
+    np.testing.assert_array_equal(records["raw_measurement"][:2], [raw, raw])
+    np.testing.assert_array_equal(records["raw_measurement"][2], filtered)
+    np.testing.assert_array_equal(records["measurement"][0], filtered)
+    assert records["scaling_factor"][0] == scaling_factor
+    assert records["scaling_factor"][1] == 1.0
@@ -0,0 +1,114 @@
+import asyncio
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import List
+
+import numpy as np
+
+from mpc_scaler_flink.control_loop import ControlLoop
+from mpc_scaler_flink.health import HealthServer
+from mpc_scaler_flink.instrumentation import Registry, ScalerMetrics, TickProfiler
+from mpc_scaler_flink.pod import Pod, PodCapacity
+from mpc_scaler_flink.pod_allocator import PodAllocator
+
+
+class FakeController:
+    def __init__(self):
+        self.last_step_stats = None
+
+    def measurement_step(self, metrics_array) -> float:
+        self.last_step_stats = SimpleNamespace(
+            iter_count=4, return_status="Solve_Succeeded"
+        )
+        return 1.5
+
+
+def test_histogram_and_counter_render_prometheus_text():
+    registry = Registry()
+    histogram = registry.histogram("solve_seconds", "Solve time", buckets=(0.1, 1.0))
+    counter = registry.counter("steps_total", "Steps", ("status",))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        histogram.observe(value)
+    counter.inc(2, 'say "hi"')
+
+    text = registry.render()
+
+    assert "# TYPE solve_seconds histogram" in text
+    assert 'solve_seconds_bucket{le="0.1"} 1' in text
+    assert 'solve_seconds_bucket{le="1.0"} 3' in text
+    assert 'solve_seconds_bucket{le="+Inf"} 4' in text
+    assert "solve_seconds_sum 4.05" in text
+    assert "solve_seconds_count 4" in text
+    assert 'steps_total{status="say \\"hi\\""} 2.0' in text
+
+
+def test_control_loop_records_stages_and_profiles_on_request():
+    instrumentation = ScalerMetrics()
+    profiler = TickProfiler()
+    health_server = HealthServer(
+        0, host="127.0.0.1", registry=instrumentation.registry, profiler=profiler
+    )
+    health_server.start()
+
+    async def fetch_metrics():
+        return np.array([0.5, 0.0, 0.5])
+
+    async def actuate(pods):
+        return {"small": True, "large": False}
+
+    pods: List[Pod] = [Pod(capacity, 1) for capacity in PodCapacity]
+    control_loop = ControlLoop(
+        FakeController(),
+        PodAllocator(1.0),
+        pods,
+        fetch_metrics=fetch_metrics,
+        actuate=actuate,
+        tick_interval=0.01,
+        instrumentation=instrumentation,
+        profiler=profiler,
+    )
+    base_url = f"http://127.0.0.1:{health_server.port}"
+    try:
+        with urllib.request.urlopen(f"{base_url}/debug/profile?ticks=2") as response:
+            assert response.status == 202
+        asyncio.run(control_loop.run(max_ticks=3))
+
+        with urllib.request.urlopen(f"{base_url}/metrics") as response:
+            text = response.read().decode()
+        with urllib.request.urlopen(f"{base_url}/debug/profile") as response:
+            report = response.read().decode()
+    finally:
+        health_server.close()
+
+    assert instrumentation.solve_seconds.count == 3
+    assert instrumentation.fetch_seconds.count == 3
+    assert instrumentation.allocate_seconds.count == 3
+    assert instrumentation.actuation_seconds.count == 3
+    assert instrumentation.actuation_failures.value() == 3
+    assert "mpc_scaler_solver_iterations_count 3" in text
+    assert 'mpc_scaler_solver_steps_total{status="Solve_Succeeded"} 3.0' in text
+    assert "mpc_scaler_scaling_factor 1.5" in text
+    assert "measurement_step" in report
+    assert not profiler.active
+
+
+def test_profiler_serializes_concurrent_calls():
+    profiler = TickProfiler()
+    profiler.request(1)
+    running = []
+
+    def solve():
+        running.append(1)
+        assert len(running) == 1
+        time.sleep(0.01)
+        running.pop()
+        return 1.0
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(lambda _: profiler.call(solve), range(8)))
+    profiler.tick_done()
+
+    assert results == [1.0] * 8
+    assert "solve" in profiler.last_report
@@ -0,0 +1,151 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pytest
+
+from mpc_scaler_flink.metrics import (
+    DEFAULT_METRICS,
+    MetricsRingBuffer,
+    PrometheusMetricsSource,
+)
+
+
+def series(name: str, value: float, **labels) -> dict:
+    return {"metric": {"__name__": name, **labels}, "value": [0, str(value)]}
+
+
+class StubPrometheusHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        self.server.queries.append(parse_qs(url.query)["query"][0])
+        self.server.connections.add(self.client_address)
+        response = json.dumps(
+            {
+                "status": "success",
+                "data": {"resultType": "vector", "result": self.server.result},
+            }
+        ).encode()
+        self.send_response(self.server.status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub_prometheus():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubPrometheusHandler)
+    server.queries = []
+    server.connections = set()
+    server.result = []
+    server.status = 200
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def create_source(server, **kwargs) -> PrometheusMetricsSource:
+    return PrometheusMetricsSource(
+        f"http://127.0.0.1:{server.server_address[1]}", **kwargs
+    )
+
+
+def test_ring_buffer_wraps_around():
+    buffer = MetricsRingBuffer(capacity=3)
+    for i in range(5):
+        buffer.append(np.full(3, i))
+
+    assert buffer.count == 3
+    np.testing.assert_array_equal(buffer.latest(), [4, 4, 4])
+    np.testing.assert_array_equal(buffer.window()[:, 0], [2, 3, 4])
+    np.testing.assert_array_equal(buffer.window(2)[:, 0], [3, 4])
+
+
+def test_ring_buffer_latest_is_a_view():
+    buffer = MetricsRingBuffer(capacity=4)
+    buffer.append(np.ones(3))
+    assert np.shares_memory(buffer.latest(), buffer._samples)
+
+
+def test_fetch_aggregates_per_metric(stub_prometheus):
+    cpu, backpressure, busy = (name for name, _ in DEFAULT_METRICS)
+    stub_prometheus.result = [
+        series(cpu, 0.5, tm_id="a"),
+        series(cpu, 0.7, tm_id="b"),
+        series(backpressure, 100, task_name="map"),
+        series(busy, 600, task_name="map"),
+        series(busy, 800, task_name="sink"),
+        series(busy, "NaN", task_name="source"),
+        series("unrelated_metric", 42),
+    ]
+    source = create_source(stub_prometheus, job_name="wordcount")
+
+    metrics = source.fetch()
+    np.testing.assert_allclose(metrics, [0.6, 0.1, 0.7])
+    assert len(stub_prometheus.queries) == 1
+    assert 'job_name="wordcount"' in stub_prometheus.queries[0]
+
+    # NOTE: Metrics without a series keep their previous value.
+    stub_prometheus.result = [series(busy, 200)]
+    np.testing.assert_allclose(source.fetch(), [0.6, 0.1, 0.2])
+    assert source.buffer.count == 2
+    source.close()
+
+
+def test_fetch_reuses_connection(stub_prometheus):
+    source = create_source(stub_prometheus)
+    for _ in range(10):
+        source.fetch()
+
+    assert len(stub_prometheus.queries) == 10
+    assert len(stub_prometheus.connections) == 1
+    source.close()
+
+
+def test_failed_fetch_repeats_last_sample(stub_prometheus):
+    cpu, backpressure, busy = (name for name, _ in DEFAULT_METRICS)
+    stub_prometheus.result = [
+        series(cpu, 0.4),
+        series(backpressure, 0),
+        series(busy, 500),
+    ]
+    source = create_source(stub_prometheus)
+    source.fetch()
+
+    stub_prometheus.status = 400
+    metrics = asyncio.run(source.fetch_metrics())
+    np.testing.assert_allclose(metrics, [0.4, 0.0, 0.5])
+    assert source.buffer.count == 2
+    source.close()
+
+
+def test_fetch_with_retry_falls_back_to_last_sample(stub_prometheus):
+    stub_prometheus.status = 503
+    source = create_source(stub_prometheus)
+
+    metrics = source.fetch_with_retry(attempts=3, backoff=0)
+    np.testing.assert_array_equal(metrics, [0, 0, 0])
+    assert len(stub_prometheus.queries) >= 3
+    assert source.buffer.count == 1
+    source.close()
+
+
+def test_fetch_with_retry_returns_first_successful_scrape(stub_prometheus):
+    cpu, backpressure, busy = (name for name, _ in DEFAULT_METRICS)
+    stub_prometheus.result = [series(cpu, 0.4), series(busy, 500)]
+    source = create_source(stub_prometheus)
+
+    np.testing.assert_allclose(source.fetch_with_retry(), [0.4, 0.0, 0.5])
+    assert len(stub_prometheus.queries) == 1
+    source.close()
@@ -1,11 +1,15 @@
+import argparse
 import json
 from typing import List, Literal, Optional, TypeAlias
 
 import do_mpc
-import matplotlib.pyplot as plt
 import numpy as np
+import pytest
 
+from mpc_scaler_flink.codegen import find_compiler
 from mpc_scaler_flink.mpc_controller import MPCController
+from mpc_scaler_flink.plotting import plot_in_background
+from mpc_scaler_flink.qp_controller import CondensedQPController
 
 Array3Float: TypeAlias = np.ndarray[Literal[3], np.dtype[np.float32]]
 
@@ -35,7 +39,89 @@ def get_series_values(json_filename: str, series_name: str) -> Optional[List[flo
         return None
 
 
+def test_warm_start_matches_make_step():
+    measurements = [
+        np.array([0.2, 0.0, 0.1]),
+        np.array([0.5, 0.1, 0.4]),
+        np.array([0.9, 0.3, 0.8]),
+        np.array([0.7, 0.6, 0.9]),
+        np.array([0.3, 0.2, 0.2]),
+    ]
+    cold_controller = MPCController()
+    warm_controller = MPCController(warm_start=True)
+    cold_controller.initial_measurement(np.array([0, 0, 0]))
+    warm_controller.initial_measurement(np.array([0, 0, 0]))
+
+    for measurement in measurements:
+        cold_scaling_factor = cold_controller.measurement_step(measurement)
+        warm_scaling_factor = warm_controller.measurement_step(measurement)
+
+        assert warm_scaling_factor == pytest.approx(cold_scaling_factor, abs=1e-6)
+        assert warm_controller.last_step_stats is not None
+        assert warm_controller.last_step_stats.success
+        assert warm_controller.last_step_stats.iter_count >= 1
+
+
+def test_skipped_steps_reset_the_previous_input():
+    # NOTE: Skipped ticks between the solves, with and without warm start and
+    # in the QP backend, must all see a previous input of 0.
+    measurements = [np.array([0.2, 0.0, 0.1]), np.array([0.5, 0.1, 0.4])]
+    controllers = [
+        MPCController(),
+        MPCController(warm_start=True),
+        CondensedQPController(),
+    ]
+    results = []
+    for controller in controllers:
+        controller.initial_measurement(np.array([0, 0, 0]))
+        controller.measurement_step(measurements[0])
+        for _ in range(3):
+            controller.skip_step(measurements[0])
+        results.append(controller.measurement_step(measurements[1]))
+
+    assert results[1] == pytest.approx(results[0], abs=1e-6)
+    assert results[2] == pytest.approx(results[0], abs=1e-6)
+
+    fresh_controller = MPCController()
+    fresh_controller.initial_measurement(np.array([0, 0, 0]))
+    assert results[0] == pytest.approx(
+        fresh_controller.measurement_step(measurements[1]), abs=1e-6
+    )
+
+
+@pytest.mark.skipif(find_compiler() is None, reason="no C compiler available")
+def test_codegen_library_is_cached_and_matches_interpreted(tmp_path):
+    measurement = np.array([0.5, 0.1, 0.4])
+    interpreted_controller = MPCController(warm_start=True)
+    compiled_controller = MPCController(
+        warm_start=True, codegen_cache_dir=str(tmp_path)
+    )
+    libraries = sorted(tmp_path.glob("*.so"))
+    assert len(libraries) == 2
+
+    for controller in (interpreted_controller, compiled_controller):
+        controller.initial_measurement(np.array([0, 0, 0]))
+    assert compiled_controller.measurement_step(measurement) == pytest.approx(
+        interpreted_controller.measurement_step(measurement), abs=1e-6
+    )
+
+    modification_times = [library.stat().st_mtime_ns for library in libraries]
+    MPCController(warm_start=True, codegen_cache_dir=str(tmp_path))
+    assert sorted(tmp_path.glob("*.so")) == libraries
+    assert [library.stat().st_mtime_ns for library in libraries] == modification_times
+
+    MPCController(warm_start=True, alpha=0.2, codegen_cache_dir=str(tmp_path))
+    assert len(list(tmp_path.glob("*.so"))) == 4
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Simulate the MPC controller.")
+    parser.add_argument(
+        "--no-plot", action="store_true", help="Skip the simulation_output.png plot"
+    )
+    parser.add_argument("--dpi", type=int, default=300)
+    args = parser.parse_args()
+
     controller = MPCController()
 
     utilisation_0: float = 0
@@ -83,28 +169,20 @@ def main():
         print("Error: One or more trajectories are empty. Check the simulation setup.")
         return
 
-    # Plot results
-    fig, ax = plt.subplots(4, sharex=True, figsize=(10, 10))
-
-    ax[0].plot(utilisation_trajectory, label="Utilization", color="b")
-    ax[0].set_ylabel("Utilization")
-    ax[0].legend(loc="upper right")
-
-    ax[1].plot(backpressure_time_trajectory, label="Backpressure Time", color="g")
-    ax[1].set_ylabel("Backpressure Time")
-    ax[1].legend(loc="upper right")
-
-    ax[2].plot(busy_time_trajectory, label="Busy Time", color="purple")
-    ax[2].set_ylabel("Busy Time")
-    ax[2].legend(loc="upper right")
-
-    ax[3].plot(scaling_factor_trajectory, label="Scaling Factor", color="r")
-    ax[3].set_ylabel("Scaling Factor")
-    ax[3].set_xlabel("Time Step")
-    ax[3].legend(loc="upper right")
-
-    plt.tight_layout()
-    plt.savefig("simulation_output.png", format="png", dpi=300)
+    if args.no_plot:
+        return
+    plot_in_background(
+        {
+            "Utilization": utilisation_trajectory,
+            "Backpressure Time": backpressure_time_trajectory,
+            "Busy Time": busy_time_trajectory,
+            "Scaling Factor": scaling_factor_trajectory,
+        },
+        "simulation_output.png",
+        sharex=True,
+        colors=["b", "g", "purple", "r"],
+        dpi=args.dpi,
+    ).join()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,191 @@
+import asyncio
+import json
+
+import numpy as np
+import pytest
+
+from mpc_scaler_flink.estimation import KalmanEstimator
+from mpc_scaler_flink.history import load_spilled_history
+from mpc_scaler_flink.mpc_controller import MPCController
+from mpc_scaler_flink.multi_job import (
+    MultiJobControlLoop,
+    MultiJobController,
+    gather_actuation,
+    gather_metrics,
+    load_jobs,
+)
+from mpc_scaler_flink.pod import Pod, PodCapacity
+from mpc_scaler_flink.pod_allocator import PodAllocator
+
+JOB_PARAMETERS = [{}, {"alpha": 0.2}, {}, {"alpha": 0.2}, {}]
+
+
+def test_batched_jobs_match_one_controller_per_job():
+    rng = np.random.default_rng(0)
+    controller = MultiJobController(JOB_PARAMETERS, workers=2)
+    references = [MPCController(warm_start=True, **p) for p in JOB_PARAMETERS]
+    assert len(controller.groups) == 2
+
+    initial = rng.random((5, 3))
+    controller.initial_measurement(initial)
+    for reference, measurement in zip(references, initial):
+        reference.initial_measurement(measurement)
+
+    for step in range(4):
+        measurements = rng.random((5, 3))
+        # NOTE: The third step only solves some jobs, the others keep their state
+        solve = np.array([1, 0, 1, 1, 0], dtype=bool) if step == 2 else None
+        scaling_factors = controller.measurement_step(measurements, solve)
+        for job, reference in enumerate(references):
+            if solve is not None and not solve[job]:
+                assert scaling_factors[job] == 1.0
+                reference.skip_step(measurements[job])
+                continue
+            expected = reference.measurement_step(measurements[job])
+            assert scaling_factors[job] == pytest.approx(expected, abs=1e-6)
+
+
+def test_estimator_uses_the_model_of_each_job():
+    controller = MultiJobController(JOB_PARAMETERS)
+    A, B, c = controller.linear_model()
+    assert A.shape == (5, 3, 3) and B.shape == (5, 3, 1) and c.shape == (5, 3)
+    np.testing.assert_allclose(A[1], np.diag([0.8, 0.9, 0.8]))
+    np.testing.assert_allclose(A[2], np.diag([0.9, 0.9, 0.9]))
+
+    estimator = KalmanEstimator.from_controller(controller, streams=5)
+    estimator.update(np.full((5, 3), 0.5))
+    estimator.predict(np.zeros((5, 1)))
+    expected = (A @ np.full((5, 3, 1), 0.5))[..., 0] + c
+    np.testing.assert_allclose(estimator.x, expected)
+
+
+def test_control_loop_scales_every_job():
+    controller = MultiJobController([{}, {}, {"alpha": 0.2}])
+    controller.initial_measurement(np.zeros((3, 3)))
+    actuated = []
+
+    async def fetch(value):
+        return np.full(3, value)
+
+    def fetcher(value):
+        return lambda: fetch(value)
+
+    async def actuate(pods):
+        actuated.append([pod.replica_count for pod in pods])
+        return {"deployment": True}
+
+    pods = [[Pod(capacity, 1) for capacity in PodCapacity] for _ in range(3)]
+    control_loop = MultiJobControlLoop(
+        controller,
+        PodAllocator(1.0),
+        pods,
+        fetch_metrics=gather_metrics([fetcher(0.1), fetcher(1.0), fetcher(1.0)]),
+        actuate=gather_actuation(["a", "b", "c"], [actuate] * 3),
+        tick_interval=0.001,
+    )
+    asyncio.run(control_loop.run(max_ticks=1))
+
+    slots = [
+        sum(pod.replica_count * pod.task_slot_capacity.value for pod in job_pods)
+        for job_pods in control_loop.pods
+    ]
+    # Idle job scaled down, overloaded jobs scaled up from 28 slots
+    assert slots[0] < 28 < slots[1]
+    assert len(actuated) == 3
+    assert control_loop.instrumentation.solve_seconds.count == 1
+
+
+def test_steps_are_recorded_per_group_and_job(tmp_path):
+    spill_path = str(tmp_path / "history.bin")
+    controller = MultiJobController(JOB_PARAMETERS, history_spill_file=spill_path)
+    controller.initial_measurement(np.zeros((5, 3)))
+    raw = np.full((5, 3), 0.6)
+    filtered = np.full((5, 3), 0.5)
+
+    controller.annotate_step(7, raw)
+    controller.measurement_step(filtered, np.array([1, 0, 1, 1, 0], dtype=bool))
+    controller.measurement_step(filtered)
+
+    # Jobs 0, 2, 4 in group 0 and 1, 3 in group 1, rows of each group
+    first, second = (history.recent() for history in controller.histories)
+    # Nothing left the in-memory histories yet
+    for group in range(2):
+        assert len(load_spilled_history(f"{spill_path}.{group}")) == 0
+    np.testing.assert_array_equal(first["tick"], [7, 7, 7, 8, 8, 8])
+    np.testing.assert_array_equal(first["job"], [0, 1, 2, 0, 1, 2])
+    np.testing.assert_array_equal(second["job"], [1, 0, 0, 1])
+    np.testing.assert_array_equal(first["raw_measurement"][:3], raw[:3])
+    np.testing.assert_array_equal(first["raw_measurement"][3:], filtered[:3])
+    # Job 4 was skipped in the first tick
+    assert first["scaling_factor"][2] == 1.0 and first["iter_count"][2] == 0
+    assert first["iter_count"][0] >= 1 and first["success"].all()
+
+
+def test_failed_solves_keep_the_pods():
+    class FailingSolver:
+        def __init__(self, solver):
+            self.solver = solver
+
+        def __call__(self, **kwargs):
+            return self.solver(**kwargs)
+
+        def stats(self):
+            return {**self.solver.stats(), "success": False, "return_status": "failed"}
+
+    controller = MultiJobController([{}, {}], workers=1)
+    controller.initial_measurement(np.zeros((2, 3)))
+    group = controller.groups[0]
+    group._solvers = [FailingSolver(group._solvers[0])]
+
+    scaling_factors = controller.measurement_step(np.full((2, 3), 1.0))
+
+    np.testing.assert_array_equal(scaling_factors, [1.0, 1.0])
+    assert not group.started.any()
+    np.testing.assert_array_equal(group.u0, 0)
+    assert [stats.success for stats in controller.last_step_stats] == [False, False]
+
+
+def test_control_loop_exports_solver_stats_per_job():
+    controller = MultiJobController([{}, {}, {"alpha": 0.2}], workers=2)
+    controller.initial_measurement(np.zeros((3, 3)))
+
+    async def fetch_metrics():
+        return np.full((3, 3), 0.5)
+
+    async def actuate(pods):
+        return {}
+
+    control_loop = MultiJobControlLoop(
+        controller,
+        PodAllocator(1.0),
+        [[Pod(capacity, 1) for capacity in PodCapacity] for _ in range(3)],
+        fetch_metrics=fetch_metrics,
+        actuate=actuate,
+        tick_interval=0.001,
+    )
+    asyncio.run(control_loop.run(max_ticks=2))
+
+    instrumentation = control_loop.instrumentation
+    statuses = [stats.return_status for stats in controller.last_step_stats]
+    assert instrumentation.solver_iterations.count == 6
+    assert sum(map(instrumentation.solver_steps.value, set(statuses))) == 6
+    assert controller.histories[0].count == 4
+
+
+def test_load_jobs(tmp_path):
+    path = tmp_path / "jobs.json"
+    path.write_text(
+        json.dumps(
+            [
+                {"name": "a", "job_name": "A", "parameters": {"alpha": 0.2}},
+                {"name": "b", "deployments": {"SMALL": "b-small"}},
+            ]
+        )
+    )
+    jobs = load_jobs(str(path))
+    assert [job.controller_parameters() for job in jobs] == [{"alpha": 0.2}, {}]
+    assert jobs[1].deployment_names() == {PodCapacity.SMALL: "b-small"}
+
+    path.write_text(json.dumps([{"name": "a"}, {"name": "a"}]))
+    with pytest.raises(ValueError):
+        load_jobs(str(path))
@@ -0,0 +1,18 @@
+import pytest
+
+from mpc_scaler_flink.plotting import plot_in_background
+
+pytest.importorskip("matplotlib")
+
+
+def test_plot_in_background_writes_png(tmp_path):
+    output_file = tmp_path / "trajectories.png"
+    process = plot_in_background(
+        {"Utilization": [0.1, 0.5, 0.9], "Scaling Factor": [1.0, 1.2, 0.8]},
+        str(output_file),
+        sharex=True,
+    )
+    process.join(timeout=60)
+
+    assert process.exitcode == 0
+    assert output_file.read_bytes().startswith(b"\x89PNG")
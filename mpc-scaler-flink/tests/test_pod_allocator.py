@@ -1,9 +1,16 @@
+import itertools
+import math
 from typing import List
 
 import pytest
 
 from mpc_scaler_flink.pod import Pod, PodCapacity
-from mpc_scaler_flink.pod_allocator import PodAllocator
+from mpc_scaler_flink.pod_allocator import (
+    AllocationTable,
+    OptimalPodAllocator,
+    PodAllocator,
+    ReconfigurationAwareAllocator,
+)
 
 # Assuming Pod and PodAllocator classes are already imported
 
@@ -70,3 +77,132 @@ def test_allocate_pods_with_utilisation_1(value_to_allocate, expected_allocation
     result_replica_counts = [pod.replica_count for pod in sorted_result]
 
     assert result_replica_counts == expected_allocation
+
+
+@pytest.mark.parametrize(
+    "value_to_allocate, expected_allocation",
+    [
+        (17, [1, 0, 1]),
+        (16, [1, 0, 0]),
+        (15, [1, 0, 0]),
+        (13, [1, 0, 0]),
+        (12, [0, 1, 1]),
+        (9, [0, 1, 1]),
+        (8, [0, 1, 0]),
+        (7, [0, 1, 0]),
+        (5, [0, 1, 0]),
+        (4, [0, 0, 1]),
+        (1, [0, 0, 1]),
+        (0, [0, 0, 0]),
+    ],
+)
+def test_optimal_allocate_pods_with_utilisation_1(
+    value_to_allocate, expected_allocation
+):
+    pods: List[Pod] = [Pod(capacity, 0) for capacity in PodCapacity]
+    allocator: OptimalPodAllocator = OptimalPodAllocator(1)
+
+    result = allocator.allocate_pods(value_to_allocate, pods)
+
+    result_replica_counts = [pod.replica_count for pod in result]
+
+    assert result_replica_counts == expected_allocation
+
+
+@pytest.mark.parametrize("target_utilisation", [1.0, 0.8, 0.5])
+def test_optimal_allocation_has_minimum_waste(target_utilisation):
+    capacities = (7, 5, 3)
+    table = AllocationTable(capacities, target_utilisation)
+
+    for number_of_slots in range(60):
+        required_slots = math.ceil(round(number_of_slots / target_utilisation, 9))
+        counts = table.replica_counts(number_of_slots)
+        allocated_slots = sum(c * n for c, n in counts.items())
+
+        brute_force = min(
+            (sum(c * n for c, n in zip(capacities, mix)) - required_slots, sum(mix))
+            for mix in itertools.product(range(required_slots // 3 + 2), repeat=3)
+            if sum(c * n for c, n in zip(capacities, mix)) >= required_slots
+        )
+        assert (allocated_slots - required_slots, sum(counts.values())) == brute_force
+
+
+def test_optimal_allocation_for_large_slot_counts():
+    pods: List[Pod] = [Pod(capacity, 0) for capacity in PodCapacity]
+    allocator: OptimalPodAllocator = OptimalPodAllocator(1)
+
+    result = allocator.allocate_pods(4004, pods)
+
+    assert [pod.replica_count for pod in result] == [250, 0, 1]
+
+
+@pytest.mark.parametrize(
+    "current_allocation, value_to_allocate, expected_allocation, expected_churn",
+    [
+        ([0, 1, 2], 15, [0, 1, 2], 0),
+        ([0, 1, 2], 17, [0, 1, 3], 1),
+        ([0, 1, 2], 12, [0, 1, 1], 1),
+        ([1, 1, 1], 40, [2, 1, 0], 2),
+        ([3, 3, 3], 60, [2, 2, 3], 2),
+        ([0, 0, 0], 32, [2, 0, 0], 2),
+    ],
+)
+def test_reconfiguration_aware_allocation(
+    current_allocation, value_to_allocate, expected_allocation, expected_churn
+):
+    pods: List[Pod] = [
+        Pod(capacity, replica_count)
+        for capacity, replica_count in zip(
+            sorted(PodCapacity, key=lambda c: c.value, reverse=True),
+            current_allocation,
+        )
+    ]
+    allocator = ReconfigurationAwareAllocator(1)
+
+    diff = allocator.allocate_diff(value_to_allocate, pods)
+    result = diff.apply(pods)
+
+    assert [pod.replica_count for pod in result] == expected_allocation
+    assert diff.churn == expected_churn
+
+
+def test_reconfiguration_aware_allocation_has_minimum_churn():
+    capacities = sorted(PodCapacity, key=lambda c: c.value, reverse=True)
+    allocator = ReconfigurationAwareAllocator(1)
+
+    for current_allocation in itertools.product(range(3), repeat=3):
+        for value_to_allocate in range(0, 50, 3):
+            pods = [Pod(c, n) for c, n in zip(capacities, current_allocation)]
+            minimum_waste_pods = OptimalPodAllocator(1).allocate_pods(
+                value_to_allocate, [Pod(c, 0) for c in capacities]
+            )
+            minimum_capacity = sum(
+                pod.replica_count * pod.task_slot_capacity.value
+                for pod in minimum_waste_pods
+            )
+
+            diff = allocator.allocate_diff(value_to_allocate, pods)
+
+            brute_force = min(
+                sum(abs(n - c) for n, c in zip(mix, current_allocation))
+                for mix in itertools.product(range(8), repeat=3)
+                if sum(n * c.value for n, c in zip(mix, capacities)) == minimum_capacity
+            )
+            assert diff.churn == brute_force
+
+
+def test_target_utilisation_provisions_spare_slots():
+    pods: List[Pod] = [Pod(capacity, 0) for capacity in PodCapacity]
+    allocator = OptimalPodAllocator(target_utilisation=0.8)
+
+    result = allocator.allocate_pods(8, pods)
+
+    # NOTE: 8 used slots at 80% need 10, the smallest reachable capacity is 12
+    assert sum(pod.replica_count * pod.task_slot_capacity.value for pod in result) == 12
+
+
+def test_optimal_allocators_keep_the_base_attributes():
+    for allocator in (OptimalPodAllocator(0.8), ReconfigurationAwareAllocator(0.8)):
+        assert allocator.utilisation_factor == 1.0
+        assert allocator.target_utilisation == 0.8
+    assert OptimalPodAllocator(utilisation_factor=0.5).utilisation_factor == 0.5
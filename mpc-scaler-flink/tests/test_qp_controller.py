@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from mpc_scaler_flink.mpc_controller import MPCController
+from mpc_scaler_flink.qp_controller import BoxQPSolver, CondensedQPController
+
+
+@pytest.mark.parametrize(
+    "measurements",
+    [
+        # NOTE: Input bound inactive.
+        [[0.2, 0.0, 0.1], [0.5, 0.1, 0.4], [0.9, 0.3, 0.8], [0.7, 0.6, 0.9]],
+        # NOTE: Input bound active for the first steps.
+        [[-5.0, -5.0, -5.0], [-5.0, -5.0, -5.0], [0.5, 0.1, 0.4], [0.9, 0.3, 0.8]],
+    ],
+)
+def test_condensed_qp_matches_do_mpc(measurements):
+    mpc_controller = MPCController()
+    qp_controller = CondensedQPController()
+    mpc_controller.initial_measurement(np.array([0, 0, 0]))
+    qp_controller.initial_measurement(np.array([0, 0, 0]))
+
+    for measurement in measurements:
+        expected = mpc_controller.measurement_step(np.array(measurement))
+        result = qp_controller.measurement_step(np.array(measurement))
+
+        assert result == pytest.approx(expected, abs=1e-6)
+        assert qp_controller.last_step_stats.success
+
+
+def test_box_qp_solver_satisfies_kkt_conditions():
+    rng = np.random.default_rng(0)
+    M = rng.normal(size=(6, 6))
+    H = M @ M.T + 6 * np.eye(6)
+    g = rng.normal(scale=10, size=6)
+    lower = np.full(6, -1.0)
+    upper = np.full(6, 1.0)
+    solver = BoxQPSolver(H, lower, upper)
+
+    u, active_lower, active_upper, _, success = solver.solve(
+        g, np.zeros(6, dtype=bool), np.zeros(6, dtype=bool)
+    )
+
+    gradient = H @ u + g
+    free = ~(active_lower | active_upper)
+    assert success
+    assert np.all(u >= lower - 1e-12) and np.all(u <= upper + 1e-12)
+    np.testing.assert_allclose(gradient[free], 0, atol=1e-9)
+    assert np.all(gradient[active_lower] >= 0)
+    assert np.all(gradient[active_upper] <= 0)
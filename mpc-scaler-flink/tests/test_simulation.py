@@ -0,0 +1,106 @@
+import numpy as np
+import pytest
+
+from mpc_scaler_flink.pod import Pod, PodCapacity
+from mpc_scaler_flink.pod_allocator import PodAllocator
+from mpc_scaler_flink.simulation import (
+    ClusterSimulator,
+    load_rate_curve,
+    queue_lengths,
+)
+
+
+class BusyTimeController:
+    # Scales the slots so that the busy time reaches its target
+    def __init__(self, target: float = 0.8):
+        self.target = target
+
+    def measurement_step(self, metrics_array) -> float:
+        return max(metrics_array[2] + metrics_array[1], 0.05) / self.target
+
+
+def test_queue_lengths_match_lindley_recursion():
+    rng = np.random.default_rng(0)
+    arrivals = rng.random(200) * 10
+    capacities = rng.random(200) * 10
+
+    expected = []
+    queue = 3.0
+    for arrival, capacity in zip(arrivals, capacities):
+        queue = max(queue + arrival - capacity, 0.0)
+        expected.append(queue)
+
+    np.testing.assert_allclose(queue_lengths(3.0, arrivals, capacities), expected)
+
+
+def test_advance_metrics_under_and_over_load():
+    simulator = ClusterSimulator(slot_throughput=100.0, buffer_seconds=1.0)
+    not_restarting = np.zeros(5, dtype=bool)
+
+    underloaded = simulator.advance(
+        0.0, np.full(5, 400.0), np.full(5, 8), not_restarting
+    )
+    np.testing.assert_allclose(underloaded.lag, 0.0)
+    np.testing.assert_allclose(underloaded.metrics[:, 2], 0.5)
+    np.testing.assert_allclose(underloaded.metrics[:, 1], 0.0)
+
+    overloaded = simulator.advance(
+        0.0, np.full(5, 1200.0), np.full(5, 8), not_restarting
+    )
+    np.testing.assert_allclose(overloaded.lag, [400, 800, 1200, 1600, 2000])
+    np.testing.assert_allclose(overloaded.metrics[:, 2], 1.0)
+    # Backpressured once the lag exceeds the 800 events of one buffer second
+    np.testing.assert_allclose(overloaded.metrics[:, 1], [0, 0, 1 / 3, 2 / 3, 1])
+
+    restarting = simulator.advance(0.0, np.full(3, 100.0), np.full(3, 8), [1, 1, 0])
+    np.testing.assert_allclose(restarting.lag, [100, 200, 0])
+    assert np.isnan(restarting.metrics[:2]).all()
+
+
+def test_closed_loop_follows_the_input_rate():
+    seconds = np.arange(1800)
+    rates = 2000 + 1500 * np.sin(2 * np.pi * seconds / 1800)
+    pods = [Pod(capacity, 1) for capacity in PodCapacity]
+
+    report = ClusterSimulator(slot_throughput=100.0, restart_seconds=5).run(
+        rates, BusyTimeController(), PodAllocator(1.0), pods, tick_interval=10
+    )
+
+    assert report.seconds == 1800
+    assert report.ticks == 180
+    assert 0 < report.rescales <= report.ticks
+    # The slots follow the demand of 5 to 35 slots instead of staying at 28
+    assert report.underprovisioned_slot_seconds < 0.1 * report.slot_seconds
+    assert report.lag_violation_seconds < 0.1 * report.seconds
+    assert report.final_lag < rates[-1]
+
+
+def test_load_rate_curve_of_the_scenario_builder(tmp_path):
+    # Layout of `RateCurve.save` in the senMLScenarioBuilder
+    path = tmp_path / "scenario.rate.npz"
+    with open(path, "wb") as f:
+        np.savez(
+            f,
+            version=1,
+            rates=np.array([10, 20, 30], dtype=np.float32),
+            window_ms=2000.0,
+            start_ms=0.0,
+        )
+
+    np.testing.assert_allclose(load_rate_curve(str(path)), [10, 10, 20, 20, 30, 30])
+
+    # NOTE: Sub-second windows are averaged per second
+    with open(path, "wb") as f:
+        np.savez(
+            f,
+            version=1,
+            rates=np.array([10, 30, 20, 40, 50], dtype=np.float32),
+            window_ms=500.0,
+            start_ms=0.0,
+        )
+    np.testing.assert_allclose(load_rate_curve(str(path)), [20, 30, 50])
+
+    with open(path, "wb") as f:
+        np.savez(f, version=2, rates=np.zeros(1), window_ms=1000.0, start_ms=0.0)
+    with pytest.raises(ValueError):
+        load_rate_curve(str(path))
@@ -0,0 +1,152 @@
+import os
+import subprocess
+import sys
+import threading
+import urllib.error
+import urllib.request
+
+import numpy as np
+import pytest
+
+from mpc_scaler_flink.health import HealthServer
+from mpc_scaler_flink.main import main
+from mpc_scaler_flink.startup import ComponentLoader
+
+
+def get_status(port: int, path: str) -> int:
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}") as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def test_ready_only_after_components_are_loaded():
+    health_server = HealthServer(0, host="127.0.0.1")
+    health_server.start()
+    loader = ComponentLoader()
+    release = threading.Event()
+    try:
+        slow = loader.submit("slow", lambda: release.wait(10) and "controller")
+        fast = loader.submit("fast", lambda value: value, 42)
+
+        assert fast.result() == 42
+        assert get_status(health_server.port, "/healthz") == 200
+        assert get_status(health_server.port, "/ready") == 503
+
+        release.set()
+        assert slow.result() == "controller"
+        health_server.ready.set()
+        assert get_status(health_server.port, "/ready") == 200
+        assert get_status(health_server.port, "/unknown") == 404
+    finally:
+        loader.close()
+        health_server.close()
+
+    assert set(loader.timings.durations) == {"slow", "fast"}
+    assert "slow" in loader.timings.summary()
+
+
+def test_failed_component_is_timed_and_raises():
+    loader = ComponentLoader()
+
+    def fail():
+        raise RuntimeError("no kube config")
+
+    with pytest.raises(RuntimeError):
+        loader.submit("actuator", fail).result()
+    loader.close()
+    assert "actuator" in loader.timings.durations
+
+
+def test_build_controller_warm_start():
+    from mpc_scaler_flink.startup import build_controller
+
+    controller = build_controller(warm_start=True)
+
+    assert controller.warm_start
+    controller.initial_measurement(np.zeros(3))
+    assert controller.measurement_step(np.array([0.9, 0.1, 0.9])) > 1
+
+
+def test_build_controller_qp_backend_matches_model():
+    from mpc_scaler_flink.qp_controller import CondensedQPController
+    from mpc_scaler_flink.startup import build_controller
+
+    controller = build_controller(backend="qp")
+
+    assert isinstance(controller, CondensedQPController)
+    for expected, actual in zip(
+        build_controller().linear_model(), controller.linear_model()
+    ):
+        np.testing.assert_allclose(actual, expected)
+    with pytest.raises(ValueError):
+        build_controller(warm_start=True, backend="qp")
+
+
+def test_build_allocator_passes_utilisation_per_kind():
+    from mpc_scaler_flink.pod_allocator import OptimalPodAllocator, PodAllocator
+    from mpc_scaler_flink.startup import build_allocator
+
+    greedy = build_allocator("greedy", 0.7)
+    optimal = build_allocator("optimal", 0.7)
+
+    assert type(greedy) is PodAllocator and greedy.utilisation_factor == 0.7
+    assert isinstance(optimal, OptimalPodAllocator)
+    assert optimal.target_utilisation == 0.7
+    assert build_allocator("reconfiguration", 0.7, 2).surplus_tolerance == 2
+    with pytest.raises(ValueError):
+        build_allocator("random")
+
+
+@pytest.mark.parametrize(
+    "flags", [["--namespace", "flink"], ["--job-name", "A"], ["--controller", "qp"]]
+)
+def test_jobs_file_rejects_single_job_flags(monkeypatch, capsys, flags):
+    monkeypatch.setattr(sys, "argv", ["mpc-scaler", "--jobs-file", "jobs.json", *flags])
+    with pytest.raises(SystemExit):
+        main()
+    assert flags[0] in capsys.readouterr().err
+
+
+@pytest.mark.parametrize(
+    "flags",
+    [
+        ["--controller", "explicit"],
+        ["--control-law", "law.npz"],
+        ["--controller", "explicit", "--control-law", "law.npz", "--warm-start"],
+        [
+            "--controller",
+            "explicit",
+            "--control-law",
+            "law.npz",
+            "--dynamics-file",
+            "d",
+        ],
+    ],
+)
+def test_explicit_controller_flags_are_validated(monkeypatch, flags):
+    monkeypatch.setattr(sys, "argv", ["mpc-scaler", *flags])
+    with pytest.raises(SystemExit):
+        main()
+
+
+@pytest.mark.parametrize(
+    "module, unloaded",
+    [
+        ("mpc_scaler_flink.main", ["numpy", "do_mpc", "casadi", "kubernetes"]),
+        ("mpc_scaler_flink.qp_controller", ["do_mpc", "casadi"]),
+    ],
+)
+def test_heavy_dependencies_are_not_imported(module, unloaded):
+    # NOTE: A fresh interpreter with the same import path, the test process
+    # has imported all of them
+    code = f"import sys, {module}; print(*(name in sys.modules for name in {unloaded}))"
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        env={**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert result.stdout.split() == ["False"] * len(unloaded)
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from mpc_scaler_flink.mpc_controller import MPCController
+from tests.sweep_controller_parameters import (
+    DEFAULT_SCENARIO,
+    TIME_SERIES_FILE,
+    load_scenarios,
+    parameter_grid,
+    run_sweep,
+)
+
+
+def test_parameter_grid_is_full_product():
+    grid = parameter_grid({"alpha": [0.1, 0.2], "beta": [0.5], "gamma": [0.1, 0.3]})
+    assert len(grid) == 4
+    assert {"alpha": 0.2, "beta": 0.5, "gamma": 0.3} in grid
+
+
+def test_sweep_matches_sequential_simulation(tmp_path):
+    measurements = load_scenarios(TIME_SERIES_FILE, [DEFAULT_SCENARIO], 10)
+    # NOTE: The same scenario twice checks that the controller is reset in between.
+    measurements = np.concatenate([measurements, measurements])
+    grid = parameter_grid({"alpha": [0.1, 0.2], "event_horizon": [5]})
+
+    columns = run_sweep(grid, measurements, str(tmp_path), workers=2)
+
+    assert columns["scaling_factor"].shape == (2, 2, 10)
+    np.testing.assert_array_equal(np.load(tmp_path / "alpha.npy"), [0.1, 0.2])
+    stored = np.load(tmp_path / "scaling_factor.npy")
+    for run, parameters in enumerate(grid):
+        controller = MPCController(warm_start=True, **parameters)
+        controller.initial_measurement(np.zeros(3))
+        expected = [controller.measurement_step(m) for m in measurements[0]]
+        assert stored[run, 0] == pytest.approx(expected, abs=1e-9)
+        assert stored[run, 1] == pytest.approx(expected, abs=1e-9)
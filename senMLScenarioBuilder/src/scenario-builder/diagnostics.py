@@ -0,0 +1,150 @@
+from dataclasses import dataclass
+from typing import Iterable
+
+import numpy as np
+from numpy.typing import NDArray
+
+# Bump when the layout of the rate curve files changes
+RATE_CURVE_VERSION = 1
+
+
+def window_counts(timestamps: NDArray, edges_ms: NDArray) -> NDArray:
+    # NOTE: Events in `[edges_ms[i], edges_ms[i + 1])` of sorted timestamps,
+    # one binary search per edge instead of a mask over all events per window.
+    return np.diff(np.searchsorted(timestamps, edges_ms, side="left"))
+
+
+def events_around(
+    timestamps: NDArray, centers_ms: NDArray, window_ms: float
+) -> NDArray:
+    # Events within `window_ms / 2` of each center, the windows may overlap
+    centers_ms = np.asarray(centers_ms, dtype=np.float64)
+    starts = np.searchsorted(timestamps, centers_ms - window_ms / 2, side="left")
+    ends = np.searchsorted(timestamps, centers_ms + window_ms / 2, side="left")
+    return ends - starts
+
+
+@dataclass
+class RateCurve:
+    # NOTE: Events per second in consecutive windows of `window_ms` starting
+    # at `start_ms`. Stored as float32, a 15 minute scenario at one second
+    # resolution takes less than 4 kB.
+    rates: NDArray
+    window_ms: float
+    start_ms: float = 0.0
+
+    @property
+    def times_ms(self) -> NDArray:
+        # Start of each window
+        return self.start_ms + np.arange(len(self.rates)) * self.window_ms
+
+    @classmethod
+    def from_timestamps(
+        cls,
+        timestamps: NDArray,
+        duration_ms: float,
+        window_ms: float = 1000.0,
+        start_ms: float = 0.0,
+    ) -> "RateCurve":
+        windows = int(np.ceil(duration_ms / window_ms))
+        edges = start_ms + np.arange(windows + 1) * window_ms
+        # The last window includes its end, an event at `duration_ms` counts
+        edges[-1] = np.nextafter(edges[-1], np.inf)
+        counts = window_counts(np.asarray(timestamps), edges)
+        return cls(
+            (counts * (1000 / window_ms)).astype(np.float32), window_ms, start_ms
+        )
+
+    @classmethod
+    def from_chunks(
+        cls,
+        chunks: Iterable[NDArray],
+        duration_ms: float,
+        window_ms: float = 1000.0,
+        start_ms: float = 0.0,
+    ) -> "RateCurve":
+        # NOTE: Single `bincount` pass per chunk, for timestamps that are
+        # generated lazily or are not sorted. Same windows as `from_timestamps`.
+        windows = int(np.ceil(duration_ms / window_ms))
+        end_ms = start_ms + windows * window_ms
+        counts = np.zeros(windows, dtype=np.int64)
+        for chunk in chunks:
+            chunk = np.asarray(chunk)
+            chunk = chunk[(chunk >= start_ms) & (chunk <= end_ms)]
+            index = np.minimum(
+                ((chunk - start_ms) // window_ms).astype(np.int64), windows - 1
+            )
+            counts += np.bincount(index, minlength=windows)
+        return cls(
+            (counts * (1000 / window_ms)).astype(np.float32), window_ms, start_ms
+        )
+
+    def resample(self, window_ms: float) -> "RateCurve":
+        # Coarser curve with a window that is a multiple of the current one
+        factor = int(round(window_ms / self.window_ms))
+        if factor < 1 or not np.isclose(factor * self.window_ms, window_ms):
+            raise ValueError(
+                f"Window {window_ms} ms is not a multiple of {self.window_ms} ms"
+            )
+        usable = len(self.rates) // factor * factor
+        rates = self.rates[:usable].reshape(-1, factor).mean(axis=1)
+        return RateCurve(rates.astype(np.float32), window_ms, self.start_ms)
+
+    def compare(self, observed: "RateCurve") -> NDArray:
+        # NOTE: `observed - self` over the common windows, e.g. with the rate
+        # Flink ingested. Both curves need the same window size.
+        if not np.isclose(self.window_ms, observed.window_ms):
+            raise ValueError(
+                f"Window sizes differ: {self.window_ms} ms and {observed.window_ms} ms"
+            )
+        offset = int(round((observed.start_ms - self.start_ms) / self.window_ms))
+        expected = self.rates[max(offset, 0) :]
+        actual = observed.rates[max(-offset, 0) :]
+        length = min(len(expected), len(actual))
+        return actual[:length] - expected[:length]
+
+    def save(self, path: str):
+        # NOTE: Written through the file object, `np.savez` would append `.npz`.
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                version=RATE_CURVE_VERSION,
+                rates=self.rates,
+                window_ms=self.window_ms,
+                start_ms=self.start_ms,
+            )
+
+    @classmethod
+    def load(cls, path: str) -> "RateCurve":
+        with np.load(path) as data:
+            if int(data["version"]) != RATE_CURVE_VERSION:
+                raise ValueError(
+                    f"Expected rate curve version {RATE_CURVE_VERSION}, got {int(data['version'])}"
+                )
+            return cls(
+                rates=data["rates"],
+                window_ms=float(data["window_ms"]),
+                start_ms=float(data["start_ms"]),
+            )
+
+
+def print_summary(
+    timestamp_chunks: Iterable[NDArray], curve: RateCurve, duration_ms: float
+):
+    # Events within half a minute of the start, the quarters and the end, of
+    # the sorted timestamps given in chunks
+    window_ms = 60 * 1000
+    centers = np.array(
+        [window_ms / 2]
+        + [duration_ms * q for q in (0.25, 0.5, 0.75)]
+        + [duration_ms - window_ms / 2]
+    )
+    counts = np.zeros(len(centers), dtype=np.int64)
+    for chunk in timestamp_chunks:
+        counts += events_around(np.asarray(chunk), centers, window_ms)
+    for center, count in zip(centers, counts):
+        print(f"Events around {center / window_ms:>6.2f} min (±0.5 min): {count}")
+    print(
+        f"Rate events/s (min/mean/max over {curve.window_ms / 1000:g}s windows): "
+        f"{curve.rates.min():.1f}/{curve.rates.mean():.1f}/{curve.rates.max():.1f}"
+    )
@@ -0,0 +1,42 @@
+import multiprocessing
+
+import numpy as np
+from numpy.typing import NDArray
+
+from .diagnostics import RateCurve
+
+
+def render_rates(
+    rates: NDArray, edges: NDArray, title: str, plot_file: str, dpi: int = 150
+):
+    # NOTE: matplotlib is a dev dependency, the builder itself runs without it
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots()
+    ax.stairs(rates, edges, fill=True, alpha=0.6, color="green")
+    ax.set_xlabel("Time [seconds]")
+    ax.set_ylabel("Events/s")
+    ax.set_title(title)
+    fig.savefig(plot_file, dpi=dpi, bbox_inches="tight")
+    plt.close(fig)
+    print(f"Saved rate plot at {plot_file}")
+
+
+def plot_in_background(
+    curve: RateCurve, title: str, plot_file: str
+) -> multiprocessing.Process:
+    # NOTE: Plots the rate curve of the scenario, so the timestamps are never
+    # held at once. Only the curve is handed to a separate process, so
+    # rendering overlaps with rewriting the file. Join the returned process
+    # before exiting to wait for the plot.
+    edges = np.append(
+        curve.times_ms, curve.start_ms + len(curve.rates) * curve.window_ms
+    )
+    process = multiprocessing.get_context("spawn").Process(
+        target=render_rates, args=(curve.rates, edges / 1000, title, plot_file)
+    )
+    process.start()
+    return process
@@ -0,0 +1,300 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import sys
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, BinaryIO, Deque, Iterator, Optional, Protocol
+
+import numpy as np
+from numpy.typing import NDArray
+
+from .rewrite import rewrite_rows
+from .row_index import NEWLINE, RowIndex, load_or_build_row_index
+from .scenarios import SCENARIOS, get_scenario
+
+DEFAULT_CHUNK_ROWS = 64 * 1024
+BATCH_WINDOW = 0.001
+
+
+@dataclass
+class EventChunk:
+    # NOTE: Consecutive rows in time order. Row `i` is
+    # `data[offsets[i]:offsets[i + 1]]` including its newline, so any range of
+    # rows is a single slice of `data`.
+    timestamps: NDArray
+    data: bytes
+    offsets: NDArray
+
+
+def parse_integers(data: NDArray, starts: NDArray, ends: NDArray) -> NDArray:
+    # NOTE: Vectorized `int(data[start:end])` for ASCII digit spans.
+    lengths = ends - starts
+    width = int(lengths.max(initial=1))
+    positions = starts[:, None] + np.arange(width)
+    used = np.arange(width) < lengths[:, None]
+    digits = data[np.minimum(positions, len(data) - 1)].astype(np.int64) - ord("0")
+    # The k-th digit of a span of length L weighs 10^(L - 1 - k)
+    exponents = lengths[:, None] - 1 - np.arange(width)
+    return np.where(used, digits * 10 ** np.maximum(exponents, 0), 0).sum(axis=1)
+
+
+def file_events(
+    path: str,
+    row_index: Optional[RowIndex] = None,
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+) -> Iterator[EventChunk]:
+    # Events of a scenario file, the first column holds the timestamp in ms
+    row_index = row_index or load_or_build_row_index(path)
+    row_starts = row_index.row_starts
+    with open(path, "rb") as f:
+        for first in range(0, row_index.row_count, chunk_rows):
+            last = min(first + chunk_rows, row_index.row_count)
+            start = int(row_starts[first])
+            end = int(row_index.line_ends[last - 1])
+            f.seek(start)
+            data = f.read(end + 1 - start)
+            if len(data) == end - start:
+                data += b"\n"
+            offsets = np.append(row_starts[first:last], end + 1) - start
+            timestamps = parse_integers(
+                np.frombuffer(data, dtype=np.uint8),
+                offsets[:-1],
+                row_index.first_column_ends[first:last] - start,
+            )
+            yield EventChunk(timestamps.astype(np.float64), data, offsets)
+
+
+def sampled_events(
+    timestamp_chunks: Iterator[NDArray], payload_file: str, row_index: RowIndex
+) -> Iterator[EventChunk]:
+    # NOTE: Events straight from a sampler, the rows of `payload_file` are
+    # reused cyclically with the sampled timestamps as first column.
+    first_row = 0
+    with open(payload_file, "rb") as infile:
+        for timestamps in timestamp_chunks:
+            buffer = io.BytesIO()
+            rewrite_rows(infile, buffer, timestamps, row_index, first_row)
+            first_row += len(timestamps)
+            data = buffer.getvalue()
+            line_ends = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == NEWLINE)
+            yield EventChunk(
+                timestamps.astype(np.int64).astype(np.float64),
+                data,
+                np.concatenate(([0], line_ends + 1)),
+            )
+
+
+class Sink(Protocol):
+    async def send(self, data: bytes, count: int): ...
+
+    async def close(self): ...
+
+
+class StreamSink:
+    # Writes the rows to a binary file object, e.g. stdout or a file
+    def __init__(self, stream: BinaryIO, close_stream: bool = False):
+        self.stream = stream
+        self.close_stream = close_stream
+
+    async def send(self, data: bytes, count: int):
+        self.stream.write(data)
+
+    async def close(self):
+        self.stream.flush()
+        if self.close_stream:
+            self.stream.close()
+
+
+class SocketSink:
+    # Sends the rows over a TCP connection, e.g. to a Flink socket source
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    async def send(self, data: bytes, count: int):
+        if self._writer is None:
+            _, self._writer = await asyncio.open_connection(self.host, self.port)
+        self._writer.write(data)
+        await self._writer.drain()
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            await self._writer.wait_closed()
+
+
+class KafkaSink:
+    # NOTE: One message per row. `producer` only needs the `send(topic, value=...)`
+    # and `flush()` methods of `kafka.KafkaProducer`, so a local stub works as well.
+    def __init__(self, producer: Any, topic: str):
+        self.producer = producer
+        self.topic = topic
+
+    async def send(self, data: bytes, count: int):
+        for row in data.splitlines():
+            self.producer.send(self.topic, value=row)
+
+    async def close(self):
+        self.producer.flush()
+
+
+@dataclass
+class ReplayStatistics:
+    events: int = 0
+    batches: int = 0
+    scenario_span: float = 0.0
+    started: Optional[float] = None
+    last_sent: Optional[float] = None
+    # NOTE: Lag of the recent batches only, memory stays flat.
+    lags: Deque[float] = field(default_factory=lambda: deque(maxlen=10000))
+    max_lag: float = 0.0
+
+    def record(self, count: int, lag: float, scenario_span: float):
+        self.events += count
+        self.batches += 1
+        self.scenario_span = scenario_span
+        self.lags.append(lag)
+        self.max_lag = max(self.max_lag, lag)
+        self.last_sent = time.monotonic()
+
+    def summary(self, speedup: float) -> str:
+        elapsed = self.last_sent - self.started if self.started else 0.0
+        target_rate = (
+            self.events / (self.scenario_span / speedup) if self.scenario_span else 0.0
+        )
+        achieved_rate = self.events / elapsed if elapsed else 0.0
+        lags = np.array(self.lags) * 1e3 if self.lags else np.zeros(1)
+        return (
+            f"events: {self.events}, batches: {self.batches}, "
+            f"rate events/s (target/achieved): {target_rate:.0f}/{achieved_rate:.0f}, "
+            f"lag ms (mean/p99/max): {lags.mean():.2f}/{np.percentile(lags, 99):.2f}/"
+            f"{self.max_lag * 1e3:.2f}"
+        )
+
+
+async def replay(
+    chunks: Iterator[EventChunk],
+    sink: Sink,
+    speedup: float = 1.0,
+    batch_window: float = BATCH_WINDOW,
+    report_interval: float = 1.0,
+    statistics: Optional[ReplayStatistics] = None,
+) -> ReplayStatistics:
+    # NOTE: Every event is due at `start + (timestamp - first timestamp) / speedup`.
+    # All events due within the next `batch_window` seconds are sent with one
+    # call, so the scheduler wakes up at most once per window regardless of the
+    # event rate. The next chunk is read in a worker thread while the current
+    # one is replayed.
+    statistics = statistics or ReplayStatistics()
+    loop = asyncio.get_running_loop()
+    chunk_iterator = iter(chunks)
+    next_chunk = loop.run_in_executor(None, next, chunk_iterator, None)
+    start: Optional[float] = None
+    first_timestamp = 0.0
+    last_report = loop.time()
+
+    while (chunk := await next_chunk) is not None:
+        next_chunk = loop.run_in_executor(None, next, chunk_iterator, None)
+        if start is None:
+            start = loop.time()
+            statistics.started = time.monotonic()
+            first_timestamp = float(chunk.timestamps[0])
+        due = start + (chunk.timestamps - first_timestamp) / 1000 / speedup
+
+        i = 0
+        while i < len(due):
+            now = loop.time()
+            if due[i] > now:
+                await asyncio.sleep(due[i] - now)
+                now = loop.time()
+            j = max(int(np.searchsorted(due, now + batch_window, side="right")), i + 1)
+            await sink.send(chunk.data[chunk.offsets[i] : chunk.offsets[j]], j - i)
+            statistics.record(
+                j - i,
+                lag=now - due[i],
+                scenario_span=(float(chunk.timestamps[j - 1]) - first_timestamp) / 1000,
+            )
+            i = j
+
+            if now - last_report >= report_interval:
+                print(statistics.summary(speedup), file=sys.stderr)
+                last_report = now
+
+    await sink.close()
+    return statistics
+
+
+def create_sink(description: str) -> Sink:
+    # NOTE: `stdout`, `file:PATH`, `tcp:HOST:PORT` or `kafka:BOOTSTRAP_SERVERS/TOPIC`
+    kind, _, target = description.partition(":")
+    match kind:
+        case "stdout":
+            return StreamSink(sys.stdout.buffer)
+        case "file":
+            return StreamSink(open(target, "wb"), close_stream=True)
+        case "tcp":
+            host, _, port = target.rpartition(":")
+            return SocketSink(host, int(port))
+        case "kafka":
+            # Optional dependency, only needed for this sink
+            from kafka import KafkaProducer
+
+            servers, _, topic = target.partition("/")
+            return KafkaSink(KafkaProducer(bootstrap_servers=servers), topic)
+        case _:
+            raise ValueError(f"Unknown sink {description}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="replay senML events paced by their timestamps."
+    )
+    parser.add_argument(
+        "source_file",
+        help="Scenario file to replay, or the payload rows for --scenario",
+    )
+    parser.add_argument(
+        "--scenario",
+        choices=list(SCENARIOS),
+        help="Sample the timestamps from this scenario instead of reading them",
+    )
+    parser.add_argument(
+        "--duration", type=float, default=15, help="Scenario duration in minutes"
+    )
+    parser.add_argument(
+        "--rows", type=int, default=None, help="Number of events of the scenario"
+    )
+    parser.add_argument(
+        "--speedup", type=float, default=1.0, help="Replay this many times faster"
+    )
+    parser.add_argument(
+        "--sink",
+        default="stdout",
+        help="stdout, file:PATH, tcp:HOST:PORT or kafka:BOOTSTRAP_SERVERS/TOPIC",
+    )
+    args = parser.parse_args()
+
+    # Keep the progress output of the index out of the replayed events
+    with contextlib.redirect_stdout(sys.stderr):
+        row_index = load_or_build_row_index(args.source_file)
+    if args.scenario is None:
+        chunks = file_events(args.source_file, row_index)
+    else:
+        scenario = get_scenario(args.scenario, args.duration * 60 * 1000)
+        count = row_index.row_count if args.rows is None else args.rows
+        chunks = sampled_events(
+            scenario.timestamp_chunks(count, chunk_size=DEFAULT_CHUNK_ROWS),
+            args.source_file,
+            row_index,
+        )
+
+    statistics = asyncio.run(replay(chunks, create_sink(args.sink), args.speedup))
+    print(statistics.summary(args.speedup), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
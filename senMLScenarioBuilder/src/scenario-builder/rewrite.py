@@ -0,0 +1,272 @@
+import time
+from typing import BinaryIO, Iterable, Optional
+
+import numpy as np
+from numpy.typing import NDArray
+
+from .row_index import DELIMITER, NEWLINE, RowIndex, first_delimiters
+
+DEFAULT_CHUNK_SIZE = 64 * 1024 * 1024
+# int64 has at most 19 decimal digits
+MAX_DIGITS = 19
+POWERS_OF_TEN = 10 ** np.arange(MAX_DIGITS - 1, -1, -1, dtype=np.int64)
+
+
+def digit_counts(values: NDArray) -> NDArray:
+    return np.maximum(np.searchsorted(POWERS_OF_TEN[::-1], values, side="right"), 1)
+
+
+def format_integers(values: NDArray) -> tuple[NDArray, NDArray]:
+    # NOTE: Vectorized `str(int(value))` for non-negative integers. Returns the
+    # ASCII digits of all values back to back and the length of each.
+    values = np.asarray(values, dtype=np.int64)
+    if values.size and values.min() < 0:
+        raise ValueError("Only non-negative timestamps are supported")
+    lengths = digit_counts(values)
+    width = int(lengths.max(initial=1))
+
+    # Shape: (n_values, width), right aligned digits
+    digits = (values[:, None] // POWERS_OF_TEN[-width:]) % 10 + ord("0")
+    used = np.arange(width) >= (width - lengths)[:, None]
+    return digits[used].astype(np.uint8), lengths
+
+
+def alternating_mask(first_lengths: NDArray, second_lengths: NDArray) -> NDArray:
+    # NOTE: Boolean mask of alternating runs, `False` for the first and `True`
+    # for the second run of each pair.
+    run_lengths = np.column_stack((first_lengths, second_lengths)).ravel()
+    pattern = np.tile(np.array([False, True]), len(first_lengths))
+    return np.repeat(pattern, run_lengths)
+
+
+def splice_first_column(
+    lines: NDArray,
+    timestamps: NDArray,
+    line_ends: Optional[NDArray] = None,
+    first_delimiter: Optional[NDArray] = None,
+) -> NDArray:
+    # NOTE: `lines` holds complete `|`-delimited rows, each terminated by a
+    # newline. The first column of every row is replaced by the timestamp, the
+    # rest of the row is copied byte for byte. Known row offsets, e.g. from a
+    # `RowIndex`, skip the scans.
+    if line_ends is None:
+        line_ends = np.flatnonzero(lines == NEWLINE)
+    line_starts = np.concatenate(([0], line_ends[:-1] + 1))
+    if first_delimiter is None:
+        first_delimiter = first_delimiters(
+            line_ends, np.flatnonzero(lines == DELIMITER), 0
+        )
+    rest_lengths = line_ends + 1 - first_delimiter
+
+    digits, digit_lengths = format_integers(timestamps)
+    rest_in_output = alternating_mask(digit_lengths, rest_lengths)
+    output = np.empty(len(rest_in_output), dtype=np.uint8)
+    output[~rest_in_output] = digits
+    output[rest_in_output] = lines[
+        alternating_mask(first_delimiter - line_starts, rest_lengths)
+    ]
+    return output
+
+
+class ProgressReporter:
+    # NOTE: Prints at most once per `interval` seconds instead of once per row.
+    def __init__(self, interval: float = 1.0):
+        self.interval = interval
+        self._last = time.monotonic()
+
+    def update(self, rows: int, force: bool = False):
+        now = time.monotonic()
+        if force or now - self._last >= self.interval:
+            print(f"rows processed: {rows}", end="\r", flush=True)
+            self._last = now
+
+
+def rewrite_first_column(
+    input_file: str,
+    output_file: str,
+    timestamps: NDArray,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    progress: Optional[ProgressReporter] = None,
+    row_index: Optional[RowIndex] = None,
+) -> int:
+    # NOTE: Replaces the first column of the first `len(timestamps)` data rows
+    # and drops the remaining rows. The file is processed in large byte chunks,
+    # only rows split across two chunks are carried over to the next one.
+    progress = progress or ProgressReporter()
+    timestamps = np.asarray(timestamps).astype(np.int64)
+    if row_index is not None:
+        return rewrite_indexed(
+            input_file, output_file, timestamps, row_index, chunk_size, progress
+        )
+    rows_written = 0
+
+    with (
+        open(input_file, "rb", buffering=0) as infile,
+        open(output_file, "wb", buffering=chunk_size) as outfile,
+    ):
+        header_written = False
+        carry = b""
+        while not header_written or rows_written < len(timestamps):
+            chunk = infile.read(chunk_size)
+            at_end = not chunk
+            data = carry + chunk
+            if at_end:
+                if not data:
+                    break
+                if not data.endswith(b"\n"):
+                    data += b"\n"
+                complete = len(data)
+            else:
+                complete = data.rfind(b"\n") + 1
+                if complete == 0:
+                    carry = data
+                    continue
+            carry = data[complete:]
+            lines = np.frombuffer(data, dtype=np.uint8, count=complete)
+
+            if not header_written:
+                header_end = int(np.argmax(lines == NEWLINE)) + 1
+                outfile.write(lines[:header_end])
+                lines = lines[header_end:]
+                header_written = True
+
+            line_ends = np.flatnonzero(lines == NEWLINE)
+            row_count = min(len(line_ends), len(timestamps) - rows_written)
+            if row_count:
+                line_ends = line_ends[:row_count]
+                lines = lines[: line_ends[-1] + 1]
+                outfile.write(
+                    splice_first_column(
+                        lines,
+                        timestamps[rows_written : rows_written + row_count],
+                        line_ends,
+                    )
+                )
+            rows_written += row_count
+            progress.update(rows_written)
+            if at_end:
+                break
+
+    progress.update(rows_written, force=True)
+    print()
+    return rows_written
+
+
+def rest_size(row_index: RowIndex, first_row: int, rows: int) -> int:
+    # NOTE: Bytes after the first column of the output rows
+    # `first_row, ..., first_row + rows`, including the newlines. Rows are
+    # reused cyclically like in `rewrite_rows`.
+    rest_lengths = row_index.line_ends + 1 - row_index.first_column_ends
+    rest_prefix = np.concatenate(([0], np.cumsum(rest_lengths)))
+
+    def rest_until(row: int) -> int:
+        cycles, row = divmod(row, row_index.row_count)
+        return cycles * int(rest_prefix[-1]) + int(rest_prefix[row])
+
+    return rest_until(first_row + rows) - rest_until(first_row)
+
+
+def rewritten_size(timestamps: NDArray, row_index: RowIndex, first_row: int = 0) -> int:
+    # Bytes written by `rewrite_rows` for these timestamps, without the header
+    timestamps = np.asarray(timestamps).astype(np.int64)
+    return int(digit_counts(timestamps).sum()) + rest_size(
+        row_index, first_row, len(timestamps)
+    )
+
+
+def power_positions(chunks: Iterable[NDArray]) -> NDArray:
+    # NOTE: Number of timestamps below 10, 100, ..., 10^18 of a sorted sample
+    # given in chunks. Together they determine the digits of every row range
+    # without holding the timestamps, see `digit_total`.
+    positions = np.zeros(MAX_DIGITS - 1, dtype=np.int64)
+    for chunk in chunks:
+        positions += np.searchsorted(
+            np.asarray(chunk).astype(np.int64), POWERS_OF_TEN[-2::-1]
+        )
+    return positions
+
+
+def digit_total(positions: NDArray, first: int, last: int) -> int:
+    # Digits of the sorted timestamps `first, ..., last - 1`, every timestamp
+    # at or above 10^k has one more digit
+    at_or_above = last - np.clip(positions, first, last)
+    return int(last - first + at_or_above.sum())
+
+
+def rewrite_rows(
+    infile: BinaryIO,
+    outfile: BinaryIO,
+    timestamps: NDArray,
+    row_index: RowIndex,
+    first_row: int = 0,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    progress: Optional[ProgressReporter] = None,
+) -> int:
+    # NOTE: Writes the output rows `first_row, ..., first_row + len(timestamps)`
+    # to the current position of `outfile`. Output row `i` takes the input row
+    # `i % row_count`, so scenarios can contain more events than the input has
+    # rows. The chunks are cut at row boundaries from the index, no byte has
+    # to be scanned.
+    timestamps = np.asarray(timestamps).astype(np.int64)
+    input_rows = row_index.row_count
+    if input_rows == 0 and len(timestamps):
+        raise ValueError("The input file has no data rows")
+    row_starts = row_index.row_starts
+    line_ends = row_index.line_ends
+
+    written = 0
+    while written < len(timestamps):
+        first = (first_row + written) % input_rows
+        start = int(row_starts[first])
+        last = int(np.searchsorted(line_ends, start + chunk_size, side="right"))
+        last = min(max(last, first + 1), input_rows, first + len(timestamps) - written)
+        end = int(line_ends[last - 1])
+
+        infile.seek(start)
+        data = infile.read(end + 1 - start)
+        if len(data) == end - start:
+            # Last row without a trailing newline
+            data += b"\n"
+        outfile.write(
+            splice_first_column(
+                np.frombuffer(data, dtype=np.uint8),
+                timestamps[written : written + last - first],
+                line_ends[first:last] - start,
+                row_index.first_column_ends[first:last] - start,
+            )
+        )
+        written += last - first
+        if progress is not None:
+            progress.update(written)
+    return written
+
+
+def write_header(infile: BinaryIO, outfile: BinaryIO, row_index: RowIndex):
+    infile.seek(0)
+    header = infile.read(row_index.header_end)
+    outfile.write(header if header.endswith(b"\n") else header + b"\n")
+
+
+def rewrite_indexed(
+    input_file: str,
+    output_file: str,
+    timestamps: NDArray,
+    row_index: RowIndex,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    progress: Optional[ProgressReporter] = None,
+) -> int:
+    # NOTE: Unlike the scanning path, all timestamps are written and the input
+    # rows are reused when there are more timestamps than rows.
+    progress = progress or ProgressReporter()
+    with (
+        open(input_file, "rb", buffering=0) as infile,
+        open(output_file, "wb", buffering=chunk_size) as outfile,
+    ):
+        write_header(infile, outfile, row_index)
+        row_count = rewrite_rows(
+            infile, outfile, timestamps, row_index, 0, chunk_size, progress
+        )
+
+    progress.update(row_count, force=True)
+    print()
+    return row_count
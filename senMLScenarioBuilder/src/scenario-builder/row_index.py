@@ -0,0 +1,199 @@
+import mmap
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+from numpy.typing import NDArray
+
+NEWLINE = ord("\n")
+DELIMITER = ord("|")
+# Bump when the layout of the sidecar file changes
+ROW_INDEX_VERSION = 1
+SCAN_BLOCK_SIZE = 64 * 1024 * 1024
+
+
+@dataclass
+class RowIndex:
+    # NOTE: Byte offsets of the data rows of a senML file. Row `i` spans
+    # `[row_starts[i], line_ends[i]]` including its newline, its first column
+    # spans `[row_starts[i], first_column_ends[i])`. A last row without a
+    # trailing newline has `line_ends[i] == file_size`.
+    header_end: int
+    line_ends: NDArray
+    first_column_ends: NDArray
+    file_size: int
+    modified_ns: int
+
+    @property
+    def row_count(self) -> int:
+        return len(self.line_ends)
+
+    @property
+    def row_starts(self) -> NDArray:
+        return np.concatenate(([self.header_end], self.line_ends[:-1] + 1))
+
+    def matches(self, path: str) -> bool:
+        stat = os.stat(path)
+        return stat.st_size == self.file_size and stat.st_mtime_ns == self.modified_ns
+
+    def save(self, path: str):
+        # NOTE: `np.savez` appends `.npz` to names without it, write to the exact
+        # path through the file object instead.
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                version=ROW_INDEX_VERSION,
+                header_end=self.header_end,
+                line_ends=self.line_ends,
+                first_column_ends=self.first_column_ends,
+                file_size=self.file_size,
+                modified_ns=self.modified_ns,
+            )
+
+    @classmethod
+    def load(cls, path: str) -> "RowIndex":
+        with np.load(path) as data:
+            if int(data["version"]) != ROW_INDEX_VERSION:
+                raise ValueError(
+                    f"Expected row index version {ROW_INDEX_VERSION}, got {int(data['version'])}"
+                )
+            return cls(
+                header_end=int(data["header_end"]),
+                line_ends=data["line_ends"],
+                first_column_ends=data["first_column_ends"],
+                file_size=int(data["file_size"]),
+                modified_ns=int(data["modified_ns"]),
+            )
+
+
+def sidecar_path(path: str) -> str:
+    return f"{path}.rowindex.npz"
+
+
+def sidecar_matches(path: str) -> bool:
+    # NOTE: Whether the cached index of `path` is current. Only the version,
+    # size and time stamp members of the sidecar are read, not the offsets.
+    index_path = sidecar_path(path)
+    try:
+        with np.load(index_path) as data:
+            if int(data["version"]) != ROW_INDEX_VERSION:
+                return False
+            stat = os.stat(path)
+            return (
+                int(data["file_size"]) == stat.st_size
+                and int(data["modified_ns"]) == stat.st_mtime_ns
+            )
+    except (OSError, EOFError, ValueError, KeyError):
+        return False
+
+
+def first_delimiters(
+    line_ends: NDArray,
+    delimiters: NDArray,
+    first_row_start: int,
+    first_row_delimiter: Optional[int] = None,
+) -> NDArray:
+    # NOTE: Offset of the first delimiter of each row ending at `line_ends`, or
+    # the line end for rows with a single column. The first row starts at
+    # `first_row_start`, its delimiter may already be known from an earlier block.
+    row_starts = np.concatenate(([first_row_start], line_ends[:-1] + 1))
+    result = line_ends.copy()
+    if len(delimiters):
+        candidates = delimiters[
+            np.minimum(np.searchsorted(delimiters, row_starts), len(delimiters) - 1)
+        ]
+        inside = (candidates >= row_starts) & (candidates < line_ends)
+        result[inside] = candidates[inside]
+    if first_row_delimiter is not None:
+        result[0] = first_row_delimiter
+    return result
+
+
+def build_row_index(path: str, block_size: int = SCAN_BLOCK_SIZE) -> RowIndex:
+    # NOTE: Single pass over the memory mapped file in blocks, so the temporary
+    # comparison arrays stay bounded for multi-GB inputs. The first delimiter of
+    # a row can lie in a later block than its start, such rows stay pending
+    # until a delimiter or their newline is found.
+    stat = os.stat(path)
+    file_size = stat.st_size
+    line_end_blocks = []
+    first_column_end_blocks = []
+    header_end: Optional[int] = None
+    pending_start: Optional[int] = None
+    pending_delimiter: Optional[int] = None
+
+    with open(path, "rb") as f:
+        if file_size == 0:
+            raise ValueError(f"{path} is empty")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            data = np.frombuffer(mapped, dtype=np.uint8)
+            for block_start in range(0, file_size, block_size):
+                block = data[block_start : block_start + block_size]
+                line_ends = np.flatnonzero(block == NEWLINE) + block_start
+                delimiters = np.flatnonzero(block == DELIMITER) + block_start
+
+                if header_end is None:
+                    if not len(line_ends):
+                        continue
+                    header_end = int(line_ends[0]) + 1
+                    line_ends = line_ends[1:]
+                    pending_start = header_end
+                    delimiters = delimiters[delimiters >= header_end]
+
+                if len(line_ends):
+                    line_end_blocks.append(line_ends)
+                    first_column_end_blocks.append(
+                        first_delimiters(
+                            line_ends, delimiters, pending_start, pending_delimiter
+                        )
+                    )
+                    pending_start = int(line_ends[-1]) + 1
+                    pending_delimiter = None
+                if pending_delimiter is None:
+                    open_delimiters = delimiters[delimiters >= pending_start]
+                    if len(open_delimiters):
+                        pending_delimiter = int(open_delimiters[0])
+            del data, block
+
+    if header_end is None:
+        # NOTE: A header without a trailing newline and no data rows
+        header_end = file_size
+    elif pending_start < file_size:
+        # Last row without a trailing newline
+        line_end_blocks.append(np.array([file_size]))
+        first_column_end_blocks.append(
+            np.array([file_size if pending_delimiter is None else pending_delimiter])
+        )
+
+    return RowIndex(
+        header_end=header_end,
+        line_ends=np.concatenate(line_end_blocks or [np.empty(0)]).astype(np.int64),
+        first_column_ends=np.concatenate(
+            first_column_end_blocks or [np.empty(0)]
+        ).astype(np.int64),
+        file_size=file_size,
+        modified_ns=stat.st_mtime_ns,
+    )
+
+
+def load_or_build_row_index(path: str) -> RowIndex:
+    # NOTE: The index is cached next to the input file and rebuilt whenever the
+    # size or modification time of the input changed.
+    index_path = sidecar_path(path)
+    if os.path.exists(index_path):
+        try:
+            row_index = RowIndex.load(index_path)
+            if row_index.matches(path):
+                print(f"Using row index {index_path}")
+                return row_index
+        except (OSError, EOFError, ValueError, KeyError) as e:
+            print(f"Ignoring unreadable row index {index_path}: {e}")
+
+    row_index = build_row_index(path)
+    try:
+        row_index.save(index_path)
+        print(f"Saved row index at {index_path}")
+    except OSError as e:
+        print(f"Could not save row index at {index_path}: {e}")
+    return row_index
@@ -0,0 +1,216 @@
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, Optional
+
+import numpy as np
+from numpy.typing import NDArray
+
+# Bump when the shapes or the table layout change, invalidates cached tables
+SAMPLER_VERSION = 1
+TABLE_SIZE = 2**16 + 1
+GRID_POINTS = 20001
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+
+def default_cache_dir() -> str:
+    return os.environ.get(
+        "SCENARIO_BUILDER_CACHE",
+        os.path.join(os.path.expanduser("~"), ".cache", "scenario-builder"),
+    )
+
+
+def linear_shape(x: NDArray, duration_ms: float) -> NDArray:
+    # Linear rise, plateau and linear fall, each ramp takes a sixth
+    t1 = duration_ms / 6
+    t2 = duration_ms - t1
+    return np.clip(np.minimum(x / t1, (duration_ms - x) / (duration_ms - t2)), 0, 1)
+
+
+def gaussian_shape(x: NDArray, duration_ms: float) -> NDArray:
+    # Normal distribution truncated to the scenario, sigma 6th rule
+    mean = duration_ms / 2
+    std_dev = duration_ms / 6
+    return np.exp(-0.5 * ((x - mean) / std_dev) ** 2)
+
+
+def exponential_shape(x: NDArray, duration_ms: float) -> NDArray:
+    # Exponential rise, plateau at the peak and exponential decay
+    t1 = duration_ms / 3
+    t2 = duration_ms - t1
+    tau_rise = t1 / 3.0
+    tau_fall = (duration_ms - t2) / 3.0
+    peak = np.exp(t1 / tau_rise) - 1.0
+    rise = np.exp(np.minimum(x, t1) / tau_rise) - 1.0
+    fall = peak * np.exp(-np.maximum(x - t2, 0) / tau_fall)
+    return np.where(x <= t1, rise, np.where(x <= t2, peak, fall))
+
+
+SHAPES: Dict[str, Callable[[NDArray, float], NDArray]] = {
+    "LINEAR": linear_shape,
+    "GAUSSIAN": gaussian_shape,
+    "EXPONENTIAL": exponential_shape,
+}
+
+
+def sorted_uniform_chunks(
+    count: int, rng: np.random.Generator, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator[NDArray]:
+    # NOTE: Order statistics of `count` uniform samples in ascending order,
+    # without sorting and without holding all of them. With E_j ~ Exp(1),
+    #   1 - U_(k) = exp(-sum_{j <= k} E_j / (count - j + 1))
+    # so every chunk only needs the running sum of the previous ones.
+    log_survival = 0.0
+    for first in range(0, count, chunk_size):
+        size = min(chunk_size, count - first)
+        remaining = count - first - np.arange(size, dtype=np.float64)
+        log_w = log_survival - np.cumsum(rng.standard_exponential(size) / remaining)
+        log_survival = float(log_w[-1])
+        yield -np.expm1(log_w)
+
+
+def new_seed() -> int:
+    # Fresh entropy for the seeded samplers
+    return int(np.random.SeedSequence().entropy)
+
+
+def sorted_uniform_blocks(
+    count: int,
+    seed: int,
+    first: int = 0,
+    last: Optional[int] = None,
+    block_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterator[NDArray]:
+    # NOTE: Order statistics `first, ..., last - 1` of the same `count` uniform
+    # samples for any range, so processes can each generate their own rows of
+    # one sorted sample. The order statistics at the ends of the blocks of
+    # `block_size` are drawn first, with the survival at the end of block i
+    #   1 - U_(m_i) = (1 - U_(m_{i-1})) * W_i,  W_i ~ Beta(count - m_i + 1, m_i - m_{i-1})
+    # Every block then fills its interior with sorted uniforms between its
+    # ends from a generator of its own. A range only generates its blocks.
+    last = count if last is None else last
+    if not 0 <= first <= last <= count:
+        raise ValueError(f"Invalid range [{first}, {last}) of {count} samples")
+    if first == last:
+        return
+    block_ends = np.minimum(
+        np.arange(1, (count - 1) // block_size + 2) * block_size, count
+    )
+    block_starts = np.concatenate(([0], block_ends[:-1]))
+    ends_rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(0,)))
+    log_survival = np.cumsum(
+        np.log(ends_rng.beta(count - block_ends + 1, block_ends - block_starts))
+    )
+    lower = -np.expm1(np.concatenate(([0.0], log_survival[:-1])))
+    upper = -np.expm1(log_survival)
+
+    for block in range(first // block_size, (last - 1) // block_size + 1):
+        start = int(block_starts[block])
+        size = int(block_ends[block]) - start
+        rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(1, block)))
+        interior = next(sorted_uniform_chunks(size - 1, rng, size), np.empty(0))
+        samples = np.append(
+            lower[block] + (upper[block] - lower[block]) * interior, upper[block]
+        )
+        yield samples[max(first - start, 0) : last - start]
+
+
+@dataclass
+class InverseCDFTable:
+    # NOTE: The inverse CDF sampled at `TABLE_SIZE` equidistant quantiles.
+    # Evaluating it is an index computation plus a linear interpolation, no
+    # search over the CDF is needed.
+    values: NDArray
+
+    @classmethod
+    def from_pdf(
+        cls, x: NDArray, pdf: NDArray, size: int = TABLE_SIZE
+    ) -> "InverseCDFTable":
+        # Cumulative trapezoidal integration of the unnormalized PDF
+        cdf = np.concatenate(([0.0], np.cumsum((pdf[1:] + pdf[:-1]) / 2 * np.diff(x))))
+        if cdf[-1] <= 0:
+            raise ValueError("PDF area is non-positive; check parameters.")
+        cdf /= cdf[-1]
+        return cls(np.interp(np.linspace(0, 1, size), cdf, x))
+
+    def __call__(self, u: NDArray) -> NDArray:
+        position = np.asarray(u) * (len(self.values) - 1)
+        index = np.minimum(position.astype(np.int64), len(self.values) - 2)
+        lower = self.values[index]
+        return lower + (position - index) * (self.values[index + 1] - lower)
+
+    def sample(self, count: int, rng: Optional[np.random.Generator] = None) -> NDArray:
+        rng = rng or np.random.default_rng()
+        return self(rng.random(count))
+
+    def sorted_chunks(
+        self,
+        count: int,
+        seed: Optional[int] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        first: int = 0,
+        last: Optional[int] = None,
+    ) -> Iterator[NDArray]:
+        # NOTE: Samples `first, ..., last - 1` (default all) of a sorted sample
+        # of `count`, see `sorted_uniform_blocks`. The inverse CDF is
+        # monotonic, sorted uniforms give sorted samples.
+        seed = new_seed() if seed is None else seed
+        for u in sorted_uniform_blocks(count, seed, first, last, chunk_size):
+            yield self(u)
+
+    def sample_sorted(self, count: int, seed: Optional[int] = None) -> NDArray:
+        samples = np.empty(count)
+        first = 0
+        for chunk in self.sorted_chunks(count, seed):
+            samples[first : first + len(chunk)] = chunk
+            first += len(chunk)
+        return samples
+
+    def save(self, path: str):
+        # NOTE: Written to a temporary file first so concurrent runs never read
+        # a partial table.
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, "wb") as f:
+            np.save(f, self.values)
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "InverseCDFTable":
+        return cls(np.load(path))
+
+
+def cached_table(
+    name: str,
+    description: Dict,
+    build: Callable[[], InverseCDFTable],
+    cache_dir: Optional[str] = None,
+) -> InverseCDFTable:
+    # NOTE: Tables are cached on disk, keyed by everything that determines
+    # them. Failing to write the cache only costs the rebuild.
+    cache_dir = cache_dir or default_cache_dir()
+    key = hashlib.sha256(
+        json.dumps(
+            {
+                "version": SAMPLER_VERSION,
+                "grid_points": GRID_POINTS,
+                "table_size": TABLE_SIZE,
+                **description,
+            },
+            sort_keys=True,
+        ).encode()
+    ).hexdigest()[:16]
+    path = os.path.join(cache_dir, f"{name}_{key}.npy")
+    if os.path.exists(path):
+        try:
+            return InverseCDFTable.load(path)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable sampler table {path}: {e}")
+
+    table = build()
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        table.save(path)
+    except OSError as e:
+        print(f"Could not cache sampler table at {path}: {e}")
+    return table
@@ -0,0 +1,289 @@
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+from numpy.typing import NDArray
+
+from .samplers import DEFAULT_CHUNK_SIZE, SHAPES, InverseCDFTable, cached_table
+
+# NOTE: Resolution of the grid the rate functions are tabulated on. Long
+# scenarios get proportionally more points, so short bursts stay resolved.
+GRID_STEP_MS = 50.0
+MIN_GRID_POINTS = 20001
+
+
+class RateFunction(ABC):
+    # NOTE: Event rate over `[0, duration_ms)` in events per second. Timestamps
+    # are distributed proportionally to the rate, the absolute level only
+    # matters when the number of events is derived from the rate itself.
+    # Rate functions are immutable and compose with `+`, `*` and the helpers
+    # below. `repr` describes the whole composition and keys the cached tables.
+    duration_ms: float
+
+    @abstractmethod
+    def rate(self, t: NDArray) -> NDArray: ...
+
+    def __add__(self, other: "RateFunction") -> "RateFunction":
+        return Sum([self, other])
+
+    def __mul__(self, factor: float) -> "RateFunction":
+        return Scaled(self, factor)
+
+    __rmul__ = __mul__
+
+    def then(self, *others: "RateFunction") -> "RateFunction":
+        return Concatenation([self, *others])
+
+    def repeat(self, times: int) -> "RateFunction":
+        return Repetition(self, times)
+
+    def with_burst(
+        self, at_ms: float, duration_ms: float, rate: float
+    ) -> "RateFunction":
+        return self + Shifted(Constant(duration_ms, rate), at_ms)
+
+    def expected_events(self) -> float:
+        t, rate = self.tabulate()
+        return float(np.sum((rate[1:] + rate[:-1]) / 2 * np.diff(t)) / 1000)
+
+    def tabulate(self) -> tuple[NDArray, NDArray]:
+        grid_points = max(MIN_GRID_POINTS, int(self.duration_ms / GRID_STEP_MS) + 1)
+        t = np.linspace(0, self.duration_ms, grid_points)
+        return t, self.rate(t)
+
+
+class Shape(RateFunction):
+    # One of the shapes of `samplers.SHAPES` with its peak at `peak_rate`
+    def __init__(self, name: str, duration_ms: float, peak_rate: float = 1.0):
+        self.name = name
+        self.duration_ms = duration_ms
+        self.peak_rate = peak_rate
+        t = np.linspace(0, duration_ms, MIN_GRID_POINTS)
+        self._scale = peak_rate / np.max(SHAPES[name](t, duration_ms))
+
+    def rate(self, t: NDArray) -> NDArray:
+        inside = (t >= 0) & (t <= self.duration_ms)
+        return np.where(inside, SHAPES[self.name](t, self.duration_ms) * self._scale, 0)
+
+    def __repr__(self) -> str:
+        return f"Shape({self.name!r}, {self.duration_ms!r}, {self.peak_rate!r})"
+
+
+class Constant(RateFunction):
+    def __init__(self, duration_ms: float, rate: float = 1.0):
+        self.duration_ms = duration_ms
+        self.level = rate
+
+    def rate(self, t: NDArray) -> NDArray:
+        return np.where((t >= 0) & (t <= self.duration_ms), self.level, 0.0)
+
+    def __repr__(self) -> str:
+        return f"Constant({self.duration_ms!r}, {self.level!r})"
+
+
+class Ramp(RateFunction):
+    # Linear change of the rate from `start_rate` to `end_rate`
+    def __init__(self, duration_ms: float, start_rate: float, end_rate: float):
+        self.duration_ms = duration_ms
+        self.start_rate = start_rate
+        self.end_rate = end_rate
+
+    def rate(self, t: NDArray) -> NDArray:
+        fraction = t / self.duration_ms
+        ramp = self.start_rate + (self.end_rate - self.start_rate) * fraction
+        return np.where((t >= 0) & (t <= self.duration_ms), ramp, 0.0)
+
+    def __repr__(self) -> str:
+        return f"Ramp({self.duration_ms!r}, {self.start_rate!r}, {self.end_rate!r})"
+
+
+class Scaled(RateFunction):
+    def __init__(self, part: RateFunction, factor: float):
+        self.part = part
+        self.factor = factor
+        self.duration_ms = part.duration_ms
+
+    def rate(self, t: NDArray) -> NDArray:
+        return self.part.rate(t) * self.factor
+
+    def __repr__(self) -> str:
+        return f"Scaled({self.part!r}, {self.factor!r})"
+
+
+class Shifted(RateFunction):
+    # `part` starting at `offset_ms`, zero before
+    def __init__(self, part: RateFunction, offset_ms: float):
+        self.part = part
+        self.offset_ms = offset_ms
+        self.duration_ms = offset_ms + part.duration_ms
+
+    def rate(self, t: NDArray) -> NDArray:
+        return self.part.rate(np.asarray(t) - self.offset_ms)
+
+    def __repr__(self) -> str:
+        return f"Shifted({self.part!r}, {self.offset_ms!r})"
+
+
+class Sum(RateFunction):
+    # Overlay of the parts, lasts as long as the longest one
+    def __init__(self, parts: List[RateFunction]):
+        self.parts = parts
+        self.duration_ms = max(part.duration_ms for part in parts)
+
+    def rate(self, t: NDArray) -> NDArray:
+        return sum(part.rate(t) for part in self.parts)
+
+    def __repr__(self) -> str:
+        return f"Sum({self.parts!r})"
+
+
+class Concatenation(RateFunction):
+    # The parts one after another
+    def __init__(self, parts: List[RateFunction]):
+        self.parts = parts
+        self._starts = np.cumsum([0.0] + [part.duration_ms for part in parts])
+        self.duration_ms = float(self._starts[-1])
+
+    def rate(self, t: NDArray) -> NDArray:
+        t = np.asarray(t, dtype=float)
+        # Index of the part each point falls into, the end belongs to the last
+        part_index = np.clip(
+            np.searchsorted(self._starts, t, side="right") - 1, 0, len(self.parts) - 1
+        )
+        result = np.zeros_like(t)
+        for i, part in enumerate(self.parts):
+            selected = part_index == i
+            if selected.any():
+                result[selected] = part.rate(t[selected] - self._starts[i])
+        return np.where((t >= 0) & (t <= self.duration_ms), result, 0.0)
+
+    def __repr__(self) -> str:
+        return f"Concatenation({self.parts!r})"
+
+
+class Repetition(RateFunction):
+    # `part` repeated `times` times, e.g. a daily cycle over several days
+    def __init__(self, part: RateFunction, times: int):
+        self.part = part
+        self.times = times
+        self.duration_ms = part.duration_ms * times
+
+    def rate(self, t: NDArray) -> NDArray:
+        t = np.asarray(t, dtype=float)
+        local = np.where(
+            t >= self.duration_ms, self.part.duration_ms, t % self.part.duration_ms
+        )
+        return np.where((t >= 0) & (t <= self.duration_ms), self.part.rate(local), 0.0)
+
+    def __repr__(self) -> str:
+        return f"Repetition({self.part!r}, {self.times!r})"
+
+
+class Scenario:
+    # NOTE: Drives both the bulk generation of all timestamps and the lazy,
+    # time ordered generation from the same rate function.
+    def __init__(self, name: str, rate_function: RateFunction):
+        self.name = name
+        self.rate_function = rate_function
+        self._table: Optional[InverseCDFTable] = None
+
+    @property
+    def duration_ms(self) -> float:
+        return self.rate_function.duration_ms
+
+    def table(self, cache_dir: Optional[str] = None) -> InverseCDFTable:
+        if self._table is None:
+            self._table = cached_table(
+                "scenario",
+                {
+                    "rate_function": repr(self.rate_function),
+                    "grid_step_ms": GRID_STEP_MS,
+                },
+                lambda: InverseCDFTable.from_pdf(*self.rate_function.tabulate()),
+                cache_dir,
+            )
+        return self._table
+
+    def event_count(self, count: Optional[int] = None) -> int:
+        return round(self.rate_function.expected_events()) if count is None else count
+
+    def timestamp_chunks(
+        self,
+        count: Optional[int] = None,
+        seed: Optional[int] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        first: int = 0,
+        last: Optional[int] = None,
+    ) -> Iterator[NDArray]:
+        # NOTE: Timestamps `first, ..., last - 1` of the sorted scenario. With
+        # the same `seed`, `count` and `chunk_size` every range yields the
+        # same timestamps, e.g. in the processes of a sharded rewrite.
+        return self.table().sorted_chunks(
+            self.event_count(count), seed, chunk_size, first, last
+        )
+
+    def timestamps(
+        self,
+        count: Optional[int] = None,
+        seed: Optional[int] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> Iterator[float]:
+        # Lazily yields single timestamps in time order
+        for chunk in self.timestamp_chunks(count, seed, chunk_size):
+            yield from chunk.tolist()
+
+    def sample(
+        self, count: Optional[int] = None, seed: Optional[int] = None
+    ) -> NDArray:
+        # All timestamps at once, sorted
+        return self.table().sample_sorted(self.event_count(count), seed)
+
+    def __getstate__(self) -> Dict:
+        # NOTE: Other processes load the table from the cache instead of
+        # receiving it pickled
+        return {**self.__dict__, "_table": None}
+
+
+SCENARIOS: Dict[str, Callable[[float], RateFunction]] = {}
+
+
+def register_scenario(name: str):
+    # NOTE: Registers a factory that builds the rate function of a scenario for
+    # a given duration in ms.
+    def decorator(factory: Callable[[float], RateFunction]):
+        SCENARIOS[name] = factory
+        return factory
+
+    return decorator
+
+
+def get_scenario(name: str, duration_ms: float) -> Scenario:
+    if name not in SCENARIOS:
+        raise ValueError(
+            f"Unknown scenario {name}, expected one of {', '.join(SCENARIOS)}"
+        )
+    return Scenario(name, SCENARIOS[name](duration_ms))
+
+
+for shape_name in SHAPES:
+    register_scenario(shape_name)(
+        lambda duration_ms, shape_name=shape_name: Shape(shape_name, duration_ms)
+    )
+
+
+@register_scenario("DIURNAL")
+def diurnal(duration_ms: float) -> RateFunction:
+    # Four compressed days, each with a quiet night and a Gaussian day peak
+    day_ms = duration_ms / 4
+    day = Constant(day_ms, 0.1) + Shape("GAUSSIAN", day_ms)
+    return day.repeat(4)
+
+
+@register_scenario("BURST")
+def burst(duration_ms: float) -> RateFunction:
+    # Constant base load with short bursts at five times the base rate
+    base = Constant(duration_ms, 1.0)
+    burst_ms = duration_ms / 30
+    for at in (0.25, 0.5, 0.75):
+        base = base.with_burst(at * duration_ms, burst_ms, 4.0)
+    return base
@@ -0,0 +1,154 @@
+import multiprocessing
+import os
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+import numpy as np
+from numpy.typing import NDArray
+
+from .rewrite import (
+    DEFAULT_CHUNK_SIZE,
+    digit_total,
+    power_positions,
+    rest_size,
+    rewrite_rows,
+    write_header,
+)
+from .row_index import RowIndex, sidecar_matches, sidecar_path
+from .scenarios import Scenario
+
+
+@dataclass
+class ShardTask:
+    # NOTE: Only the row range, the seed and the path of the row index are
+    # sent to the worker. It generates the timestamps of its rows itself and
+    # loads the index from disk.
+    input_file: str
+    output_file: str
+    # Byte offset of the shard in `output_file`, `None` for a separate file
+    # that starts with its own header.
+    offset: Optional[int]
+    first_row: int
+    last_row: int
+    scenario: Scenario
+    count: int
+    seed: int
+    row_index_file: str
+    chunk_size: int
+
+
+def shard_bounds(row_count: int, shards: int) -> NDArray:
+    return np.linspace(0, row_count, shards + 1).astype(np.int64)
+
+
+def shard_file(output_file: str, shard: int) -> str:
+    base, ext = os.path.splitext(output_file)
+    return f"{base}.part-{shard:05d}{ext}"
+
+
+def write_shard_rows(task: ShardTask, infile, outfile, row_index: RowIndex) -> int:
+    row = task.first_row
+    for timestamps in task.scenario.timestamp_chunks(
+        task.count, task.seed, first=task.first_row, last=task.last_row
+    ):
+        row += rewrite_rows(
+            infile, outfile, timestamps, row_index, row, task.chunk_size
+        )
+    return row - task.first_row
+
+
+def rewrite_shard(task: ShardTask, row_index: Optional[RowIndex] = None) -> int:
+    row_index = row_index or RowIndex.load(task.row_index_file)
+    with open(task.input_file, "rb", buffering=0) as infile:
+        if task.offset is None:
+            with open(task.output_file, "wb", buffering=task.chunk_size) as outfile:
+                write_header(infile, outfile, row_index)
+                return write_shard_rows(task, infile, outfile, row_index)
+
+        with open(task.output_file, "r+b", buffering=task.chunk_size) as outfile:
+            outfile.seek(task.offset)
+            return write_shard_rows(task, infile, outfile, row_index)
+
+
+def rewrite_sharded(
+    input_file: str,
+    output_file: str,
+    scenario: Scenario,
+    count: int,
+    seed: int,
+    row_index: RowIndex,
+    shards: int,
+    separate_files: bool = False,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> List[str]:
+    # NOTE: The `count` sorted timestamps of `scenario` are split into `shards`
+    # contiguous row ranges and each range is generated and rewritten by its
+    # own process. The byte size of every shard follows from the row index and
+    # the digits of its timestamps, so all shards write into their final place
+    # of one preallocated output file and no concatenation pass is needed. With
+    # `separate_files` every shard becomes a complete file of its own instead,
+    # which the Beam/Flink file sources can read in parallel. A single shard is
+    # rewritten in this process.
+    bounds = shard_bounds(count, shards)
+    with tempfile.TemporaryDirectory() as temporary_dir:
+        row_index_file = sidecar_path(input_file)
+        if not sidecar_matches(input_file):
+            # NOTE: The cached index could not be written, the workers read a
+            # temporary copy
+            row_index_file = os.path.join(temporary_dir, "rowindex.npz")
+            row_index.save(row_index_file)
+
+        def shard_task(
+            first: int, last: int, output: str, offset: Optional[int]
+        ) -> ShardTask:
+            return ShardTask(
+                input_file,
+                output,
+                offset,
+                int(first),
+                int(last),
+                scenario,
+                count,
+                seed,
+                row_index_file,
+                chunk_size,
+            )
+
+        tasks: List[ShardTask] = []
+        if separate_files or shards == 1:
+            for shard, (first, last) in enumerate(zip(bounds[:-1], bounds[1:])):
+                output = (
+                    shard_file(output_file, shard) if separate_files else output_file
+                )
+                tasks.append(shard_task(first, last, output, None))
+        else:
+            positions = power_positions(scenario.timestamp_chunks(count, seed))
+            with (
+                open(input_file, "rb") as infile,
+                open(output_file, "wb") as outfile,
+            ):
+                write_header(infile, outfile, row_index)
+                offset = outfile.tell()
+                for first, last in zip(bounds[:-1], bounds[1:]):
+                    tasks.append(shard_task(first, last, output_file, offset))
+                    offset += digit_total(positions, first, last)
+                    offset += rest_size(row_index, int(first), int(last - first))
+                outfile.truncate(offset)
+
+        start = time.monotonic()
+        if shards == 1:
+            rows = rewrite_shard(tasks[0], row_index)
+            print(f"{rows} rows done ({time.monotonic() - start:.1f}s)")
+            return [task.output_file for task in tasks]
+
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(shards) as pool:
+            for shard, rows in enumerate(pool.imap(rewrite_shard, tasks)):
+                print(
+                    f"shard {shard + 1}/{shards} done ({rows} rows, "
+                    f"{time.monotonic() - start:.1f}s)"
+                )
+
+    return [task.output_file for task in tasks]
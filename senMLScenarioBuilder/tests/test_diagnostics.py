@@ -0,0 +1,56 @@
+import importlib
+
+import numpy as np
+import pytest
+
+diagnostics = importlib.import_module("scenario-builder.diagnostics")
+
+
+@pytest.mark.parametrize("window_ms", [1000.0, 250.0, 7000.0])
+def test_from_chunks_matches_from_timestamps(window_ms):
+    duration_ms = 60 * 1000
+    rng = np.random.default_rng(0)
+    # Window edges, both ends of the scenario and a sample between them
+    timestamps = np.sort(
+        np.concatenate(
+            [
+                rng.uniform(0, duration_ms, 5000),
+                np.arange(0, duration_ms + 1, window_ms),
+                [0.0, duration_ms],
+            ]
+        )
+    )
+    expected = diagnostics.RateCurve.from_timestamps(timestamps, duration_ms, window_ms)
+    curve = diagnostics.RateCurve.from_chunks(
+        np.array_split(timestamps, 7), duration_ms, window_ms
+    )
+
+    np.testing.assert_array_equal(curve.rates, expected.rates)
+    assert curve.rates.sum() * window_ms / 1000 == pytest.approx(len(timestamps))
+
+
+def test_window_counts_match_masks():
+    timestamps = np.sort(np.random.default_rng(1).uniform(0, 1000, 2000))
+    edges = np.linspace(0, 1000, 11)
+    expected = [
+        np.count_nonzero((timestamps >= low) & (timestamps < high))
+        for low, high in zip(edges[:-1], edges[1:])
+    ]
+    assert diagnostics.window_counts(timestamps, edges).tolist() == expected
+
+
+def test_resample_averages_windows():
+    curve = diagnostics.RateCurve(np.array([1, 3, 5, 7, 9], dtype=np.float32), 500.0)
+    resampled = curve.resample(1000.0)
+    np.testing.assert_array_equal(resampled.rates, [2, 6])
+    with pytest.raises(ValueError):
+        curve.resample(750.0)
+
+
+def test_print_summary_counts_chunks(capsys):
+    duration_ms = 4 * 60 * 1000
+    timestamps = np.arange(0, duration_ms, 100.0)
+    curve = diagnostics.RateCurve.from_timestamps(timestamps, duration_ms)
+    diagnostics.print_summary(np.array_split(timestamps, 5), curve, duration_ms)
+    # 600 events within half a minute of each center
+    assert capsys.readouterr().out.count(": 600\n") == 5
@@ -0,0 +1,206 @@
+import asyncio
+import importlib
+import re
+import sys
+import types
+
+import numpy as np
+import pytest
+
+replay = importlib.import_module("scenario-builder.replay")
+row_index = importlib.import_module("scenario-builder.row_index")
+
+
+class RecordingSink:
+    def __init__(self):
+        self.batches = []
+        self.closed = False
+
+    async def send(self, data: bytes, count: int):
+        self.batches.append((data, count))
+
+    async def close(self):
+        self.closed = True
+
+
+class StubProducer:
+    def __init__(self, **config):
+        self.config = config
+        self.messages = []
+        self.flushed = False
+
+    def send(self, topic, value):
+        self.messages.append((topic, value))
+
+    def flush(self):
+        self.flushed = True
+
+
+def write_rows(path, lines, trailing_newline=True):
+    path.write_bytes(b"\n".join(lines) + (b"\n" if trailing_newline else b""))
+    return str(path)
+
+
+def chunk(timestamps):
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    rows = [f"{int(t)}|event-{i}\n".encode() for i, t in enumerate(timestamps)]
+    offsets = np.concatenate(([0], np.cumsum([len(row) for row in rows])))
+    return replay.EventChunk(timestamps, b"".join(rows), offsets)
+
+
+def test_parse_integers_matches_int():
+    values = [0, 7, 10, 99, 123456789, 10**18, 2**63 - 1]
+    text = "|".join(map(str, values)).encode()
+    data = np.frombuffer(text, dtype=np.uint8)
+    ends = np.array([m.end() for m in re.finditer(rb"\d+", text)])
+    starts = np.array([m.start() for m in re.finditer(rb"\d+", text)])
+    assert replay.parse_integers(data, starts, ends).tolist() == [
+        int(text[start:end]) for start, end in zip(starts, ends)
+    ]
+
+
+@pytest.mark.parametrize("trailing_newline", [True, False])
+def test_file_events_frame_rows(tmp_path, trailing_newline):
+    lines = [b"timestamp|payload"] + [
+        b"%d" % (1000 * row) + (b"" if row % 4 == 1 else b"|row-%d" % row)
+        for row in range(10)
+    ]
+    path = write_rows(tmp_path / "scenario.csv", lines, trailing_newline)
+
+    chunks = list(replay.file_events(path, chunk_rows=3))
+
+    assert [len(chunk.timestamps) for chunk in chunks] == [3, 3, 3, 1]
+    rows = [
+        chunk.data[chunk.offsets[i] : chunk.offsets[i + 1]]
+        for chunk in chunks
+        for i in range(len(chunk.timestamps))
+    ]
+    assert rows == [line + b"\n" for line in lines[1:]]
+    timestamps = np.concatenate([chunk.timestamps for chunk in chunks])
+    np.testing.assert_array_equal(timestamps, 1000 * np.arange(10))
+
+
+@pytest.mark.parametrize("trailing_newline", [True, False])
+def test_sampled_events_reuse_the_payload_rows(tmp_path, trailing_newline):
+    lines = [b"timestamp|payload", b"0|a", b"0|bb", b"0"]
+    path = write_rows(tmp_path / "payload.csv", lines, trailing_newline)
+    timestamps = [np.array([5.7, 10.0, 12.2, 40.0]), np.array([41.0, 99.9])]
+
+    chunks = list(
+        replay.sampled_events(iter(timestamps), path, row_index.build_row_index(path))
+    )
+
+    assert [chunk.timestamps.tolist() for chunk in chunks] == [
+        [5, 10, 12, 40],
+        [41, 99],
+    ]
+    assert [chunk.data for chunk in chunks] == [
+        b"5|a\n10|bb\n12\n40|a\n",
+        b"41|bb\n99\n",
+    ]
+    for chunk in chunks:
+        assert chunk.offsets[-1] == len(chunk.data)
+        assert all(
+            chunk.data[end - 1 : end] == b"\n" for end in chunk.offsets[1:].tolist()
+        )
+
+
+def test_replay_sends_all_events_in_order_and_batches_them():
+    # NOTE: At this speed-up every chunk is due within one batch window
+    chunks = [chunk(np.arange(start, start + 100)) for start in range(0, 1000, 100)]
+    sink = RecordingSink()
+
+    statistics = asyncio.run(replay.replay(iter(chunks), sink, speedup=1e6))
+
+    assert sink.closed
+    assert [count for _, count in sink.batches] == [100] * 10
+    assert b"".join(data for data, _ in sink.batches) == b"".join(
+        c.data for c in chunks
+    )
+    assert statistics.events == 1000
+    assert statistics.batches == 10
+    assert statistics.scenario_span == pytest.approx(0.999)
+
+
+def test_replay_paces_events_and_reports_rates_and_lag():
+    # Three events 0.5 s apart at ten times the speed, 50 ms apart
+    sink = RecordingSink()
+    statistics = asyncio.run(
+        replay.replay(iter([chunk([0, 500, 1000])]), sink, speedup=10)
+    )
+
+    assert [count for _, count in sink.batches] == [1, 1, 1]
+    assert statistics.last_sent - statistics.started >= 0.1
+    assert 0 <= statistics.max_lag < 0.05
+    summary = statistics.summary(10)
+    target, achieved = map(
+        int, re.search(r"target/achieved\): (\d+)/(\d+)", summary).groups()
+    )
+    assert target == 30
+    assert 15 <= achieved <= 30
+    assert "lag ms (mean/p99/max)" in summary
+
+
+def test_socket_sink_delivers_the_rows():
+    async def run():
+        received = []
+
+        async def handle(reader, writer):
+            received.append(await reader.read())
+            writer.close()
+
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        events = chunk([0, 1, 2])
+        await replay.replay(
+            iter([events]), replay.SocketSink("127.0.0.1", port), speedup=1e6
+        )
+        while not received:
+            await asyncio.sleep(0.01)
+        server.close()
+        await server.wait_closed()
+        return events.data, received[0]
+
+    expected, received = asyncio.run(run())
+    assert received == expected
+
+
+def test_create_sink_parses_every_spec(tmp_path, monkeypatch):
+    assert isinstance(replay.create_sink("stdout"), replay.StreamSink)
+
+    path = tmp_path / "events.csv"
+    file_sink = replay.create_sink(f"file:{path}")
+    assert file_sink.close_stream
+    asyncio.run(file_sink.send(b"1|a\n", 1))
+    asyncio.run(file_sink.close())
+    assert path.read_bytes() == b"1|a\n"
+
+    tcp_sink = replay.create_sink("tcp:flink-jobmanager:9999")
+    assert (tcp_sink.host, tcp_sink.port) == ("flink-jobmanager", 9999)
+    assert replay.create_sink("tcp:::1:9999").host == "::1"
+
+    monkeypatch.setitem(
+        sys.modules, "kafka", types.SimpleNamespace(KafkaProducer=StubProducer)
+    )
+    kafka_sink = replay.create_sink("kafka:broker-1:9092,broker-2:9092/senml")
+    assert kafka_sink.topic == "senml"
+    assert kafka_sink.producer.config == {
+        "bootstrap_servers": "broker-1:9092,broker-2:9092"
+    }
+
+    with pytest.raises(ValueError):
+        replay.create_sink("udp:localhost:9999")
+
+
+def test_kafka_sink_sends_one_message_per_row():
+    producer = StubProducer()
+    sink = replay.KafkaSink(producer, "senml")
+
+    asyncio.run(replay.replay(iter([chunk([0, 1, 2])]), sink, speedup=1e6))
+
+    assert producer.messages == [
+        ("senml", b"0|event-0"),
+        ("senml", b"1|event-1"),
+        ("senml", b"2|event-2"),
+    ]
+    assert producer.flushed
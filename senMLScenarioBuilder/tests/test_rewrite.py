@@ -0,0 +1,79 @@
+import importlib
+
+import numpy as np
+import pytest
+
+rewrite = importlib.import_module("scenario-builder.rewrite")
+row_index = importlib.import_module("scenario-builder.row_index")
+
+
+def write_senml(path, rows: int, seed: int = 0, trailing_newline: bool = True):
+    # Rows of different lengths, some without any delimiter
+    rng = np.random.default_rng(seed)
+    lines = ["timestamp|sensor|value"]
+    for row in range(rows):
+        rest = (
+            "" if row % 7 == 3 else f"|sensor-{row}|" + "v" * int(rng.integers(0, 30))
+        )
+        lines.append(f"{rng.integers(0, 10**13)}{rest}")
+    path.write_text("\n".join(lines) + ("\n" if trailing_newline else ""))
+    return lines
+
+
+def naive_rewrite(lines, timestamps) -> bytes:
+    # The row by row rewrite the vectorized splicing replaces
+    output = [lines[0]]
+    for line, timestamp in zip(lines[1:], timestamps):
+        first, delimiter, rest = line.partition("|")
+        output.append(f"{int(timestamp)}{delimiter}{rest}")
+    return ("\n".join(output) + "\n").encode()
+
+
+def test_format_integers_matches_str():
+    values = np.array([0, 7, 10, 99, 100, 123456789, 10**18, 2**63 - 1])
+    digits, lengths = rewrite.format_integers(values)
+    assert digits.tobytes() == "".join(map(str, values.tolist())).encode()
+    assert lengths.tolist() == [len(str(value)) for value in values.tolist()]
+
+
+@pytest.mark.parametrize("trailing_newline", [True, False])
+@pytest.mark.parametrize("chunk_size", [16, 97, 1 << 20])
+def test_splice_matches_naive_rewrite(tmp_path, chunk_size, trailing_newline):
+    input_file = tmp_path / "input.csv"
+    lines = write_senml(input_file, 200, trailing_newline=trailing_newline)
+    timestamps = np.sort(np.random.default_rng(1).uniform(0, 10**7, 150))
+    expected = naive_rewrite(lines, timestamps)
+
+    scanned = tmp_path / "scanned.csv"
+    rows = rewrite.rewrite_first_column(
+        str(input_file), str(scanned), timestamps, chunk_size=chunk_size
+    )
+    assert rows == 150
+    assert scanned.read_bytes() == expected
+
+    indexed = tmp_path / "indexed.csv"
+    rewrite.rewrite_first_column(
+        str(input_file),
+        str(indexed),
+        timestamps,
+        chunk_size=chunk_size,
+        row_index=row_index.build_row_index(str(input_file)),
+    )
+    assert indexed.read_bytes() == expected
+
+
+def test_indexed_rewrite_reuses_rows(tmp_path):
+    input_file = tmp_path / "input.csv"
+    lines = write_senml(input_file, 40)
+    timestamps = np.arange(100) * 1000
+    index = row_index.build_row_index(str(input_file))
+    output_file = tmp_path / "output.csv"
+
+    rewrite.rewrite_first_column(
+        str(input_file), str(output_file), timestamps, chunk_size=64, row_index=index
+    )
+
+    cycled = lines[:1] + [lines[1 + row % 40] for row in range(100)]
+    expected = naive_rewrite(cycled, timestamps)
+    assert output_file.read_bytes() == expected
+    assert len(expected) - index.header_end == rewrite.rewritten_size(timestamps, index)
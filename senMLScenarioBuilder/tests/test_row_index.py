@@ -0,0 +1,64 @@
+import importlib
+import os
+
+import numpy as np
+import pytest
+
+row_index = importlib.import_module("scenario-builder.row_index")
+
+
+def readline_offsets(path):
+    # Line ends and first column ends of the data rows, one `readline` per row
+    line_ends = []
+    first_column_ends = []
+    with open(path, "rb") as f:
+        offset = len(f.readline())
+        while line := f.readline():
+            body = line.rstrip(b"\n")
+            delimiter = body.find(b"|")
+            first_column_ends.append(
+                offset + (len(body) if delimiter < 0 else delimiter)
+            )
+            line_ends.append(
+                offset + len(line) - 1 if line.endswith(b"\n") else offset + len(line)
+            )
+            offset += len(line)
+    return line_ends, first_column_ends
+
+
+@pytest.mark.parametrize("trailing_newline", [True, False])
+@pytest.mark.parametrize("block_size", [5, 64, 1 << 20])
+def test_offsets_match_readline(tmp_path, block_size, trailing_newline):
+    rng = np.random.default_rng(0)
+    # Long first columns put the first delimiter of a row into a later block,
+    # some rows have no delimiter at all
+    lines = [b"timestamp|sensor|value"]
+    for row in range(300):
+        first = b"1" * int(rng.integers(1, 40))
+        rest = b"" if row % 5 == 2 else b"|" + b"x|" * int(rng.integers(0, 4))
+        lines.append(first + rest)
+    path = tmp_path / "input.csv"
+    path.write_bytes(b"\n".join(lines) + (b"\n" if trailing_newline else b""))
+
+    index = row_index.build_row_index(str(path), block_size=block_size)
+    line_ends, first_column_ends = readline_offsets(path)
+
+    assert index.header_end == len(lines[0]) + 1
+    assert index.row_count == 300
+    np.testing.assert_array_equal(index.line_ends, line_ends)
+    np.testing.assert_array_equal(index.first_column_ends, first_column_ends)
+
+
+def test_sidecar_is_reused_until_the_file_changes(tmp_path):
+    path = tmp_path / "input.csv"
+    path.write_bytes(b"timestamp|value\n1|a\n2|b\n")
+    index = row_index.load_or_build_row_index(str(path))
+    assert row_index.sidecar_matches(str(path))
+    np.testing.assert_array_equal(
+        row_index.load_or_build_row_index(str(path)).line_ends, index.line_ends
+    )
+
+    path.write_bytes(b"timestamp|value\n1|a\n2|b\n3|c\n")
+    os.utime(path, ns=(0, index.modified_ns + 1))
+    assert not row_index.sidecar_matches(str(path))
+    assert row_index.load_or_build_row_index(str(path)).row_count == 3
@@ -0,0 +1,91 @@
+import importlib
+import math
+
+import numpy as np
+import pytest
+
+samplers = importlib.import_module("scenario-builder.samplers")
+scenarios = importlib.import_module("scenario-builder.scenarios")
+
+# NOTE: Critical value of the Kolmogorov-Smirnov statistic at a significance
+# of 0.001 is about 1.95 / sqrt(n)
+KS_FACTOR = 1.95
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("SCENARIO_BUILDER_CACHE", str(tmp_path / "cache"))
+
+
+def ks_statistic(sorted_samples, cdf) -> float:
+    n = len(sorted_samples)
+    expected = cdf(sorted_samples)
+    above = np.arange(1, n + 1) / n - expected
+    below = expected - np.arange(n) / n
+    return float(max(above.max(), below.max()))
+
+
+def test_sorted_uniform_blocks_are_uniform_order_statistics():
+    count = 100_000
+    samples = np.concatenate(
+        list(samplers.sorted_uniform_blocks(count, seed=3, block_size=7000))
+    )
+    assert len(samples) == count
+    assert np.all(np.diff(samples) >= 0)
+    assert ks_statistic(samples, lambda u: u) < KS_FACTOR / math.sqrt(count)
+
+
+def test_gaussian_scenario_matches_its_distribution():
+    duration_ms = 15 * 60 * 1000
+    count = 200_000
+    scenario = scenarios.get_scenario("GAUSSIAN", duration_ms)
+    samples = scenario.sample(count, seed=1)
+
+    # Normal distribution truncated to three standard deviations
+    mean, std_dev = duration_ms / 2, duration_ms / 6
+    normal = np.vectorize(lambda x: 0.5 * (1 + math.erf(x / math.sqrt(2))))
+
+    def cdf(x):
+        low, high = normal(-3.0), normal(3.0)
+        return (normal((x - mean) / std_dev) - low) / (high - low)
+
+    assert np.all(np.diff(samples) >= 0)
+    assert ks_statistic(samples, cdf) < KS_FACTOR / math.sqrt(count)
+
+
+@pytest.mark.parametrize("first, last", [(0, 2500), (700, 2100), (999, 1001)])
+def test_ranges_are_slices_of_the_full_sample(first, last):
+    scenario = scenarios.get_scenario("BURST", 60 * 1000)
+    full = np.concatenate(list(scenario.timestamp_chunks(2500, 5, chunk_size=1000)))
+    part = np.concatenate(
+        list(
+            scenario.timestamp_chunks(2500, 5, chunk_size=1000, first=first, last=last)
+        )
+    )
+    np.testing.assert_array_equal(part, full[first:last])
+    # The blocks are `chunk_size` long, the default gives one block
+    np.testing.assert_array_equal(
+        scenario.sample(2500, seed=5),
+        np.concatenate(list(scenario.timestamp_chunks(2500, 5))),
+    )
+
+
+def test_table_is_cached(tmp_path):
+    builds = []
+
+    def build():
+        builds.append(1)
+        return samplers.InverseCDFTable(np.linspace(0, 1234.0, 17))
+
+    first = samplers.cached_table(
+        "linear", {"duration_ms": 1234.0}, build, str(tmp_path)
+    )
+    second = samplers.cached_table(
+        "linear", {"duration_ms": 1234.0}, build, str(tmp_path)
+    )
+    assert len(builds) == 1
+    assert len(list(tmp_path.glob("linear_*.npy"))) == 1
+    np.testing.assert_array_equal(first.values, second.values)
+
+    samplers.cached_table("linear", {"duration_ms": 4321.0}, build, str(tmp_path))
+    assert len(builds) == 2
@@ -0,0 +1,101 @@
+import importlib
+import pickle
+
+import numpy as np
+import pytest
+
+scenarios = importlib.import_module("scenario-builder.scenarios")
+samplers = importlib.import_module("scenario-builder.samplers")
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("SCENARIO_BUILDER_CACHE", str(tmp_path / "cache"))
+    return tmp_path / "cache"
+
+
+def rates(rate_function, t):
+    return rate_function.rate(np.asarray(t, dtype=float)).tolist()
+
+
+def test_concatenation_switches_parts_at_the_boundaries():
+    concatenation = scenarios.Constant(1000, 1.0).then(scenarios.Constant(2000, 3.0))
+    assert concatenation.duration_ms == 3000
+    # The start of a part belongs to it, the end of the last one is included
+    t = [-1, 0, 999.9, 1000, 2999.9, 3000, 3000.1]
+    assert rates(concatenation, t) == [0, 1, 1, 3, 3, 3, 0]
+
+
+def test_sum_overlays_parts_of_different_durations():
+    overlay = scenarios.Constant(1000, 1.0) + 2 * scenarios.Constant(2000, 1.0)
+    assert overlay.duration_ms == 2000
+    assert rates(overlay, [0, 1000, 1000.1, 2000, 2000.1]) == [3, 3, 2, 2, 0]
+
+
+def test_repetition_restarts_the_part():
+    repetition = scenarios.Ramp(1000, 0.0, 1.0).repeat(3)
+    assert repetition.duration_ms == 3000
+    assert rates(repetition, [250, 1250, 2250]) == [0.25, 0.25, 0.25]
+    assert rates(repetition, [1000, 2000, 3000, 3001]) == [0, 0, 1, 0]
+
+
+def test_shifted_and_burst_boundaries():
+    shifted = scenarios.Shifted(scenarios.Constant(100, 2.0), 500)
+    assert shifted.duration_ms == 600
+    assert rates(shifted, [499.9, 500, 600, 600.1]) == [0, 2, 2, 0]
+
+    bursty = scenarios.Constant(3000, 1.0).with_burst(1000, 100, 4.0)
+    assert bursty.duration_ms == 3000
+    assert rates(bursty, [999.9, 1000, 1100, 1100.1]) == [1, 5, 5, 1]
+
+
+def test_expected_events_integrate_the_rate():
+    # Rates are per second, durations in ms
+    assert scenarios.Constant(2000, 5.0).expected_events() == pytest.approx(10)
+    ramp = scenarios.Ramp(4000, 0.0, 10.0)
+    assert ramp.expected_events() == pytest.approx(20)
+    assert scenarios.Scenario("ramp", ramp).event_count() == 20
+
+
+def test_registry():
+    assert set(samplers.SHAPES) <= set(scenarios.SCENARIOS)
+    assert scenarios.get_scenario("DIURNAL", 4000).duration_ms == 4000
+    with pytest.raises(ValueError):
+        scenarios.get_scenario("UNKNOWN", 1000)
+
+    @scenarios.register_scenario("TEST_STEP")
+    def step(duration_ms):
+        return scenarios.Constant(duration_ms / 2, 1.0).then(
+            scenarios.Constant(duration_ms / 2, 2.0)
+        )
+
+    try:
+        scenario = scenarios.get_scenario("TEST_STEP", 1000)
+        assert scenario.name == "TEST_STEP"
+        assert repr(scenario.rate_function) == repr(step(1000))
+    finally:
+        del scenarios.SCENARIOS["TEST_STEP"]
+
+
+def test_lazy_timestamps_match_the_sample():
+    scenario = scenarios.get_scenario("BURST", 60 * 1000)
+    timestamps = scenario.timestamps(5000, seed=11)
+    sample = scenario.sample(5000, seed=11)
+    assert next(timestamps) == sample[0]
+    np.testing.assert_array_equal(list(timestamps), sample[1:])
+
+
+def test_table_is_loaded_from_the_cache(cache_dir, monkeypatch):
+    scenario = scenarios.get_scenario("DIURNAL", 60 * 1000)
+    table = scenario.table()
+    assert scenario.table() is table
+    assert len(list(cache_dir.glob("scenario_*.npy"))) == 1
+
+    def rebuild(*args):
+        raise AssertionError("the cached table was rebuilt")
+
+    monkeypatch.setattr(samplers.InverseCDFTable, "from_pdf", rebuild)
+    # Pickled scenarios, e.g. of the shard workers, drop the table
+    restored = pickle.loads(pickle.dumps(scenario))
+    assert restored._table is None
+    np.testing.assert_array_equal(restored.table().values, table.values)
@@ -0,0 +1,80 @@
+import importlib
+
+import numpy as np
+import pytest
+
+row_index = importlib.import_module("scenario-builder.row_index")
+scenarios = importlib.import_module("scenario-builder.scenarios")
+sharding = importlib.import_module("scenario-builder.sharding")
+
+
+@pytest.fixture
+def input_file(tmp_path, monkeypatch):
+    # NOTE: The spawned workers inherit the cache directory of the tables
+    monkeypatch.setenv("SCENARIO_BUILDER_CACHE", str(tmp_path / "cache"))
+    rng = np.random.default_rng(0)
+    lines = ["timestamp|sensor|value"] + [
+        f"{row}|sensor-{row}|" + "v" * int(rng.integers(0, 20)) for row in range(300)
+    ]
+    path = tmp_path / "input.csv"
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+
+def rewrite(input_file, output_file, shards, separate_files=False, count=1000):
+    scenario = scenarios.get_scenario("BURST", 20 * 60 * 1000)
+    return sharding.rewrite_sharded(
+        input_file,
+        output_file,
+        scenario,
+        count,
+        7,
+        row_index.load_or_build_row_index(input_file),
+        shards,
+        separate_files=separate_files,
+        chunk_size=256,
+    )
+
+
+def test_sharded_output_is_identical_to_one_process(input_file, tmp_path):
+    single = tmp_path / "single.csv"
+    sharded = tmp_path / "sharded.csv"
+    rewrite(input_file, str(single), 1)
+    rewrite(input_file, str(sharded), 3)
+
+    assert sharded.read_bytes() == single.read_bytes()
+    assert len(single.read_bytes().splitlines()) == 1001
+
+
+def test_separate_shard_files_concatenate_to_one_process(input_file, tmp_path):
+    single = tmp_path / "single.csv"
+    rewrite(input_file, str(single), 1)
+    parts = rewrite(input_file, str(tmp_path / "parts.csv"), 3, separate_files=True)
+
+    header, *rows = single.read_bytes().splitlines(keepends=True)
+    concatenated = [header]
+    for part in parts:
+        part_header, *part_rows = open(part, "rb").read().splitlines(keepends=True)
+        assert part_header == header
+        concatenated += part_rows
+    assert b"".join(concatenated) == single.read_bytes()
+
+
+def test_sidecar_is_not_required(input_file, tmp_path):
+    expected = tmp_path / "expected.csv"
+    rewrite(input_file, str(expected), 1)
+    index = row_index.load_or_build_row_index(input_file)
+    open(row_index.sidecar_path(input_file), "wb").close()
+
+    output = tmp_path / "output.csv"
+    sharding.rewrite_sharded(
+        input_file,
+        str(output),
+        scenarios.get_scenario("BURST", 20 * 60 * 1000),
+        1000,
+        7,
+        index,
+        2,
+        chunk_size=256,
+    )
+    assert output.read_bytes() == expected.read_bytes()